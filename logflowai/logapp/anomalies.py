@@ -0,0 +1,281 @@
+"""
+Streaming detection of spikes and drops in the log entry rates.
+
+Every committed import is fed to the process-wide ``RateDetector``, which
+counts the entries per bucket of ``LOGFLOW_ANOMALY_INTERVAL`` seconds and per
+case-folded service, level and event id, and keeps one ``Baseline`` per such
+key: an exponentially weighted level and variance of its bucket counts, and an
+hour-of-day seasonal offset, so a constant 28 numbers per key whatever the
+number of entries.
+
+A bucket is judged as soon as any entry of a later bucket arrives, so an
+anomaly is flagged within one interval of event time. Its score is the
+distance of the count from the expected one (level plus seasonal offset) in
+standard deviations: the observed variance plus the Poisson variance of the
+expected count, so that the noise of rare events does not look anomalous.
+Once a key has seen ``LOGFLOW_ANOMALY_WARMUP`` buckets, a score of at least
+``LOGFLOW_ANOMALY_THRESHOLD`` with at least ``LOGFLOW_ANOMALY_MIN_COUNT``
+entries is a spike, and a score of at most minus the threshold a drop; buckets
+without entries count zero, so a key falling silent is a drop. Consecutive
+anomalous buckets of one kind are recorded once, as a ``LogAnomaly`` row for
+the first. Counts beyond the threshold are clamped before updating the
+baseline, so a spike does not inflate it while a lasting change is learned
+within a few intervals.
+
+Buckets are event time, taken from the entry timestamps: entries older than
+the open bucket of their key count towards it. Baselines live in memory and
+are per process; they are learnt again after a restart.
+"""
+
+import math
+import threading
+from collections import Counter
+from django.conf import settings
+from .models import LogAnomaly
+from .rollups import DAY, HOUR, bucket_start
+
+DEFAULT_INTERVAL = 60
+DEFAULT_THRESHOLD = 4.0
+DEFAULT_WARMUP = 30
+DEFAULT_MIN_COUNT = 5
+DEFAULT_ALPHA = 0.1
+DEFAULT_GAMMA = 0.05
+SEASON_SLOTS = 24
+
+SPIKE = "spike"
+DROP = "drop"
+
+
+class Baseline:
+    """
+    The expected bucket count of one key, and its open bucket.
+    """
+
+    __slots__ = (
+        "bucket",
+        "count",
+        "seen",
+        "level",
+        "variance",
+        "season",
+        "alert",
+    )
+
+    def __init__(self, bucket, count):
+        self.bucket = bucket
+        self.count = count
+        self.seen = 0
+        self.level = 0.0
+        self.variance = 0.0
+        self.season = [0.0] * SEASON_SLOTS
+        self.alert = None
+
+
+class RateDetector:
+    """
+    Detect spikes and drops in the entry rates per service, level and event
+    id (see the module documentation). Thread-safe.
+    """
+
+    def __init__(
+        self,
+        interval=DEFAULT_INTERVAL,
+        threshold=DEFAULT_THRESHOLD,
+        warmup=DEFAULT_WARMUP,
+        min_count=DEFAULT_MIN_COUNT,
+        alpha=DEFAULT_ALPHA,
+        gamma=DEFAULT_GAMMA,
+    ):
+        if interval < 1 or DAY % interval:
+            raise ValueError("interval must divide a day.")
+        self.interval = interval
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_count = min_count
+        self.alpha = alpha
+        self.gamma = gamma
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget every baseline.
+        """
+        with self.lock:
+            self.baselines = {}
+            self.watermark = None
+
+    def observe(self, fields_list):
+        """
+        Count ``LogEntry`` field dictionaries (with their derived columns
+        filled in) and return the unsaved ``LogAnomaly`` objects of the
+        buckets this closes. Entries without a timestamp are ignored.
+        """
+        interval = self.interval
+        counts = Counter()
+        for fields in fields_list:
+            timestamp = fields.get("timestamp")
+            if timestamp is None:
+                continue
+            counts[
+                (
+                    bucket_start(timestamp, interval),
+                    fields.get("service_norm") or "",
+                    fields.get("level_norm") or "",
+                    fields.get("event_id") or "",
+                )
+            ] += 1
+        if not counts:
+            return []
+
+        anomalies = []
+        with self.lock:
+            baselines = self.baselines
+            for (bucket, *key), count in sorted(counts.items()):
+                key = tuple(key)
+                baseline = baselines.get(key)
+                if baseline is None:
+                    baselines[key] = Baseline(bucket, count)
+                elif bucket > baseline.bucket:
+                    self.close(key, baseline, bucket, anomalies)
+                    baseline.count = count
+                else:
+                    baseline.count += count
+            # Keys without entries in the newest bucket are judged too, so
+            # that their drops are flagged as promptly as spikes.
+            latest = max(bucket for bucket, *_ in counts)
+            if self.watermark is None or latest > self.watermark:
+                self.watermark = latest
+                for key, baseline in baselines.items():
+                    if baseline.bucket < latest:
+                        self.close(key, baseline, latest, anomalies)
+                        baseline.count = 0
+        return anomalies
+
+    def close(self, key, baseline, until, anomalies):
+        """
+        Judge the open bucket of ``baseline`` and the empty buckets that
+        follow it up to ``until`` (at most a day of them), and open the
+        bucket ``until``.
+        """
+        interval = self.interval
+        self.judge(key, baseline, baseline.bucket, baseline.count, anomalies)
+        first_empty = max(baseline.bucket + interval, until - DAY)
+        for bucket in range(first_empty, until, interval):
+            self.judge(key, baseline, bucket, 0, anomalies)
+        baseline.bucket = until
+
+    def judge(self, key, baseline, bucket, count, anomalies):
+        """
+        Score ``count`` against the expectation of ``baseline``, record an
+        anomaly when it starts one, and update the baseline.
+        """
+        if baseline.seen == 0:
+            baseline.level = float(count)
+            baseline.seen = 1
+            return
+        slot = bucket // HOUR % SEASON_SLOTS
+        expected = max(baseline.level + baseline.season[slot], 0.0)
+        spread = math.sqrt(baseline.variance + max(expected, 1.0))
+        score = (count - expected) / spread
+
+        kind = None
+        if baseline.seen >= self.warmup:
+            if score >= self.threshold and count >= self.min_count:
+                kind = SPIKE
+            elif score <= -self.threshold:
+                kind = DROP
+            if kind is not None and kind != baseline.alert:
+                service, level, event_id = key
+                anomalies.append(
+                    LogAnomaly(
+                        bucket=bucket,
+                        interval=self.interval,
+                        service=service,
+                        level=level,
+                        event_id=event_id,
+                        kind=kind,
+                        count=count,
+                        expected=expected,
+                        score=score,
+                    )
+                )
+            bound = self.threshold * spread
+            count = min(max(count, expected - bound), expected + bound)
+        baseline.alert = kind
+
+        alpha, gamma = self.alpha, self.gamma
+        residual = count - expected
+        baseline.level += alpha * (
+            count - baseline.season[slot] - baseline.level
+        )
+        baseline.season[slot] += gamma * (
+            count - baseline.level - baseline.season[slot]
+        )
+        baseline.variance = (1 - alpha) * (
+            baseline.variance + alpha * residual * residual
+        )
+        baseline.seen += 1
+
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def get_detector():
+    """
+    Return the process-wide ``RateDetector`` configured by the
+    ``LOGFLOW_ANOMALY_*`` settings.
+    """
+    config = (
+        getattr(settings, "LOGFLOW_ANOMALY_INTERVAL", DEFAULT_INTERVAL),
+        getattr(settings, "LOGFLOW_ANOMALY_THRESHOLD", DEFAULT_THRESHOLD),
+        getattr(settings, "LOGFLOW_ANOMALY_WARMUP", DEFAULT_WARMUP),
+        getattr(settings, "LOGFLOW_ANOMALY_MIN_COUNT", DEFAULT_MIN_COUNT),
+    )
+    with _detectors_lock:
+        detector = _detectors.get(config)
+        if detector is None:
+            detector = _detectors[config] = RateDetector(*config)
+    return detector
+
+
+def detect_anomalies(fields_list):
+    """
+    Feed committed ``LogEntry`` field dictionaries to ``get_detector`` and
+    store the anomalies it flags. Does nothing unless
+    ``settings.LOGFLOW_ANOMALY_DETECTION`` is on.
+    """
+    if not getattr(settings, "LOGFLOW_ANOMALY_DETECTION", True):
+        return
+    anomalies = get_detector().observe(fields_list)
+    if anomalies:
+        LogAnomaly.objects.bulk_create(anomalies)
+
+
+def recent_anomalies(start, end, kind=None, service=None, limit=100):
+    """
+    Return the anomalies whose bucket starts from ``start`` to ``end``
+    (aware datetimes), newest first, as dictionaries.
+    """
+    anomalies = LogAnomaly.objects.filter(
+        bucket__gte=bucket_start(start, 1),
+        bucket__lt=math.ceil(end.timestamp()),
+    )
+    if kind:
+        anomalies = anomalies.filter(kind=kind)
+    if service:
+        anomalies = anomalies.filter(service=service.casefold())
+    return list(
+        anomalies.order_by("-bucket", "-id").values(
+            "bucket",
+            "interval",
+            "service",
+            "level",
+            "event_id",
+            "kind",
+            "count",
+            "expected",
+            "score",
+        )[:limit]
+    )
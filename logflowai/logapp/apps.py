@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class LogappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "logapp"
+
+    def ready(self):
+        from .fulltext import restore_fulltext_triggers
+
+        post_migrate.connect(restore_fulltext_triggers, sender=self)
@@ -0,0 +1,218 @@
+"""
+SQLite FTS5 full-text index over ``LogEntry.message``.
+
+``logapp_logentry_fts`` is an external-content FTS5 table: it stores only the
+inverted index and reads message text from ``logapp_logentry`` by rowid.
+
+New rows are indexed in bulk rather than by a per-row insert trigger, which
+made inserts about three times slower: ``sync_fulltext_index`` indexes every
+row above the ``last_id`` watermark kept in ``logapp_logentry_fts_state`` with
+one ``INSERT ... SELECT``. ``insert_entries`` calls it inside each import
+transaction and ``filter_logs`` before searching, which covers rows created
+through the ORM. Updates and deletes of indexed rows are rare and handled by
+triggers. SQLite drops a table's triggers when a migration rebuilds the table,
+so they are recreated after every ``migrate``.
+
+On other database backends nothing is created and ``filter_logs`` keeps using
+``icontains``.
+"""
+
+import re
+from django.db import connections, transaction
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "logapp_logentry_fts"
+STATE_TABLE = "logapp_logentry_fts_state"
+LOG_TABLE = "logapp_logentry"
+
+CREATE_SQL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"message, content='{LOG_TABLE}', content_rowid='id')",
+    f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (last_id INTEGER NOT NULL)",
+]
+
+TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {LOG_TABLE}
+    WHEN old.id <= (SELECT last_id FROM {STATE_TABLE})
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF message ON {LOG_TABLE}
+    WHEN old.id <= (SELECT last_id FROM {STATE_TABLE})
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message)
+        VALUES ('delete', old.id, old.message);
+        INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+    END
+    """,
+]
+
+DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+    f"DROP TABLE IF EXISTS {STATE_TABLE}",
+]
+
+# A double-quoted phrase, or a bare term; either may end in ``*``.
+TERM_PATTERN = re.compile(r'"([^"]*)"(\*?)|([^\s"]+)')
+
+
+def fulltext_available(connection):
+    """
+    Return whether ``connection`` has the FTS5 table.
+    """
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def create_fulltext_index(connection):
+    """
+    Create the FTS5 table, its state table and triggers, and index the
+    existing rows. Does nothing on backends other than SQLite.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in CREATE_SQL + TRIGGERS_SQL:
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {STATE_TABLE} (last_id) VALUES (0)")
+        rebuild_fulltext_index(cursor)
+
+
+def rebuild_fulltext_index(cursor):
+    """
+    Reindex every row from scratch.
+    """
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    cursor.execute(
+        f"UPDATE {STATE_TABLE} SET last_id = "
+        f"(SELECT coalesce(max(id), 0) FROM {LOG_TABLE})"
+    )
+
+
+def sync_fulltext_index(connection):
+    """
+    Index the rows inserted since the last call; run it in the transaction
+    that inserted them. Returns the number of rows indexed.
+
+    A table whose highest id dropped below the watermark had its id sequence
+    reset (as ``flush`` does) and is reindexed from scratch.
+    """
+    if not fulltext_available(connection):
+        return 0
+    atomic = transaction.atomic(using=connection.alias)
+    with atomic, connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT (SELECT last_id FROM {STATE_TABLE}), "
+            f"(SELECT coalesce(max(id), 0) FROM {LOG_TABLE})"
+        )
+        last_id, newest = cursor.fetchone()
+        if newest == last_id:
+            return 0
+        if newest < last_id:
+            rebuild_fulltext_index(cursor)
+            cursor.execute(f"SELECT count(*) FROM {LOG_TABLE}")
+            return cursor.fetchone()[0]
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}(rowid, message) "
+            f"SELECT id, message FROM {LOG_TABLE} WHERE id > %s",
+            [last_id],
+        )
+        indexed = cursor.rowcount
+        cursor.execute(f"UPDATE {STATE_TABLE} SET last_id = %s", [newest])
+        return indexed
+
+
+def drop_fulltext_index(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in DROP_SQL:
+            cursor.execute(sql)
+
+
+def restore_fulltext_triggers(sender, using, **kwargs):
+    """
+    ``post_migrate`` handler recreating triggers that a table rebuild by
+    a migration dropped. Rows copied by the rebuild keep their ids, so the
+    index itself stays valid.
+    """
+    connection = connections[using]
+    if fulltext_available(connection):
+        with connection.cursor() as cursor:
+            for sql in TRIGGERS_SQL:
+                cursor.execute(sql)
+
+
+def build_match_query(query):
+    """
+    Translate a search box query into an FTS5 MATCH expression, or return
+    ``None`` when it contains no searchable term.
+
+    Whitespace-separated terms must all occur, ``"double quoted"`` text must
+    occur as a phrase and a trailing ``*`` matches any token with that
+    prefix. Everything else is quoted, so user input cannot inject FTS5
+    syntax.
+    """
+    parts = []
+    for phrase, phrase_star, term in TERM_PATTERN.findall(query or ""):
+        text, star = (phrase, phrase_star) if term == "" else (term, "")
+        if term.endswith("*"):
+            text, star = term.rstrip("*"), "*"
+        if not re.search(r"\w", text):
+            continue
+        parts.append('"%s"%s' % (text.replace('"', '""'), star))
+    return " AND ".join(parts) or None
+
+
+def fulltext_filter(queryset, query):
+    """
+    Restrict a ``LogEntry`` queryset to the entries matching ``query`` and
+    annotate them with their BM25 ``rank`` (lower is better), ordered by it.
+
+    Returns ``None`` when the FTS5 table is unavailable or ``query`` has no
+    searchable term; callers then fall back to ``icontains``.
+    """
+    match = build_match_query(query)
+    connection = connections[queryset.db]
+    if match is None or not fulltext_available(connection):
+        return None
+    sync_fulltext_index(connection)
+    return queryset.extra(
+        select={"rank": f"bm25({FTS_TABLE})"},
+        tables=[FTS_TABLE],
+        where=[
+            f"{FTS_TABLE}.rowid = {LOG_TABLE}.id",
+            f"{FTS_TABLE} MATCH %s",
+        ],
+        params=[match],
+    ).order_by("rank")
+
+
+def fulltext_ids(queryset, query):
+    """
+    Return an uncorrelated subquery selecting the ids of the entries that
+    match ``query``, for ``id__in`` lookups on ``queryset``, or ``None`` like
+    ``fulltext_filter``. Use it instead of ``fulltext_filter(...).values()``
+    inside other queries, whose extra join would refer to the outer table.
+    """
+    match = build_match_query(query)
+    connection = connections[queryset.db]
+    if match is None or not fulltext_available(connection):
+        return None
+    sync_fulltext_index(connection)
+    return RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+    )
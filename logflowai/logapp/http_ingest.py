@@ -0,0 +1,225 @@
+"""
+Streaming NDJSON ingestion for the ``POST /ingest/`` endpoint.
+
+Request bodies (optionally gzip-encoded) are decoded and parsed one line at a
+time straight from the request stream, validated into ``LogEntry`` fields and
+committed in fixed-size batches, so memory does not grow with the body size.
+Writes go through a ``WriterQueue`` that serializes them (SQLite allows a
+single writer) and bounds how many requests may wait for it; requests beyond
+that bound are turned away with ``429 Too Many Requests`` instead of queueing
+without limit.
+"""
+
+import gzip
+import json
+import threading
+from datetime import datetime, timezone
+from dateutil import parser
+from django.conf import settings
+from .ingest import RowBatch, chunked, commit_batches
+
+DEFAULT_INGEST_BATCH_SIZE = 1000
+DEFAULT_INGEST_MAX_PENDING = 4
+DEFAULT_INGEST_RETRY_AFTER = 1
+MAX_RECORD_BYTES = 64 * 1024
+MAX_REPORTED_ERRORS = 10
+
+# LogEntry fields accepted in a record, with the maximum string length.
+STRING_FIELDS = {
+    "level": 20,
+    "message": None,
+    "service": 100,
+    "host": 100,
+    "source": 512,
+}
+
+
+class WriterQueue:
+    """
+    Admission control in front of the single database writer.
+
+    Parameters
+    ----------
+    max_pending : int
+        How many requests may hold or wait for the writer at once.
+    """
+
+    def __init__(self, max_pending):
+        if max_pending < 1:
+            raise ValueError("max_pending must be positive.")
+        self.max_pending = max_pending
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+
+    def try_enter(self):
+        """
+        Claim a queue slot without blocking. Returns ``False`` when the
+        queue is full.
+        """
+        return self.slots.acquire(blocking=False)
+
+    def leave(self):
+        self.slots.release()
+
+
+writer_queue = WriterQueue(
+    getattr(settings, "LOGFLOW_INGEST_MAX_PENDING", DEFAULT_INGEST_MAX_PENDING)
+)
+
+
+def parse_record_timestamp(value):
+    """
+    Parse an ISO 8601 string or a Unix epoch number into an aware datetime.
+    Naive values are taken to be UTC. Raises ``ValueError`` for anything
+    else, including epochs out of the platform's range.
+    """
+    if isinstance(value, bool):
+        raise ValueError("timestamp must be a string or a number")
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, tz=timezone.utc)
+        except (OverflowError, OSError) as e:
+            raise ValueError(f"timestamp {value!r} is out of range") from e
+    if not isinstance(value, str):
+        raise ValueError("timestamp must be a string or a number")
+    timestamp = parser.isoparse(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+
+def record_to_fields(record):
+    """
+    Validate one decoded NDJSON record and convert it into keyword arguments
+    for ``LogEntry``.
+
+    ``message`` is required. Keys that are not ``LogEntry`` fields are kept
+    in ``additional_data``. Raises ``ValueError`` describing the first
+    problem found.
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record must be a JSON object")
+    record = dict(record)
+
+    fields = {}
+    for name, max_length in STRING_FIELDS.items():
+        value = record.pop(name, None)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            raise ValueError(f"{name} must be a string")
+        if max_length is not None and len(value) > max_length:
+            raise ValueError(f"{name} is longer than {max_length} characters")
+        fields[name] = value
+    if not fields.get("message"):
+        raise ValueError("message is required")
+
+    timestamp = record.pop("timestamp", None)
+    if timestamp is not None:
+        fields["timestamp"] = parse_record_timestamp(timestamp)
+
+    line_id = record.pop("line_id", None)
+    if line_id is not None:
+        if isinstance(line_id, bool) or not isinstance(line_id, int):
+            raise ValueError("line_id must be an integer")
+        fields["line_id"] = line_id
+
+    additional_data = record.pop("additional_data", None)
+    if additional_data is not None and not isinstance(additional_data, dict):
+        raise ValueError("additional_data must be a JSON object")
+    additional_data = {**record, **(additional_data or {})}
+    if additional_data:
+        fields["additional_data"] = additional_data
+    return fields
+
+
+def iter_lines(stream, max_bytes=MAX_RECORD_BYTES):
+    """
+    Yield ``(line_number, line)`` for every line read from the binary
+    ``stream``. Lines longer than ``max_bytes`` are discarded and yielded as
+    ``None``.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(max_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > max_bytes:
+            while line and not line.endswith(b"\n"):
+                line = stream.readline(max_bytes)
+            yield line_number, None
+            continue
+        yield line_number, line
+
+
+def iter_ndjson_fields(stream):
+    """
+    Yield ``(line_number, fields, error)`` for every non-blank line of the
+    NDJSON ``stream``; exactly one of ``fields`` and ``error`` is set.
+    """
+    for line_number, line in iter_lines(stream):
+        if line is None:
+            yield line_number, None, (
+                f"record is longer than {MAX_RECORD_BYTES} bytes"
+            )
+            continue
+        if not line.strip():
+            continue
+        try:
+            fields = record_to_fields(json.loads(line))
+        except (ValueError, OverflowError, RecursionError) as e:
+            # RecursionError: JSON nested deeper than the decoder's stack.
+            yield line_number, None, str(e)
+            continue
+        yield line_number, fields, None
+
+
+def open_request_stream(request):
+    """
+    Return a binary stream over the request body, decoding it on the fly
+    when it is sent with ``Content-Encoding: gzip``.
+    """
+    encoding = request.headers.get("Content-Encoding", "identity").lower()
+    if encoding in ("", "identity"):
+        return request
+    if encoding in ("gzip", "x-gzip"):
+        return gzip.GzipFile(fileobj=request, mode="rb")
+    raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+
+
+def ingest_ndjson(stream, batch_size=None, queue=writer_queue):
+    """
+    Validate and commit the records of an NDJSON ``stream`` in batches,
+    yielding one summary dictionary per batch with its ``accepted``,
+    ``duplicates`` and ``rejected`` counts and the first few ``errors``.
+
+    Records with a ``source`` and ``line_id`` that already exist are counted
+    as duplicates, so shippers can safely retry a request. Each batch is
+    committed in its own transaction while holding ``queue``'s writer lock.
+    """
+    if batch_size is None:
+        batch_size = getattr(
+            settings, "LOGFLOW_INGEST_BATCH_SIZE", DEFAULT_INGEST_BATCH_SIZE
+        )
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive.")
+
+    for chunk in chunked(iter_ndjson_fields(stream), batch_size):
+        fields_list = []
+        errors = []
+        for line_number, fields, error in chunk:
+            if error is None:
+                fields_list.append(fields)
+            else:
+                errors.append(f"line {line_number}: {error}")
+        inserted = 0
+        if fields_list:
+            with queue.lock:
+                inserted = commit_batches([RowBatch(fields=fields_list)])
+        yield {
+            "accepted": inserted,
+            "duplicates": len(fields_list) - inserted,
+            "rejected": len(errors),
+            "errors": errors[:MAX_REPORTED_ERRORS],
+        }
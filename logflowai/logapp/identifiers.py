@@ -0,0 +1,162 @@
+"""
+Identifier index mapping HDFS block ids, IP addresses and other identifiers
+found in the messages to the entries that mention them.
+
+``settings.LOGFLOW_IDENTIFIER_PATTERNS`` maps a kind of identifier to the
+regular expression matching it (by default ``block`` for ``blk_-?\\d+`` and
+``ip`` for dotted IPv4 addresses). Patterns must not contain capturing groups,
+as ``findall`` would return the groups instead of the whole match; use
+``(?:...)``. The ``block`` pattern also selects the block ids counted by the
+sketches (see ``logapp.sketches``). ``insert_entries`` extracts every distinct
+match of the new messages in the transaction that inserts them and writes one
+``LogIdentifier`` row per kind, value and entry, indexed by kind and value. A
+block's trace is then one indexed join (``identifier_trace``) instead of a
+substring scan over every message. New rows get consecutive ids from the
+single import writer, as the full-text index also relies on.
+
+Rows written directly through the ORM, and entries stored before a pattern
+was added, are only indexed by ``rebuild_identifiers`` (the
+``rebuild_identifiers`` command), which also drops the rows of deleted
+entries; until then they are harmless, as the joins skip them.
+"""
+
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from .models import LogEntry, LogIdentifier
+from .rollups import DEFAULT_CHUNK_SIZE
+
+DEFAULT_PATTERNS = {
+    "block": r"blk_-?\d+",
+    "ip": r"\b(?:\d{1,3}\.){3}\d{1,3}\b",
+}
+MAX_VALUE_LENGTH = 64
+
+
+@lru_cache(maxsize=None)
+def compile_patterns(patterns):
+    compiled = [(kind, re.compile(pattern)) for kind, pattern in patterns]
+    for kind, pattern in compiled:
+        if pattern.groups:
+            raise ImproperlyConfigured(
+                f"The {kind!r} identifier pattern has capturing groups; "
+                "use (?:...) instead."
+            )
+    return compiled
+
+
+def identifier_patterns():
+    """
+    Return ``(kind, compiled pattern)`` pairs of
+    ``settings.LOGFLOW_IDENTIFIER_PATTERNS``.
+    """
+    patterns = getattr(
+        settings, "LOGFLOW_IDENTIFIER_PATTERNS", DEFAULT_PATTERNS
+    )
+    return compile_patterns(tuple(patterns.items()))
+
+
+def identifier_pattern(kind):
+    """
+    Return the compiled pattern of the identifiers of ``kind``, or ``None``
+    when ``settings.LOGFLOW_IDENTIFIER_PATTERNS`` has none.
+    """
+    return dict(identifier_patterns()).get(kind)
+
+
+def extract_identifiers(message, patterns=None):
+    """
+    Return the distinct ``(kind, value)`` identifiers found in ``message``,
+    in order of appearance per kind. Values longer than
+    ``MAX_VALUE_LENGTH`` are skipped.
+    """
+    if patterns is None:
+        patterns = identifier_patterns()
+    found = []
+    for kind, pattern in patterns:
+        for value in dict.fromkeys(pattern.findall(message or "")):
+            if len(value) <= MAX_VALUE_LENGTH:
+                found.append((kind, value))
+    return found
+
+
+def add_identifiers(rows):
+    """
+    Index the identifiers of ``(entry id, message)`` pairs with one
+    ``executemany``. Returns the number of rows written.
+    """
+    patterns = identifier_patterns()
+    params = [
+        (kind, value, entry_id)
+        for entry_id, message in rows
+        for kind, value in extract_identifiers(message, patterns)
+    ]
+    if not params:
+        return 0
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}, {}, {}) VALUES (%s, %s, %s)".format(
+        quote(LogIdentifier._meta.db_table),
+        quote("kind"),
+        quote("value"),
+        quote("entry_id"),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    return len(params)
+
+
+def index_new_entries(fields_list):
+    """
+    Index the identifiers of ``fields_list``, the entries just inserted by
+    one statement in that order, which therefore hold the highest ids.
+    """
+    if not fields_list:
+        return
+    newest = LogEntry.objects.order_by("-id").values_list("id", flat=True)[0]
+    first = newest - len(fields_list) + 1
+    add_identifiers(
+        (first + i, fields.get("message"))
+        for i, fields in enumerate(fields_list)
+    )
+
+
+def rebuild_identifiers(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Replace the identifier index with the identifiers of every log entry,
+    walking the table by primary key in chunks of ``chunk_size`` in one
+    transaction. Returns the number of identifier rows written.
+    """
+    count = 0
+    with transaction.atomic():
+        LogIdentifier.objects.all().delete()
+        last_id = 0
+        while True:
+            chunk = list(
+                LogEntry.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "message")[:chunk_size]
+            )
+            if not chunk:
+                break
+            count += add_identifiers(chunk)
+            last_id = chunk[-1][0]
+    return count
+
+
+def normalize_block_id(block_id):
+    """
+    Return ``block_id`` with its ``blk_`` prefix, which may be left out.
+    """
+    return block_id if block_id.startswith("blk_") else f"blk_{block_id}"
+
+
+def identifier_trace(kind, value):
+    """
+    Return the entries mentioning the identifier ``value`` of ``kind``, in
+    ``(timestamp, id)`` order, as one query joining the identifier index.
+    """
+    return LogEntry.objects.filter(
+        identifiers__kind=kind, identifiers__value=value
+    ).order_by("timestamp", "id")
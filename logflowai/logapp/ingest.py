@@ -0,0 +1,706 @@
+"""
+Streaming ingestion helpers used by the ``import_logs`` management command.
+
+Rows are read lazily, converted into ``LogEntry`` field dictionaries and
+inserted with one ``executemany`` per fixed-size batch, one transaction per
+commit chunk, so memory stays bounded regardless of the input size. Parsing
+can be fanned out to a process pool while the calling process remains the
+only database writer. Per-file ``ImportCheckpoint`` rows make re-imports
+append-only and let interrupted imports resume. Gzip, bzip2 and zstd inputs
+are detected by their magic bytes and decompressed on the fly; offsets and
+fingerprints always refer to the decompressed stream.
+"""
+
+import bz2
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache, partial
+from itertools import islice
+import django
+import pytz
+from django.db import connection, models, transaction
+from .anomalies import detect_anomalies
+from .fulltext import sync_fulltext_index
+from .identifiers import index_new_entries
+from .models import ImportCheckpoint, LogEntry, LogTemplate, normalized_fields
+from .query_cache import get_query_cache
+from .rollups import add_to_rollups
+from .sketches import add_to_sketches
+from .template_miner import parse_raw_line
+
+DEFAULT_CSV_PATH = os.path.join("logapp", "data", "HDFS_2k.log_structured.csv")
+DEFAULT_TEMPLATE_STATE_PATH = os.path.join(
+    "logapp", "data", "template_miner.json"
+)
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".zst", ".zstd")
+INPUT_PATTERNS = {
+    "csv": ("*.csv",) + tuple(f"*.csv{s}" for s in COMPRESSED_SUFFIXES),
+    "raw": ("*.log",) + tuple(f"*.log{s}" for s in COMPRESSED_SUFFIXES),
+}
+READ_BUFFER_SIZE = 1024 * 1024
+MAGIC_BYTES = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_COMMIT_INTERVAL = 10000
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def parse_timestamp(date_str, time_str):
+    """
+    Combine HDFS ``Date`` (MMDDYY) and ``Time`` (HHMMSS) columns into a UTC
+    datetime. Raises ``ValueError`` when the values cannot be parsed.
+    """
+    dt = datetime.strptime(date_str + time_str, "%m%d%y%H%M%S")
+    # Assume timestamp is in UTC (adjust as needed)
+    return dt.replace(tzinfo=pytz.UTC)
+
+
+def row_to_fields(row, errors=None):
+    """
+    Convert one structured CSV row into keyword arguments for ``LogEntry``.
+
+    CSV columns: LineId,Date,Time,Pid,Level,Component,Content,EventId,
+    EventTemplate. Timestamp parse failures leave ``timestamp`` as ``None``
+    and, when ``errors`` is a list, append a description to it.
+    """
+    date_str = row.get("Date")  # e.g. "081109" (MMDDYY)
+    time_str = row.get("Time")  # e.g. "203615" (HHMMSS)
+    timestamp = None
+    if date_str and time_str:
+        try:
+            timestamp = parse_timestamp(date_str, time_str)
+        except ValueError as e:
+            if errors is not None:
+                errors.append(
+                    f"Error parsing timestamp: {date_str} {time_str}: {e}"
+                )
+
+    line_id = row.get("LineId")
+    return {
+        "timestamp": timestamp,
+        "level": row.get("Level"),
+        "message": row.get("Content"),
+        "service": row.get("Component"),  # use Component as service name
+        "host": "",  # no host provided in CSV
+        "line_id": int(line_id) if line_id and line_id.isdigit() else None,
+        # Save extra columns as additional data
+        "additional_data": {
+            "LineId": row.get("LineId"),
+            "Pid": row.get("Pid"),
+            "EventId": row.get("EventId"),
+            "EventTemplate": row.get("EventTemplate"),
+        },
+    }
+
+
+def expand_input_paths(path, patterns=("*.csv",)):
+    """
+    Resolve ``path`` into a sorted list of input files.
+
+    ``path`` may be a single file, a directory (files directly inside it that
+    match one of ``patterns`` are used) or a glob pattern such as
+    ``dumps/HDFS_*.csv``.
+    """
+    if os.path.isdir(path):
+        matches = set()
+        for pattern in patterns:
+            matches.update(glob.glob(os.path.join(path, pattern)))
+    elif glob.has_magic(path):
+        matches = glob.glob(path)
+    else:
+        return [path] if os.path.exists(path) else []
+    return sorted(p for p in matches if os.path.isfile(p))
+
+
+def detect_format(path):
+    """
+    Return ``"csv"`` for structured CSV files (optionally compressed, e.g.
+    ``.csv.gz``) and ``"raw"`` for anything else, which is treated as raw
+    HDFS log lines.
+    """
+    name = path.lower()
+    for suffix in COMPRESSED_SUFFIXES:
+        name = name.removesuffix(suffix)
+    return "csv" if name.endswith(".csv") else "raw"
+
+
+def detect_compression(path):
+    """
+    Return ``"gzip"``, ``"bz2"``, ``"zstd"`` or ``None`` based on the magic
+    bytes at the start of ``path``.
+    """
+    with open(path, "rb") as fh:
+        head = fh.read(4)
+    for magic, compression in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_input(path):
+    """
+    Open ``path`` for streaming binary reads, transparently decompressing
+    gzip, bzip2 and zstd files.
+
+    Decompression happens incrementally behind a large read buffer, so memory
+    use does not depend on the size of the file.
+    """
+    compression = detect_compression(path)
+    raw = open(path, "rb", buffering=READ_BUFFER_SIZE)
+    if compression is None:
+        return raw
+    if compression == "gzip":
+        stream = gzip.GzipFile(fileobj=raw)
+    elif compression == "bz2":
+        stream = bz2.BZ2File(raw)
+    else:
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise ValueError(
+                f"{path} is zstd-compressed but the zstandard package is "
+                "not installed."
+            )
+        stream = zstandard.ZstdDecompressor().stream_reader(
+            raw, read_size=READ_BUFFER_SIZE, read_across_frames=True
+        )
+    return DecompressedReader(stream, raw)
+
+
+class DecompressedReader(io.BufferedReader):
+    """
+    Buffered reader over a decompression stream that also closes the
+    underlying compressed file.
+    """
+
+    def __init__(self, stream, source):
+        super().__init__(stream, buffer_size=READ_BUFFER_SIZE)
+        self.source = source
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.source.close()
+
+
+def skip_bytes(fh, count):
+    """
+    Advance the stream ``fh`` by ``count`` bytes, seeking when possible and
+    reading (in bounded chunks) through compressed streams otherwise.
+    """
+    if count <= 0:
+        return
+    if isinstance(fh, io.BufferedReader) and isinstance(fh.raw, io.FileIO):
+        fh.seek(count, io.SEEK_CUR)
+        return
+    while count > 0:
+        chunk = fh.read(min(count, READ_BUFFER_SIZE))
+        if not chunk:
+            return
+        count -= len(chunk)
+
+
+@dataclass
+class RowBatch:
+    """
+    A slice of one input file travelling through the import pipeline.
+
+    ``rows`` holds raw CSV rows (or ``(line_id, line)`` pairs for raw log
+    files) until the batch is parsed, after which ``fields`` holds the
+    ``LogEntry`` keyword arguments and ``errors`` any parse warnings.
+    ``end_offset`` is the byte offset just past the last row, which becomes
+    the file checkpoint once the batch is committed. ``generation`` counts
+    how often the file at ``source`` was replaced, rotated or truncated.
+    """
+
+    source: str = None
+    generation: int = 0
+    format: str = "csv"
+    fieldnames: list = None
+    rows: list = None
+    end_offset: int = 0
+    fingerprint: str = None
+    fields: list = None
+    errors: list = field(default_factory=list)
+
+
+def source_key(path):
+    """
+    Return the key under which imported rows and checkpoints of ``path``
+    are stored.
+    """
+    return os.path.abspath(path)
+
+
+def entry_source(source, generation=0):
+    """
+    Return the ``LogEntry.source`` value for lines of ``source`` read in the
+    given file ``generation``.
+
+    Rotated or replaced files restart their line numbering, so later
+    generations get a distinct source to keep ``(source, line_id)`` unique.
+    """
+    return source if not generation else f"{source}#{generation}"
+
+
+def file_fingerprint(path, length):
+    """
+    Return the SHA-256 hex digest of the first ``length`` (decompressed)
+    bytes of ``path``.
+    """
+    digest = hashlib.sha256()
+    with open_input(path) as fh:
+        digest.update(fh.read(length))
+    return digest.hexdigest()
+
+
+def resume_point(path, resume=True):
+    """
+    Return ``(byte_offset, last_line_id, generation)`` from which ``path``
+    should be (re)imported.
+
+    The stored checkpoint is only trusted when the file is at least as long
+    as the checkpoint (checked for uncompressed files only, as the
+    decompressed size is unknown) and its leading bytes still match the
+    fingerprint.
+    Truncated, rotated or replaced files are imported from the start as a new
+    generation. With ``resume`` disabled the file is read from the start
+    within its current generation, so the ``(source, line_id)`` key rejects
+    lines that are already present.
+    """
+    checkpoint = ImportCheckpoint.objects.filter(
+        source=source_key(path)
+    ).first()
+    if checkpoint is None:
+        return 0, None, 0
+    if not resume or checkpoint.byte_offset <= 0:
+        return 0, None, checkpoint.generation
+    length = min(checkpoint.byte_offset, FINGERPRINT_BYTES)
+    truncated = (
+        detect_compression(path) is None
+        and os.path.getsize(path) < checkpoint.byte_offset
+    )
+    if truncated or file_fingerprint(path, length) != checkpoint.fingerprint:
+        return 0, None, checkpoint.generation + 1
+    return (
+        checkpoint.byte_offset,
+        checkpoint.last_line_id,
+        checkpoint.generation,
+    )
+
+
+def iter_csv_rows(fh, offset=0):
+    """
+    Yield ``(row, end_offset)`` for every CSV record read from the binary
+    stream ``fh``, whose current position is ``offset``.
+
+    ``csv.reader`` pulls lines lazily, so after each record the offset is
+    exactly the end of the lines that record was read from.
+    """
+
+    def lines():
+        nonlocal offset
+        for raw in fh:
+            offset += len(raw)
+            yield raw.decode("utf-8")
+
+    for row in csv.reader(lines()):
+        if row:
+            yield row, offset
+
+
+def iter_raw_lines(fh, offset=0, line_id=0):
+    """
+    Yield ``((line_id, line), end_offset)`` for every non-empty line read
+    from the binary stream ``fh``, whose current position is ``offset``,
+    numbering lines after ``line_id``.
+    """
+    for raw in fh:
+        offset += len(raw)
+        line_id += 1
+        line = raw.decode("utf-8").rstrip("\r\n")
+        if line:
+            yield (line_id, line), offset
+
+
+def iter_row_batches(
+    paths, batch_size=DEFAULT_BATCH_SIZE, resume=True, input_format="auto"
+):
+    """
+    Yield ``RowBatch`` objects with at most ``batch_size`` rows each, reading
+    ``paths`` one after another.
+
+    ``input_format`` is ``"csv"``, ``"raw"`` or ``"auto"`` (decided per file
+    by ``detect_format``). With ``resume`` enabled each file is read from its
+    checkpoint, so only lines appended since the last import are returned.
+    Rows are plain lists or tuples so that batches are cheap to send to
+    worker processes.
+    """
+    for path in paths:
+        file_format = (
+            detect_format(path) if input_format == "auto" else input_format
+        )
+        start, last_line_id, generation = resume_point(path, resume)
+        with open_input(path) as fh:
+            header = None
+            offset = 0
+            if file_format == "csv":
+                line = fh.readline()
+                offset = len(line)
+                header = next(csv.reader([line.decode("utf-8")]), None)
+                if not header:
+                    continue
+            if start > offset:
+                skip_bytes(fh, start - offset)
+                offset = start
+            if file_format == "csv":
+                rows = iter_csv_rows(fh, offset)
+            else:
+                line_id = (last_line_id or 0) if start else 0
+                rows = iter_raw_lines(fh, offset, line_id)
+            for chunk in chunked(rows, batch_size):
+                yield RowBatch(
+                    source=source_key(path),
+                    generation=generation,
+                    format=file_format,
+                    fieldnames=header,
+                    rows=[row for row, _ in chunk],
+                    end_offset=chunk[-1][1],
+                )
+
+
+def parse_row_batch(batch):
+    """
+    Convert the raw rows of ``batch`` into ``LogEntry`` field dictionaries.
+
+    This is the unit of work executed by the parsing process pool, so it must
+    stay a picklable module-level function. The raw rows are dropped before
+    the batch is returned to keep the trip back to the writer small.
+    """
+    batch.fields = []
+    for row in batch.rows:
+        if batch.format == "raw":
+            line_id, line = row
+            row = parse_raw_line(line)
+            row["LineId"] = str(line_id)
+        else:
+            row = dict(zip(batch.fieldnames, row))
+        fields = row_to_fields(row, batch.errors)
+        fields["source"] = entry_source(batch.source, batch.generation)
+        batch.fields.append(fields)
+    batch.rows = None
+    return batch
+
+
+def iter_parsed_batches(batches, workers=1):
+    """
+    Parse ``RowBatch`` objects, yielding them in input order.
+
+    With ``workers`` greater than one, parsing runs in a process pool. At most
+    two batches per worker are in flight, so a fast reader cannot queue up the
+    whole input in memory while the single writer catches up.
+    """
+    if workers <= 1:
+        for batch in batches:
+            yield parse_row_batch(batch)
+        return
+
+    # django.setup() lets spawned workers import modules that touch models.
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=django.setup
+    ) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append(pool.submit(parse_row_batch, batch))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def assign_templates(batches, miner):
+    """
+    Fill in ``EventId``/``EventTemplate`` for parsed entries that lack them,
+    mining templates online with ``miner`` (a ``TemplateMiner``).
+
+    Mining is stateful, so this runs in the writer process after parsing.
+    """
+    for batch in batches:
+        for fields in batch.fields:
+            data = fields["additional_data"]
+            if not data.get("EventId"):
+                event_id, template = miner.add_log_message(
+                    fields["message"] or ""
+                )
+                data["EventId"] = event_id
+                data["EventTemplate"] = template
+        yield batch
+
+
+def chunked(iterable, size):
+    """
+    Yield lists of at most ``size`` items from ``iterable`` without
+    materializing more than one chunk at a time.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def entry_columns():
+    """
+    Return ``(attname, column, default, adapt)`` for every ``LogEntry``
+    column written by ``insert_entries``; ``adapt`` converts a Python value
+    into a database parameter, or is ``None`` when no conversion is needed.
+    Call it once per insert, as the datetime adapter memoizes its results.
+    """
+    columns = []
+    for model_field in LogEntry._meta.concrete_fields:
+        if model_field.primary_key:
+            continue
+        adapt = None
+        if isinstance(model_field, models.DateTimeField):
+            # Timestamps repeat a lot within a batch; adapt each one once.
+            adapt = lru_cache(maxsize=4096)(
+                connection.ops.adapt_datetimefield_value
+            )
+        elif isinstance(model_field, models.JSONField):
+            adapt = partial(
+                connection.ops.adapt_json_value, encoder=model_field.encoder
+            )
+        columns.append(
+            (
+                model_field.attname,
+                model_field.column,
+                model_field.get_default(),
+                adapt,
+            )
+        )
+    return columns
+
+
+def insert_entries(fields_list):
+    """
+    Bulk insert ``LogEntry`` field dictionaries, skipping lines that already
+    exist.
+
+    Entries carrying a ``source`` and ``line_id`` are checked against the
+    unique ``(source, line_id)`` key with one range query per source rather
+    than one lookup per row. The remaining rows are written with a single
+    ``executemany`` instead of ``bulk_create``, which skips building model
+    instances and compiling per-value SQL; that overhead dominated ingest
+    time. The derived columns (see ``normalized_fields``) are filled in
+    place first, the new rows are added to the full-text index in one
+    statement, their identifiers are indexed, their templates are upserted
+    and they are counted into the time-bucket rollups and sketches. Once the
+    transaction commits, they are fed to the anomaly detector. Returns the
+    list of inserted field dictionaries.
+    """
+    for fields in fields_list:
+        fields.update(normalized_fields(fields))
+
+    line_ids = {}
+    for fields in fields_list:
+        if fields.get("source") and fields.get("line_id") is not None:
+            line_ids.setdefault(fields["source"], []).append(fields["line_id"])
+
+    seen = set()
+    for source, ids in line_ids.items():
+        seen.update(
+            (source, line_id)
+            for line_id in LogEntry.objects.filter(
+                source=source,
+                line_id__gte=min(ids),
+                line_id__lte=max(ids),
+            ).values_list("line_id", flat=True)
+        )
+
+    new_fields = []
+    for fields in fields_list:
+        if fields.get("source") and fields.get("line_id") is not None:
+            key = (fields["source"], fields["line_id"])
+            if key in seen:
+                continue
+            seen.add(key)
+        new_fields.append(fields)
+    if not new_fields:
+        return new_fields
+
+    columns = entry_columns()
+    values = []
+    for attname, _, default, adapt in columns:
+        column = [fields.get(attname, default) for fields in new_fields]
+        if adapt is not None:
+            column = [adapt(v) if v is not None else v for v in column]
+        values.append(column)
+    params = list(zip(*values))
+    quote = connection.ops.quote_name
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        quote(LogEntry._meta.db_table),
+        ", ".join(quote(column) for _, column, _, _ in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    sync_fulltext_index(connection)
+    index_new_entries(new_fields)
+    upsert_templates(new_fields)
+    add_to_rollups(new_fields)
+    add_to_sketches(new_fields)
+    transaction.on_commit(partial(detect_anomalies, new_fields))
+    return new_fields
+
+
+def upsert_templates(fields_list):
+    """
+    Record the ``EventTemplate`` of every ``event_id`` in ``fields_list`` in
+    ``LogTemplate``, replacing older texts of the same event id.
+    """
+    templates = {}
+    for fields in fields_list:
+        template = (fields.get("additional_data") or {}).get("EventTemplate")
+        if fields.get("event_id") and template:
+            templates[fields["event_id"]] = template
+    if templates:
+        LogTemplate.objects.bulk_create(
+            [
+                LogTemplate(event_id=event_id, template=template)
+                for event_id, template in templates.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["event_id"],
+            update_fields=["template", "updated_at"],
+        )
+
+
+def import_batches(
+    batches, commit_interval=DEFAULT_COMMIT_INTERVAL, on_commit=None
+):
+    """
+    Write parsed ``RowBatch`` objects, committing a transaction roughly every
+    ``commit_interval`` rows.
+
+    File checkpoints are advanced in the same transaction as the rows they
+    cover, so an interrupted import resumes after the last committed chunk.
+    ``on_commit``, when given, is called with the committed batches after
+    every transaction. Returns the number of entries inserted.
+    """
+    if commit_interval < 1:
+        raise ValueError("commit_interval must be positive.")
+
+    count = 0
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += len(batch.fields)
+        if pending_rows >= commit_interval:
+            count += commit_batches(pending, on_commit)
+            pending = []
+            pending_rows = 0
+    if pending:
+        count += commit_batches(pending, on_commit)
+    return count
+
+
+def commit_batches(batches, on_commit=None):
+    """
+    Insert parsed ``RowBatch`` objects and advance their file checkpoints in
+    a single transaction, then invalidate the query cache if anything was
+    inserted. Returns the number of entries inserted.
+    """
+    inserted = 0
+    checkpoints = {}
+    with transaction.atomic():
+        for batch in batches:
+            count = len(insert_entries(batch.fields))
+            inserted += count
+            if batch.source:
+                _, line_id, rows = checkpoints.get(batch.source, (None,) * 3)
+                for fields in reversed(batch.fields):
+                    if fields.get("line_id") is not None:
+                        line_id = fields["line_id"]
+                        break
+                checkpoints[batch.source] = (
+                    batch,
+                    line_id,
+                    (rows or 0) + count,
+                )
+
+        for batch, line_id, rows in checkpoints.values():
+            save_checkpoint(batch, line_id, rows)
+    if inserted:
+        get_query_cache().bump_data_version()
+    if on_commit is not None:
+        on_commit(batches)
+    return inserted
+
+
+def save_checkpoint(batch, last_line_id, rows_imported):
+    """
+    Advance the checkpoint of ``batch.source`` to the end of ``batch``.
+    """
+    checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=batch.source)
+    if checkpoint.generation != batch.generation:
+        checkpoint.generation = batch.generation
+        checkpoint.rows_imported = 0
+    checkpoint.byte_offset = batch.end_offset
+    checkpoint.last_line_id = last_line_id
+    checkpoint.fingerprint = batch.fingerprint or file_fingerprint(
+        batch.source, min(batch.end_offset, FINGERPRINT_BYTES)
+    )
+    checkpoint.rows_imported += rows_imported
+    checkpoint.save()
+
+
+def import_entries(
+    fields_iter,
+    batch_size=DEFAULT_BATCH_SIZE,
+    commit_interval=DEFAULT_COMMIT_INTERVAL,
+):
+    """
+    Write ``LogEntry`` field dictionaries with ``insert_entries``.
+
+    Entries are inserted ``batch_size`` at a time and every
+    ``commit_interval`` rows are wrapped in a single transaction. Returns the
+    number of entries written.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive.")
+
+    batches = (
+        RowBatch(fields=chunk) for chunk in chunked(fields_iter, batch_size)
+    )
+    return import_batches(batches, commit_interval)
+
+
+def peak_rss_bytes():
+    """
+    Return the peak resident set size of this process in bytes, or ``None``
+    when the platform does not expose it.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,684 @@
+import bz2
+import csv
+import gzip
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+import numpy as np
+import pytz
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.test import override_settings
+from django.utils import timezone
+from logapp.anomalies import RateDetector
+from logapp.fulltext import fulltext_filter
+from logapp.identifiers import DEFAULT_PATTERNS, identifier_trace
+from logapp.ingest import (
+    DEFAULT_CSV_PATH,
+    chunked,
+    insert_entries,
+    iter_raw_lines,
+    open_input,
+    peak_rss_bytes,
+)
+from logapp.models import LogEntry
+from logapp.parse_database import get_logs_by_hour, similar_logs
+from logapp.rollups import hour_of_day_counts
+from logapp.search_index import SearchIndex
+from logapp.semantic_index import CONCEPTS, SemanticIndex, get_embedder
+from logapp.sketches import distinct_count, top_values
+from logapp.syslog_listener import store_frames
+from logapp.syslog_parser import parse_syslog
+from logapp.template_miner import TemplateMiner
+
+BLOCK_ID = re.compile(DEFAULT_PATTERNS["block"])
+
+
+def sample_raw_lines(path=DEFAULT_CSV_PATH):
+    """
+    Rebuild raw HDFS log lines from the structured sample CSV.
+    """
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        return [
+            f"{row['Date']} {row['Time']} {row['Pid']} {row['Level']} "
+            f"{row['Component']}: {row['Content']}"
+            for row in csv.DictReader(csvfile)
+        ]
+
+
+def scaled_raw_lines(count, seed=0):
+    """
+    Yield ``count`` raw HDFS lines by cycling through the sample and giving
+    every line a fresh random block id, so the output is not just the 2k
+    sample repeated verbatim.
+    """
+    rng = random.Random(seed)
+    sample = sample_raw_lines()
+    for index in range(count):
+        line = sample[index % len(sample)]
+        yield BLOCK_ID.sub(
+            lambda _: f"blk_{rng.randint(-(2**63), 2**63 - 1)}", line
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs throughput benchmarks for LogFlowAI components on synthetic "
+        "data scaled up from the HDFS 2k sample."
+    )
+
+    targets = [
+        "template_miner",
+        "decompression",
+        "syslog",
+        "fulltext",
+        "scoring",
+        "semantic",
+        "similar",
+        "rollups",
+        "sketches",
+        "anomalies",
+        "blocks",
+    ]
+
+    # (label, FTS5 query, equivalent substring for icontains)
+    fulltext_queries = [
+        ("token", "terminating", "terminating"),
+        ("phrase", '"Received block"', "Received block"),
+        ("prefix", "PacketResp*", "PacketResp"),
+        ("rare", "blk_-1608999687919862906", "blk_-1608999687919862906"),
+    ]
+
+    # (label, query) over the synthetic vocabulary of bench_scoring, whose
+    # term0 occurs in half the rows and term<i> in about 1/(i+1) as many.
+    scoring_queries = [
+        ("common", "term0"),
+        ("mixed", "term0 term7 term300"),
+        ("rare", "term1500 term1900"),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", choices=self.targets)
+        parser.add_argument(
+            "--lines",
+            type=int,
+            default=1_000_000,
+            help="Number of synthetic log lines (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        getattr(self, f"bench_{options['target']}")(**options)
+
+    def report(self, label, count, elapsed, unit="lines"):
+        rate = count / elapsed if elapsed > 0 else float("inf")
+        message = (
+            f"{label}: {count:,} {unit} in {elapsed:.2f}s "
+            f"({rate:,.0f} {unit}/sec)"
+        )
+        peak = peak_rss_bytes()
+        if peak is not None:
+            message += f", peak RSS {peak / (1024 * 1024):.1f} MiB"
+        self.stdout.write(message)
+
+    def bench_template_miner(self, lines, **options):
+        """
+        Feed raw lines through the online Drain miner.
+        """
+        miner = TemplateMiner()
+        elapsed = 0.0
+        for chunk in chunked(scaled_raw_lines(lines), 100_000):
+            contents = [line.split(": ", 1)[-1] for line in chunk]
+            started = time.perf_counter()
+            for content in contents:
+                miner.add_log_message(content)
+            elapsed += time.perf_counter() - started
+        self.report("template_miner", lines, elapsed)
+        self.stdout.write(f"templates discovered: {len(miner.clusters)}")
+
+    def bench_decompression(self, lines, **options):
+        """
+        Stream the same raw log through ``open_input`` uncompressed and
+        gzip-, bzip2- and zstd-compressed.
+        """
+        codecs = {"plain": lambda path: open(path, "wb")}
+        codecs["gzip"] = lambda path: gzip.open(path, "wb", compresslevel=6)
+        codecs["bz2"] = lambda path: bz2.open(path, "wb")
+        try:
+            import zstandard
+        except ImportError:
+            self.stdout.write("zstandard is not installed; skipping zstd.")
+        else:
+            codecs["zstd"] = lambda path: zstandard.open(path, "wb")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, opener in codecs.items():
+                path = os.path.join(tmp_dir, f"HDFS.log.{name}")
+                with opener(path) as fh:
+                    for chunk in chunked(scaled_raw_lines(lines), 100_000):
+                        fh.write(("\n".join(chunk) + "\n").encode("utf-8"))
+                started = time.perf_counter()
+                read = end_offset = 0
+                with open_input(path) as fh:
+                    for _, end_offset in iter_raw_lines(fh):
+                        read += 1
+                elapsed = time.perf_counter() - started
+                self.report(f"decompression[{name}]", read, elapsed)
+                self.stdout.write(
+                    f"  {os.path.getsize(path) / (1024 * 1024):.1f} MiB on "
+                    f"disk, {end_offset / (1024 * 1024):.1f} MiB decoded "
+                    f"({end_offset / (1024 * 1024) / elapsed:,.1f} MiB/sec)"
+                )
+
+    def bench_syslog(self, lines, **options):
+        """
+        Parse RFC 3164 and RFC 5424 frames, then parse and insert them the
+        way the syslog listener's writer does. Inserts are rolled back.
+        """
+        frames = []
+        for index, line in enumerate(scaled_raw_lines(lines)):
+            _, _, pid, _, rest = line.split(" ", 4)
+            component, _, content = rest.partition(": ")
+            if index % 2:
+                frame = (
+                    f"<134>Nov  9 20:36:15 node-7 {component}[{pid}]: "
+                    f"{content}"
+                )
+            else:
+                frame = (
+                    f"<134>1 2008-11-09T20:36:15.{index % 1000:03d}Z node-7 "
+                    f"{component} {pid} - - {content}"
+                )
+            frames.append(frame.encode("utf-8"))
+        received = time.time()
+
+        started = time.perf_counter()
+        for frame in frames:
+            parse_syslog(frame, "127.0.0.1", received)
+        self.report("syslog parse", lines, time.perf_counter() - started)
+
+        elapsed = 0.0
+        with transaction.atomic():
+            for chunk in chunked(frames, 1000):
+                items = [(frame, "127.0.0.1", received) for frame in chunk]
+                started = time.perf_counter()
+                store_frames(items)
+                elapsed += time.perf_counter() - started
+            transaction.set_rollback(True)
+        self.report("syslog parse+insert", lines, elapsed)
+
+    def bench_fulltext(self, lines, repeat=3, **options):
+        """
+        Compare keyword search through the FTS5 index with the
+        ``icontains`` scan it replaces, fetching the 100 best BM25 matches
+        and counting all matches. Inserts are rolled back.
+        """
+        now = timezone.now()
+        rare_line = lines // 2
+        with transaction.atomic():
+            started = time.perf_counter()
+            for offset, chunk in enumerate(
+                chunked(scaled_raw_lines(lines), 10_000)
+            ):
+                if offset * 10_000 <= rare_line < (offset + 1) * 10_000:
+                    chunk[rare_line % 10_000] = (
+                        "081109 203615 148 INFO dfs.DataNode: Verification "
+                        "succeeded for blk_-1608999687919862906"
+                    )
+                insert_entries(
+                    [
+                        {"timestamp": now, "message": line.split(": ", 1)[-1]}
+                        for line in chunk
+                    ]
+                )
+            self.report(
+                "fulltext insert (indexed)",
+                lines,
+                time.perf_counter() - started,
+            )
+            for label, match, substring in self.fulltext_queries:
+                fts = fulltext_filter(LogEntry.objects.all(), match)
+                scan = LogEntry.objects.filter(message__icontains=substring)
+                timings = {
+                    "fts top100": lambda: list(fts.values_list("id")[:100]),
+                    "fts count": fts.count,
+                    "icontains first100": lambda: list(
+                        scan.values_list("id")[:100]
+                    ),
+                    "icontains count": scan.count,
+                }
+                results = []
+                for name, run in timings.items():
+                    samples = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        result = run()
+                        samples.append(time.perf_counter() - started)
+                    results.append(
+                        f"{name} {statistics.median(samples) * 1000:.1f} ms"
+                    )
+                    if name == "fts count":
+                        results[-1] += f" ({result:,} matches)"
+                self.stdout.write(
+                    f"fulltext[{label}] {match}: " + ", ".join(results)
+                )
+            transaction.set_rollback(True)
+
+    def bench_scoring(self, lines, repeat=3, **options):
+        """
+        Score queries against a synthetic index of ``lines`` rows with about
+        eight terms each, as whole segments (one score per row at once) and in
+        chunks, returning every hit or only the 100 best. Reports the time to
+        the first chunk's hits, the total time and the peak of memory
+        allocated by the search.
+        """
+        rng = np.random.default_rng(0)
+        terms = 2000
+        frequencies = np.minimum(
+            lines // 2, (lines * 8 / (np.arange(terms) + 1) / 8.2).astype(int)
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            started = time.perf_counter()
+            indices, lengths = [], []
+            for frequency in frequencies:
+                rows = np.unique(rng.integers(0, lines, max(frequency, 1)))
+                indices.append(rows.astype(np.int32))
+                lengths.append(len(rows))
+            indices = np.concatenate(indices)
+            arrays = {
+                "indices": indices,
+                "data": rng.uniform(0.05, 0.5, len(indices)).astype(
+                    np.float32
+                ),
+                "indptr": np.concatenate(([0], np.cumsum(lengths))),
+                "doc_ids": np.arange(1, lines + 1, dtype=np.int64),
+            }
+            del indices
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+            del arrays
+            index = SearchIndex(tmp_dir)
+            index.vocabulary = {f"term{i}": i for i in range(terms)}
+            index.idf = np.log(lines / frequencies).astype(np.float32) + 1
+            index.segments = [
+                {
+                    name: np.load(
+                        os.path.join(tmp_dir, f"{name}.npy"), mmap_mode="r"
+                    )
+                    for name in ("data", "indices", "indptr", "doc_ids")
+                }
+            ]
+            self.report(
+                "scoring setup", lines, time.perf_counter() - started, "rows"
+            )
+
+            variants = {
+                "whole segments": {"chunk_rows": lines},
+                "chunked": {},
+                "chunked top100": {"top_k": 100},
+            }
+            for label, query in self.scoring_queries:
+                results = []
+                for name, variant in variants.items():
+                    first, total, peaks = [], [], []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        chunks = index.iter_search(query, **variant)
+                        next(chunks)
+                        first.append(time.perf_counter() - started)
+                        chunks.close()
+                        tracemalloc.start()
+                        started = time.perf_counter()
+                        hits = len(index.search(query, **variant)[0])
+                        total.append(time.perf_counter() - started)
+                        peaks.append(tracemalloc.get_traced_memory()[1])
+                        tracemalloc.stop()
+                    results.append(
+                        f"{name} first {statistics.median(first) * 1000:.0f}"
+                        f" ms, total {statistics.median(total) * 1000:.0f} ms"
+                        f", peak {max(peaks) / (1024 * 1024):.1f} MiB"
+                        f" ({hits:,} hits)"
+                    )
+                self.stdout.write(
+                    f"scoring[{label}] {query}:\n  " + "\n  ".join(results)
+                )
+
+    def bench_semantic(self, lines, repeat=3, queries=100, **options):
+        """
+        Embed ``lines`` synthetic template texts built from the sample's
+        words, index them and compare approximate (IVF) nearest-neighbor
+        searches at several ``nprobe`` with the exact search: median latency
+        and recall of the exact top 10.
+        """
+        rng = random.Random(0)
+        words = sorted(
+            {
+                word
+                for line in sample_raw_lines()
+                for word in re.findall(
+                    r"[A-Za-z]{3,}", line.split(": ", 1)[-1]
+                )
+            }
+            | {word for text in CONCEPTS.values() for word in text.split()}
+        )
+        texts = [
+            " ".join(rng.choices(words, k=rng.randint(4, 10)))
+            for _ in range(lines)
+        ]
+        embedder = get_embedder()
+        started = time.perf_counter()
+        vectors = embedder.embed(texts)
+        self.report("semantic embed", lines, time.perf_counter() - started)
+        # Queries are indexed texts with one word replaced.
+        probes = []
+        for text in rng.sample(texts, min(queries, lines)):
+            query = text.split()
+            query[rng.randrange(len(query))] = rng.choice(words)
+            probes.append(" ".join(query))
+        probe_vectors = embedder.embed(probes)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            index = SemanticIndex(tmp_dir, embedder)
+            started = time.perf_counter()
+            index.build(np.arange(lines), vectors)
+            self.report("semantic build", lines, time.perf_counter() - started)
+            size = sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(tmp_dir)
+                for name in names
+            )
+            self.stdout.write(
+                f"  {len(index.centroids)} lists, "
+                f"{size / (1024 * 1024):.1f} MiB on disk"
+            )
+
+            def run(**search):
+                samples, found = [], []
+                for vector in probe_vectors:
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        keys, _ = index.search(vector, 10, **search)
+                        timings.append(time.perf_counter() - started)
+                    samples.append(statistics.median(timings))
+                    found.append(set(keys.tolist()))
+                return statistics.median(samples), found
+
+            elapsed, exact = run(exact=True)
+            self.stdout.write(f"semantic[exact]: {elapsed * 1000:.2f} ms")
+            nlist = len(index.centroids)
+            for nprobe in (1, 4, 8, 16, 64):
+                if nprobe > nlist:
+                    break
+                elapsed, found = run(nprobe=nprobe)
+                recall = sum(
+                    len(a & b) / max(len(b), 1) for a, b in zip(found, exact)
+                ) / len(exact)
+                self.stdout.write(
+                    f"semantic[nprobe={nprobe}]: {elapsed * 1000:.2f} ms, "
+                    f"recall@10 {recall:.3f}"
+                )
+            # The int8 codes against the float32 vectors they replace.
+            found = [
+                set(np.argsort(-(vectors @ vector))[:10].tolist())
+                for vector in probe_vectors
+            ]
+            recall = sum(len(a & b) / 10 for a, b in zip(exact, found)) / len(
+                found
+            )
+            self.stdout.write(
+                f"semantic[exact int8 vs float32]: recall@10 {recall:.3f}"
+            )
+
+    def bench_rollups(self, lines, repeat=3, **options):
+        """
+        Insert ``lines`` entries one second apart, which also counts them
+        into the rollups, and compare the dashboard's per-hour counts read
+        from the rollups with the ``GROUP BY`` over every row they replace.
+        Inserts are rolled back.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            started = time.perf_counter()
+            for chunk in chunked(enumerate(scaled_raw_lines(lines)), 10_000):
+                insert_entries(
+                    [
+                        {
+                            "timestamp": now - timedelta(seconds=offset),
+                            "message": line.split(": ", 1)[-1],
+                        }
+                        for offset, line in chunk
+                    ]
+                )
+            self.report("rollups insert", lines, time.perf_counter() - started)
+            timings = {
+                "rollups": hour_of_day_counts,
+                "group by": lambda: list(
+                    get_logs_by_hour(LogEntry.objects.all(), pytz.UTC)
+                ),
+            }
+            for name, run in timings.items():
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    run()
+                    samples.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"rollups[{name}]: "
+                    f"{statistics.median(samples) * 1000:.1f} ms"
+                )
+            transaction.set_rollback(True)
+
+    def bench_similar(self, lines, repeat=3, queries=20, **options):
+        """
+        Insert ``lines`` entries cycling through the sample's structured rows,
+        one per second, and time ``similar_logs`` for random entries within
+        their default one-day window: median and worst latency of the 50
+        most similar entries. Inserts are rolled back.
+        """
+        with open(DEFAULT_CSV_PATH, newline="", encoding="utf-8") as csvfile:
+            sample = list(csv.DictReader(csvfile))
+        now = timezone.now()
+        rng = random.Random(0)
+        with transaction.atomic(), tempfile.TemporaryDirectory() as tmp_dir:
+            started = time.perf_counter()
+            for chunk in chunked(range(lines), 10_000):
+                fields_list = []
+                for line in chunk:
+                    row = sample[line % len(sample)]
+                    fields_list.append(
+                        {
+                            "timestamp": now - timedelta(seconds=line),
+                            "level": row["Level"],
+                            "service": row["Component"],
+                            "message": row["Content"],
+                            "additional_data": {
+                                "EventId": row["EventId"],
+                                "EventTemplate": row["EventTemplate"],
+                            },
+                        }
+                    )
+                insert_entries(fields_list)
+            self.report("similar insert", lines, time.perf_counter() - started)
+            with override_settings(LOGFLOW_SEMANTIC_INDEX_DIR=tmp_dir):
+                entries = [
+                    LogEntry.objects.get(id=entry_id)
+                    for entry_id in rng.sample(
+                        list(LogEntry.objects.values_list("id", flat=True)),
+                        min(queries, lines),
+                    )
+                ]
+                started = time.perf_counter()
+                similar_logs(entries[0])
+                self.stdout.write(
+                    "similar first call (builds the semantic index): "
+                    f"{(time.perf_counter() - started) * 1000:.1f} ms"
+                )
+                samples = []
+                for entry in entries:
+                    timings = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        similar_logs(entry)
+                        timings.append(time.perf_counter() - started)
+                    samples.append(statistics.median(timings))
+                self.stdout.write(
+                    f"similar[templates]: median "
+                    f"{statistics.median(samples) * 1000:.2f} ms, "
+                    f"max {max(samples) * 1000:.2f} ms"
+                )
+            transaction.set_rollback(True)
+
+    def bench_sketches(self, lines, repeat=3, **options):
+        """
+        Insert ``lines`` entries cycling through the sample's structured rows,
+        one per second from 4096 hosts, which also updates the sketches, and
+        time the top templates, hosts and blocks and the distinct hosts and
+        blocks over the whole range against the exact ``GROUP BY``. Inserts
+        are rolled back.
+        """
+        with open(DEFAULT_CSV_PATH, newline="", encoding="utf-8") as csvfile:
+            sample = list(csv.DictReader(csvfile))
+        now = timezone.now()
+        start = now - timedelta(seconds=lines)
+        with transaction.atomic():
+            started = time.perf_counter()
+            for chunk in chunked(range(lines), 10_000):
+                fields_list = []
+                for line in chunk:
+                    row = sample[line % len(sample)]
+                    fields_list.append(
+                        {
+                            "timestamp": now - timedelta(seconds=line),
+                            "level": row["Level"],
+                            "service": row["Component"],
+                            "host": f"10.0.{line % 4096 // 256}.{line % 256}",
+                            "message": row["Content"],
+                            "additional_data": {"EventId": row["EventId"]},
+                        }
+                    )
+                insert_entries(fields_list)
+            self.report(
+                "sketches insert", lines, time.perf_counter() - started
+            )
+            timings = {
+                "top template": lambda: top_values("template", start, now),
+                "top host": lambda: top_values("host", start, now),
+                "top block": lambda: top_values("block", start, now),
+                "distinct host": lambda: distinct_count("host", start, now),
+                "distinct block": lambda: distinct_count("block", start, now),
+                "group by template": lambda: list(
+                    LogEntry.objects.values("event_id")
+                    .annotate(count=Count("id"))
+                    .order_by("-count")[:20]
+                ),
+                "group by host": lambda: LogEntry.objects.values("host")
+                .distinct()
+                .count(),
+            }
+            for name, run in timings.items():
+                samples = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    run()
+                    samples.append(time.perf_counter() - started)
+                self.stdout.write(
+                    f"sketches[{name}]: "
+                    f"{statistics.median(samples) * 1000:.1f} ms"
+                )
+            transaction.set_rollback(True)
+
+    def bench_anomalies(self, lines, keys=100, **options):
+        """
+        Feed ``lines`` entries spread over ``keys`` services, about 1000 per
+        minute bucket, to a ``RateDetector`` in batches of 10,000, with a
+        tenfold burst of one service every 100 buckets, and report the
+        detection throughput alone (nothing is stored).
+        """
+        rng = random.Random(0)
+        start = timezone.now() - timedelta(minutes=lines // 1000 + 1)
+        entries = []
+        for line in range(lines):
+            minute = line // 1000
+            service = rng.randrange(keys)
+            if minute % 100 == 99 and line % 10 == 0:
+                service = 0
+            entries.append(
+                {
+                    "timestamp": start + timedelta(minutes=minute),
+                    "service_norm": f"service{service}",
+                    "level_norm": "info",
+                    "event_id": "E1",
+                }
+            )
+        detector = RateDetector(warmup=10, min_count=5)
+        anomalies = 0
+        started = time.perf_counter()
+        for chunk in chunked(entries, 10_000):
+            anomalies += len(detector.observe(chunk))
+        elapsed = time.perf_counter() - started
+        self.report("anomalies", lines, elapsed)
+        self.stdout.write(
+            f"anomalies: {anomalies} flagged over {lines // 1000} buckets "
+            f"of {keys} keys"
+        )
+
+    def bench_blocks(self, lines, repeat=3, queries=10, **options):
+        """
+        Insert ``lines`` entries whose block ids are drawn from a pool of
+        ``lines // 10``, so a block has about ten entries, which also indexes
+        their identifiers, and time the trace of random blocks from the
+        identifier index against the ``icontains`` scan. Inserts are rolled
+        back.
+        """
+        rng = random.Random(0)
+        blocks = [
+            f"blk_{rng.randint(-(2**63), 2**63 - 1)}"
+            for _ in range(max(lines // 10, 1))
+        ]
+        now = timezone.now()
+        with transaction.atomic():
+            started = time.perf_counter()
+            sample = sample_raw_lines()
+            for chunk in chunked(range(lines), 10_000):
+                insert_entries(
+                    [
+                        {
+                            "timestamp": now - timedelta(seconds=line),
+                            "message": BLOCK_ID.sub(
+                                lambda _: rng.choice(blocks),
+                                sample[line % len(sample)].split(": ", 1)[-1],
+                            ),
+                        }
+                        for line in chunk
+                    ]
+                )
+            self.report("blocks insert", lines, time.perf_counter() - started)
+            timings = {
+                "index": lambda block: list(identifier_trace("block", block)),
+                "icontains": lambda block: list(
+                    LogEntry.objects.filter(message__icontains=block).order_by(
+                        "timestamp", "id"
+                    )
+                ),
+            }
+            for name, run in timings.items():
+                samples = []
+                for block in rng.sample(blocks, min(queries, len(blocks))):
+                    runs = []
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        run(block)
+                        runs.append(time.perf_counter() - started)
+                    samples.append(statistics.median(runs))
+                self.stdout.write(
+                    f"blocks[{name}]: median "
+                    f"{statistics.median(samples) * 1000:.2f} ms, "
+                    f"max {max(samples) * 1000:.2f} ms"
+                )
+            transaction.set_rollback(True)
@@ -1,73 +1,334 @@
-import csv
+import glob
 import os
-import json
-from datetime import datetime
-import pytz
-from django.core.management.base import BaseCommand
-from logapp.models import LogEntry
+import statistics
+import time
+from collections import deque
+from django.core.management.base import BaseCommand, CommandError
+from logapp.ingest import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_COMMIT_INTERVAL,
+    DEFAULT_CSV_PATH,
+    DEFAULT_TEMPLATE_STATE_PATH,
+    INPUT_PATTERNS,
+    assign_templates,
+    commit_batches,
+    detect_compression,
+    detect_format,
+    expand_input_paths,
+    import_batches,
+    iter_parsed_batches,
+    iter_row_batches,
+    parse_row_batch,
+    peak_rss_bytes,
+)
+from logapp.search_index import get_search_index
+from logapp.semantic_index import get_semantic_index
+from logapp.trigram_index import get_trigram_index
+from logapp.tailing import FileTail, iter_follow_batches
+from logapp.template_miner import TemplateMiner
+
+MAX_REPORTED_ERRORS = 10
+# Latency percentiles cover this many of the latest micro-batches, so a
+# long-running --follow keeps constant memory.
+LATENCY_WINDOW = 10_000
 
 
 class Command(BaseCommand):
-    help = "Imports log entries from HDFS_2k.log_structured.csv file"
+    help = (
+        "Streams log entries from structured HDFS CSV files "
+        "(default: HDFS_2k.log_structured.csv) or raw HDFS logs, optionally "
+        "gzip-, bzip2- or zstd-compressed, into the database using batched "
+        "bulk inserts, resuming each file from its checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=DEFAULT_CSV_PATH,
+            help=(
+                "Log file, directory of log files or glob pattern to import "
+                "(default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--format",
+            choices=["auto", "csv", "raw"],
+            default="auto",
+            help=(
+                "Input format: structured CSV, raw HDFS log lines, or auto "
+                "to treat *.csv (and *.csv.gz etc.) files as CSV and "
+                "anything else as raw "
+                "(default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--template-state",
+            default=DEFAULT_TEMPLATE_STATE_PATH,
+            help=(
+                "JSON file holding the online template miner state used to "
+                "assign EventId/EventTemplate to raw logs "
+                "(default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows per bulk insert (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--commit-interval",
+            type=int,
+            default=DEFAULT_COMMIT_INTERVAL,
+            help="Rows per transaction (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--no-resume",
+            action="store_true",
+            help=(
+                "Read every file from the start instead of its checkpoint; "
+                "lines that are already imported are still skipped."
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help=(
+                "Processes used to parse rows; the command itself stays the "
+                "only database writer (default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--follow",
+            action="store_true",
+            help=(
+                "Keep tailing the files after reaching their end, following "
+                "rotation and truncation, and commit new lines in "
+                "micro-batches."
+            ),
+        )
+        parser.add_argument(
+            "--flush-interval",
+            type=float,
+            default=250,
+            help=(
+                "Follow mode: longest time in milliseconds a line waits "
+                "before its micro-batch is committed (default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=50,
+            help=(
+                "Follow mode: milliseconds to sleep when no file has new "
+                "lines (default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--idle-timeout",
+            type=float,
+            default=None,
+            help=(
+                "Follow mode: stop after this many seconds without new lines "
+                "(default: run until interrupted)."
+            ),
+        )
+        parser.add_argument(
+            "--no-index",
+            action="store_true",
+            help=(
+                "Do not add the new entries to the search and trigram "
+                "indexes; the next search catches them up instead."
+            ),
+        )
 
     def handle(self, *args, **options):
-        # Path relative to your project root
-        file_path = os.path.join(
-            "logapp", "data", "HDFS_2k.log_structured.csv"
+        input_format = options["format"]
+        patterns = (
+            INPUT_PATTERNS["csv"] + INPUT_PATTERNS["raw"]
+            if input_format == "auto"
+            else INPUT_PATTERNS[input_format]
         )
-        if not os.path.exists(file_path):
-            self.stdout.write(self.style.ERROR(f"File not found: {file_path}"))
+        paths = expand_input_paths(options["path"], patterns)
+        if (
+            not paths
+            and options["follow"]
+            and not glob.has_magic(options["path"])
+        ):
+            # A followed file may not have been created yet.
+            paths = [options["path"]]
+        if not paths:
+            self.stdout.write(
+                self.style.ERROR(f"File not found: {options['path']}")
+            )
             return
+        if options["batch_size"] < 1 or options["commit_interval"] < 1:
+            raise CommandError(
+                "--batch-size and --commit-interval must be positive."
+            )
+        if options["workers"] < 1:
+            raise CommandError("--workers must be positive.")
+        if options["follow"] and any(
+            os.path.exists(path) and detect_compression(path) for path in paths
+        ):
+            raise CommandError("--follow does not support compressed files.")
+
+        self.errors = []
+        self.error_count = 0
+        self.rows_read = 0
+        self.miner = None
+        self.save_miner = None
+        if any(
+            (detect_format(path) if input_format == "auto" else input_format)
+            == "raw"
+            for path in paths
+        ):
+            state_path = options["template_state"]
+            self.miner = TemplateMiner.load(state_path)
 
-        count = 0
-        with open(file_path, newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                # CSV columns: LineId,Date,Time,Pid,Level,Component,Content,EventId,EventTemplate
-                date_str = row.get("Date")  # e.g. "081109" (MMDDYY)
-                time_str = row.get("Time")  # e.g. "203615" (HHMMSS)
-                timestamp = None
-                if date_str and time_str:
-                    try:
-                        # Combine Date and Time into a datetime object.
-                        dt = datetime.strptime(
-                            date_str + time_str, "%m%d%y%H%M%S"
-                        )
-                        # Assume timestamp is in UTC (adjust as needed)
-                        timestamp = dt.replace(tzinfo=pytz.UTC)
-                    except Exception as e:
-                        self.stdout.write(
-                            self.style.WARNING(
-                                f"Error parsing timestamp: {date_str} {time_str}: {e}"
-                            )
-                        )
-                        timestamp = None
-
-                level = row.get("Level")  # e.g. "INFO"
-                message = row.get("Content")  # the log message
-                service = row.get("Component")  # use Component as service name
-                host = ""  # no host provided in CSV
-
-                # Save extra columns as additional data
-                additional_data = {
-                    "LineId": row.get("LineId"),
-                    "Pid": row.get("Pid"),
-                    "EventId": row.get("EventId"),
-                    "EventTemplate": row.get("EventTemplate"),
-                }
-
-                # Create and save the log entry
-                log_entry = LogEntry(
-                    timestamp=timestamp,
-                    level=level,
-                    message=message,
-                    service=service,
-                    host=host,
-                    additional_data=additional_data,
+            # Persist templates with every commit so committed rows and the
+            # miner state never disagree about event ids after a restart.
+            def save_miner(committed):
+                self.miner.save(state_path)
+
+            self.save_miner = save_miner
+
+        started = time.perf_counter()
+        if options["follow"]:
+            count = self._follow(paths, options)
+        else:
+            count = self._import(paths, options)
+        if not options["no_index"]:
+            indexed = get_search_index().update()
+            get_trigram_index().update()
+            get_semantic_index().update()
+        elapsed = time.perf_counter() - started
+
+        for error in self.errors:
+            self.stdout.write(self.style.WARNING(error))
+        if self.error_count > len(self.errors):
+            self.stdout.write(
+                self.style.WARNING(
+                    f"... {self.error_count - len(self.errors)} more "
+                    "timestamp errors."
                 )
-                log_entry.save()
-                count += 1
+            )
 
         self.stdout.write(
-            self.style.SUCCESS(f"Successfully imported {count} log entries.")
+            self.style.SUCCESS(
+                f"Successfully imported {count} log entries "
+                f"from {len(paths)} file(s)."
+            )
+        )
+        if self.rows_read > count:
+            self.stdout.write(
+                f"Skipped {self.rows_read - count} already imported lines."
+            )
+        if not options["no_index"]:
+            self.stdout.write(f"Indexed {indexed} new entries for search.")
+        if self.miner is not None:
+            self.stdout.write(
+                f"Template miner knows {len(self.miner.clusters)} templates."
+            )
+        self.stdout.write(self._format_report(count, elapsed))
+
+    def _import(self, paths, options):
+        batches = iter_parsed_batches(
+            iter_row_batches(
+                paths,
+                options["batch_size"],
+                resume=not options["no_resume"],
+                input_format=options["format"],
+            ),
+            workers=options["workers"],
+        )
+        if self.miner is not None:
+            batches = assign_templates(batches, self.miner)
+        return import_batches(
+            self._track_batches(batches),
+            commit_interval=options["commit_interval"],
+            on_commit=self.save_miner,
+        )
+
+    def _follow(self, paths, options):
+        tails = [
+            FileTail(
+                path,
+                input_format=options["format"],
+                resume=not options["no_resume"],
+            )
+            for path in paths
+        ]
+        flushes = iter_follow_batches(
+            tails,
+            batch_size=options["batch_size"],
+            flush_interval=options["flush_interval"] / 1000,
+            poll_interval=options["poll_interval"] / 1000,
+            idle_timeout=options["idle_timeout"],
         )
+        self.stdout.write(
+            f"Following {len(tails)} file(s); press Ctrl+C to stop."
+        )
+        count = batch_count = 0
+        latencies = deque(maxlen=LATENCY_WINDOW)
+        try:
+            for batches, arrival in flushes:
+                batches = [parse_row_batch(batch) for batch in batches]
+                if self.miner is not None:
+                    batches = list(assign_templates(batches, self.miner))
+                batches = list(self._track_batches(batches))
+                inserted = commit_batches(batches, on_commit=self.save_miner)
+                count += inserted
+                if not options["no_index"]:
+                    get_search_index().update()
+                    get_trigram_index().update()
+                    get_semantic_index().update()
+                latency = time.monotonic() - arrival
+                latencies.append(latency)
+                batch_count += 1
+                if options["verbosity"] >= 2:
+                    self.stdout.write(
+                        f"Committed {inserted} rows, "
+                        f"latency {latency * 1000:.0f} ms."
+                    )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for tail in tails:
+                tail.close()
+        self.stdout.write(self._format_latency(latencies, batch_count))
+        return count
+
+    def _format_latency(self, latencies, batch_count):
+        if not latencies:
+            return "No micro-batches committed."
+        ordered = sorted(latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        window = (
+            f" (last {len(ordered)})" if batch_count > len(ordered) else ""
+        )
+        return (
+            f"{batch_count} micro-batches, ingest-to-visible latency{window} "
+            f"p50 {statistics.median(ordered) * 1000:.0f} ms, "
+            f"p95 {p95 * 1000:.0f} ms, max {ordered[-1] * 1000:.0f} ms"
+        )
+
+    def _track_batches(self, batches):
+        # Keep only the first few warnings so memory stays constant.
+        for batch in batches:
+            self.rows_read += len(batch.fields)
+            self.error_count += len(batch.errors)
+            self.errors.extend(
+                batch.errors[: MAX_REPORTED_ERRORS - len(self.errors)]
+            )
+            yield batch
+
+    def _format_report(self, count, elapsed):
+        rate = count / elapsed if elapsed > 0 else float("inf")
+        report = f"Elapsed {elapsed:.2f}s, {rate:,.0f} rows/sec"
+        peak = peak_rss_bytes()
+        if peak is not None:
+            report += f", peak RSS {peak / (1024 * 1024):.1f} MiB"
+        return report
@@ -0,0 +1,67 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from logapp.search_index import DEFAULT_CHUNK_SIZE, get_search_index
+from logapp.semantic_index import get_semantic_index
+from logapp.trigram_index import get_trigram_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the persistent search index from every log entry, "
+        "refreshing its vocabulary and IDF weights, the trigram index "
+        "used by regex searches and the semantic index of the templates. "
+        "Meant to run periodically; imports mostly append to the indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Log entries read per query (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--min-df",
+            type=int,
+            default=None,
+            help=(
+                "Leave out terms found in fewer entries (default: "
+                "settings.LOGFLOW_INDEX_MIN_DF)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be positive.")
+        index = get_search_index()
+        started = time.perf_counter()
+        count = index.rebuild(
+            chunk_size=options["chunk_size"], min_df=options["min_df"]
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {count} log entries ({len(index.vocabulary)} terms) "
+                f"in {elapsed:.2f}s."
+            )
+        )
+
+        started = time.perf_counter()
+        count = get_trigram_index().rebuild(chunk_size=options["chunk_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {count} log entries for regex search "
+                f"in {elapsed:.2f}s."
+            )
+        )
+
+        started = time.perf_counter()
+        count = get_semantic_index().rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Embedded {count} templates for semantic search "
+                f"in {elapsed:.2f}s."
+            )
+        )
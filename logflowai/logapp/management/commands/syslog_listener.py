@@ -0,0 +1,134 @@
+import asyncio
+from django.core.management.base import BaseCommand, CommandError
+from logapp.syslog_listener import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_QUEUE_SIZE,
+    SyslogServer,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Listens for syslog messages (RFC 5424 and RFC 3164) over UDP and "
+        "TCP and stores them as log entries using batched bulk inserts."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--host",
+            default="127.0.0.1",
+            help="Address to bind (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--udp-port",
+            type=int,
+            default=5514,
+            help="UDP port to listen on (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--tcp-port",
+            type=int,
+            default=5514,
+            help="TCP port to listen on (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--no-udp", action="store_true", help="Do not listen on UDP."
+        )
+        parser.add_argument(
+            "--no-tcp", action="store_true", help="Do not listen on TCP."
+        )
+        parser.add_argument(
+            "--queue-size",
+            type=int,
+            default=DEFAULT_QUEUE_SIZE,
+            help=(
+                "Messages buffered for the database writer; UDP messages "
+                "arriving while it is full are dropped (default: "
+                "%(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Messages per bulk insert (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--flush-interval",
+            type=float,
+            default=250,
+            help=(
+                "Longest time in milliseconds a message waits before its "
+                "batch is committed (default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--stats-interval",
+            type=float,
+            default=10,
+            help=(
+                "Seconds between counter and queue-depth reports "
+                "(default: %(default)s)."
+            ),
+        )
+        parser.add_argument(
+            "--run-for",
+            type=float,
+            default=None,
+            help="Stop after this many seconds (default: run until "
+            "interrupted).",
+        )
+
+    def handle(self, *args, **options):
+        if options["no_udp"] and options["no_tcp"]:
+            raise CommandError("--no-udp and --no-tcp cannot both be set.")
+        if options["queue_size"] < 1 or options["batch_size"] < 1:
+            raise CommandError(
+                "--queue-size and --batch-size must be positive."
+            )
+        server = SyslogServer(
+            host=options["host"],
+            udp_port=None if options["no_udp"] else options["udp_port"],
+            tcp_port=None if options["no_tcp"] else options["tcp_port"],
+            queue_size=options["queue_size"],
+            batch_size=options["batch_size"],
+            flush_interval=options["flush_interval"] / 1000,
+        )
+        try:
+            asyncio.run(self._serve(server, options))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(server.format_stats()))
+
+    async def _serve(self, server, options):
+        await server.start()
+        listening = ", ".join(
+            f"{name.upper()} {options['host']}:{port}"
+            for name, port in server.ports.items()
+        )
+        self.stdout.write(f"Listening for syslog on {listening}.")
+        loop = asyncio.get_running_loop()
+        stop_at = (
+            loop.time() + options["run_for"]
+            if options["run_for"] is not None
+            else None
+        )
+        try:
+            while stop_at is None or loop.time() < stop_at:
+                interval = options["stats_interval"]
+                if stop_at is not None:
+                    interval = min(interval, stop_at - loop.time())
+                dropped = server.stats.dropped
+                await asyncio.sleep(max(interval, 0))
+                self._report(server, server.stats.dropped - dropped)
+        finally:
+            await server.stop()
+
+    def _report(self, server, newly_dropped):
+        if server.last_error is not None:
+            self.stdout.write(
+                self.style.ERROR(f"Write failed: {server.last_error}")
+            )
+            server.last_error = None
+        style = self.style.WARNING if newly_dropped else (lambda text: text)
+        self.stdout.write(style(server.format_stats()))
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0005_alter_logentry_timestamp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=512, unique=True)),
+                ("byte_offset", models.BigIntegerField(default=0)),
+                (
+                    "last_line_id",
+                    models.BigIntegerField(blank=True, null=True),
+                ),
+                ("fingerprint", models.CharField(blank=True, max_length=64)),
+                ("rows_imported", models.BigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="logentry",
+            name="line_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="logentry",
+            name="source",
+            field=models.CharField(blank=True, max_length=512, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="logentry",
+            constraint=models.UniqueConstraint(
+                fields=("source", "line_id"),
+                name="logentry_unique_source_line",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0006_import_checkpoints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="importcheckpoint",
+            name="generation",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.5 on 2026-10-18 11:43
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 5000
+DERIVED_FIELDS = ["level_norm", "service_norm", "event_id", "line_id"]
+
+
+def normalized_fields(entry):
+    """
+    Return the derived columns of ``entry`` as this migration defines them:
+    case-folded ``level``/``service`` and the ``EventId`` and ``LineId``
+    promoted out of ``additional_data``. A frozen copy of
+    ``logapp.models.normalized_fields``, which may change later.
+    """
+    extra = entry.additional_data
+    if not isinstance(extra, dict):
+        extra = {}
+    event_id = extra.get("EventId") or None
+    line_id = entry.line_id
+    if line_id is None:
+        line_id = extra.get("LineId")
+        if isinstance(line_id, str):
+            line_id = int(line_id) if line_id.isdigit() else None
+        elif not isinstance(line_id, int) or isinstance(line_id, bool):
+            line_id = None
+    return {
+        "level_norm": entry.level.casefold() if entry.level else entry.level,
+        "service_norm": (
+            entry.service.casefold() if entry.service else entry.service
+        ),
+        "event_id": str(event_id)[:32] if event_id is not None else None,
+        "line_id": line_id,
+    }
+
+
+def backfill_derived_columns(apps, schema_editor):
+    """
+    Fill the new columns of existing rows, walking the table by primary key
+    in batches so memory stays bounded on large tables.
+    """
+    LogEntry = apps.get_model("logapp", "LogEntry")
+    entries = LogEntry.objects.using(schema_editor.connection.alias)
+    last_id = 0
+    while True:
+        batch = list(
+            entries.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "level", "service", "additional_data", "line_id")[
+                :BACKFILL_BATCH_SIZE
+            ]
+        )
+        if not batch:
+            break
+        for entry in batch:
+            for name, value in normalized_fields(entry).items():
+                setattr(entry, name, value)
+        entries.bulk_update(batch, DERIVED_FIELDS)
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0007_importcheckpoint_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="logentry",
+            name="event_id",
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name="logentry",
+            name="level_norm",
+            field=models.CharField(
+                blank=True, editable=False, max_length=20, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="logentry",
+            name="service_norm",
+            field=models.CharField(
+                blank=True, editable=False, max_length=100, null=True
+            ),
+        ),
+        # Backfill before creating the indexes so they are built once.
+        migrations.RunPython(
+            backfill_derived_columns, migrations.RunPython.noop
+        ),
+        migrations.AlterField(
+            model_name="logentry",
+            name="event_id",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=32, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="logentry",
+            name="line_id",
+            field=models.BigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="logentry",
+            index=models.Index(
+                fields=["service_norm", "level_norm", "timestamp"],
+                name="logentry_service_level_ts",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="logentry",
+            index=models.Index(
+                fields=["timestamp"], name="logentry_timestamp"
+            ),
+        ),
+    ]
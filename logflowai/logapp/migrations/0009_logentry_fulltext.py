@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:05
+
+from django.db import migrations
+from logapp.fulltext import create_fulltext_index, drop_fulltext_index
+
+
+def create_index(apps, schema_editor):
+    create_fulltext_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    drop_fulltext_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0008_promoted_filter_columns"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:05
+
+from django.db import migrations, models
+from django.db.models import Max
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def backfill_templates(apps, schema_editor):
+    """
+    Create one template per distinct ``event_id``, taking the text from the
+    newest entry of each so that generalized templates win.
+    """
+    LogEntry = apps.get_model("logapp", "LogEntry")
+    LogTemplate = apps.get_model("logapp", "LogTemplate")
+    alias = schema_editor.connection.alias
+    latest_ids = list(
+        LogEntry.objects.using(alias)
+        .filter(event_id__isnull=False)
+        .values("event_id")
+        .annotate(latest_id=Max("id"))
+        .values_list("latest_id", flat=True)
+    )
+    for start in range(0, len(latest_ids), BACKFILL_BATCH_SIZE):
+        entries = LogEntry.objects.using(alias).filter(
+            id__in=latest_ids[start : start + BACKFILL_BATCH_SIZE]
+        )
+        LogTemplate.objects.using(alias).bulk_create(
+            LogTemplate(
+                event_id=entry.event_id,
+                template=entry.additional_data["EventTemplate"],
+            )
+            for entry in entries.only("event_id", "additional_data")
+            if isinstance(entry.additional_data, dict)
+            and entry.additional_data.get("EventTemplate")
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0009_logentry_fulltext"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogTemplate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("event_id", models.CharField(max_length=32, unique=True)),
+                ("template", models.TextField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_templates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.5 on 2026-10-18 12:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0010_log_templates"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchScore",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("search_id", models.BigIntegerField()),
+                ("similarity", models.FloatField()),
+                ("rank", models.FloatField(null=True)),
+            ],
+            options={
+                "db_table": "logapp_search_score",
+                "managed": False,
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0011_search_score"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="logentry",
+            index=models.Index(
+                fields=["event_id", "timestamp"], name="logentry_event_ts"
+            ),
+        ),
+    ]
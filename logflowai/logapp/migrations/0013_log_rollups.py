@@ -0,0 +1,56 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0012_logentry_event_timestamp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("granularity", models.IntegerField()),
+                ("bucket", models.BigIntegerField()),
+                (
+                    "service",
+                    models.CharField(blank=True, default="", max_length=100),
+                ),
+                (
+                    "level",
+                    models.CharField(blank=True, default="", max_length=20),
+                ),
+                (
+                    "event_id",
+                    models.CharField(blank=True, default="", max_length=32),
+                ),
+                ("count", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "granularity",
+                            "bucket",
+                            "service",
+                            "level",
+                            "event_id",
+                        ),
+                        name="logrollup_unique_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0013_log_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogSketch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sketch", models.CharField(max_length=32)),
+                ("granularity", models.IntegerField()),
+                ("bucket", models.BigIntegerField()),
+                ("data", models.BinaryField()),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("sketch", "granularity", "bucket"),
+                        name="logsketch_unique_key",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0014_log_sketches"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogAnomaly",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.BigIntegerField()),
+                ("interval", models.IntegerField()),
+                (
+                    "service",
+                    models.CharField(blank=True, default="", max_length=100),
+                ),
+                (
+                    "level",
+                    models.CharField(blank=True, default="", max_length=20),
+                ),
+                (
+                    "event_id",
+                    models.CharField(blank=True, default="", max_length=32),
+                ),
+                ("kind", models.CharField(max_length=8)),
+                ("count", models.BigIntegerField()),
+                ("expected", models.FloatField()),
+                ("score", models.FloatField()),
+                ("detected_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["bucket"], name="loganomaly_bucket")
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.5 on 2026-10-18 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("logapp", "0015_log_anomalies"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LogIdentifier",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("kind", models.CharField(max_length=16)),
+                ("value", models.CharField(max_length=64)),
+                (
+                    "entry",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="identifiers",
+                        to="logapp.logentry",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["kind", "value", "entry"],
+                        name="logidentifier_lookup",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,6 +1,35 @@
 from django.db import models
 
 
+def casefold(value):
+    return value.casefold() if value else value
+
+
+def normalized_fields(fields):
+    """
+    Return the derived ``LogEntry`` columns for a mapping of its fields:
+    case-folded ``level``/``service`` and the ``EventId`` and ``LineId``
+    promoted out of ``additional_data``. An explicit ``line_id`` wins.
+    """
+    extra = fields.get("additional_data")
+    if not isinstance(extra, dict):
+        extra = {}
+    event_id = extra.get("EventId") or None
+    line_id = fields.get("line_id")
+    if line_id is None:
+        line_id = extra.get("LineId")
+        if isinstance(line_id, str):
+            line_id = int(line_id) if line_id.isdigit() else None
+        elif not isinstance(line_id, int) or isinstance(line_id, bool):
+            line_id = None
+    return {
+        "level_norm": casefold(fields.get("level")),
+        "service_norm": casefold(fields.get("service")),
+        "event_id": str(event_id)[:32] if event_id is not None else None,
+        "line_id": line_id,
+    }
+
+
 class LogEntry(models.Model):
     """
     LogEntry model representing a log event with various details such as timestamp, level,
@@ -23,12 +52,27 @@ class LogEntry(models.Model):
         The hostname or IP address of the machine where the log originated.
     additional_data : dict, optional
         Any additional structured data stored as JSON.
+    source : str, optional
+        The absolute path of the file the entry was imported from.
+    line_id : int, optional
+        The ``LineId`` of the entry within ``source``. Together with
+        ``source`` it uniquely identifies an imported line, so re-imports
+        cannot create duplicates.
+    level_norm : str, optional
+        Case-folded copy of ``level``, maintained by ``normalize()``.
+    service_norm : str, optional
+        Case-folded copy of ``service``, maintained by ``normalize()``.
+    event_id : str, optional
+        The ``EventId`` from ``additional_data``, promoted to an indexed
+        column.
 
     Methods
     -------
     __str__()
         Returns a string representation of the log entry in the format:
         [timestamp] level: message.
+    normalize()
+        Fills the derived columns from the ones they are computed from.
     """
 
     timestamp = models.DateTimeField(null=True)
@@ -37,6 +81,322 @@ class LogEntry(models.Model):
     service = models.CharField(max_length=100, null=True, blank=True)
     host = models.CharField(max_length=100, null=True, blank=True)
     additional_data = models.JSONField(null=True, blank=True)
+    source = models.CharField(max_length=512, null=True, blank=True)
+    line_id = models.BigIntegerField(null=True, blank=True, db_index=True)
+    level_norm = models.CharField(
+        max_length=20, null=True, blank=True, editable=False
+    )
+    service_norm = models.CharField(
+        max_length=100, null=True, blank=True, editable=False
+    )
+    event_id = models.CharField(
+        max_length=32, null=True, blank=True, db_index=True
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source", "line_id"],
+                name="logentry_unique_source_line",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["service_norm", "level_norm", "timestamp"],
+                name="logentry_service_level_ts",
+            ),
+            models.Index(fields=["timestamp"], name="logentry_timestamp"),
+            models.Index(
+                fields=["event_id", "timestamp"], name="logentry_event_ts"
+            ),
+        ]
 
     def __str__(self):
         return f"[{self.timestamp}] {self.level}: {self.message}"
+
+    def normalize(self):
+        for name, value in normalized_fields(self.__dict__).items():
+            setattr(self, name, value)
+
+    def save(self, *args, **kwargs):
+        self.normalize()
+        super().save(*args, **kwargs)
+
+
+class ImportCheckpoint(models.Model):
+    """
+    ImportCheckpoint model recording how far an input file has been imported,
+    so that re-running an import only appends new lines and an interrupted
+    import resumes where it stopped.
+
+    Parameters
+    ----------
+    source : str
+        The absolute path of the imported file.
+    byte_offset : int
+        The offset just past the last committed line of the file.
+    last_line_id : int, optional
+        The ``LineId`` of the last committed line.
+    fingerprint : str
+        SHA-256 of the first bytes of the file (up to ``byte_offset``), used
+        to detect files that were replaced or rewritten.
+    generation : int
+        How often the file was found rotated, truncated or replaced. Lines of
+        later generations are stored with a ``#<generation>`` source suffix.
+    rows_imported : int
+        The number of rows inserted from the current generation so far.
+    updated_at : datetime
+        When the checkpoint was last advanced.
+    """
+
+    source = models.CharField(max_length=512, unique=True)
+    byte_offset = models.BigIntegerField(default=0)
+    last_line_id = models.BigIntegerField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=64, blank=True)
+    generation = models.IntegerField(default=0)
+    rows_imported = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} @ {self.byte_offset}"
+
+
+class LogTemplate(models.Model):
+    """
+    LogTemplate model holding the distinct event templates of the stored
+    log entries, keyed by the ``event_id`` the entries carry. Template-mode
+    searches score these instead of every row.
+
+    Parameters
+    ----------
+    event_id : str
+        The ``EventId`` of the template, matching ``LogEntry.event_id``.
+    template : str
+        The latest ``EventTemplate`` seen for the event id; an online miner
+        may generalize it over time.
+    updated_at : datetime
+        When the template was last written.
+    """
+
+    event_id = models.CharField(max_length=32, unique=True)
+    template = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.event_id}: {self.template}"
+
+
+class SearchScore(models.Model):
+    """
+    SearchScore model mapping the per-connection temporary table into which
+    ``filter_logs`` writes the scores of a search. Results are ranked by
+    joining it rather than by a ``CASE`` expression over every match. The
+    table is created on demand (``logapp.parse_database.store_scores``), not
+    by a migration.
+
+    Parameters
+    ----------
+    search_id : int
+        Identifies one ``filter_logs`` call.
+    entry : LogEntry
+        The matching log entry.
+    similarity : float
+        1.0 for exact matches, the cosine similarity otherwise.
+    rank : float, optional
+        The BM25 rank of exact matches (lower is better).
+    """
+
+    search_id = models.BigIntegerField()
+    entry = models.ForeignKey(
+        LogEntry,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="search_scores",
+    )
+    similarity = models.FloatField()
+    rank = models.FloatField(null=True)
+
+    class Meta:
+        managed = False
+        db_table = "logapp_search_score"
+
+
+class LogRollup(models.Model):
+    """
+    LogRollup model counting the log entries per time bucket, service, level
+    and event id, at the granularities of ``logapp.rollups.GRANULARITIES``.
+    Imports add to it as they commit, so the dashboard reads these counts
+    instead of aggregating ``LogEntry``.
+
+    Parameters
+    ----------
+    granularity : int
+        Width of the bucket in seconds.
+    bucket : int
+        Unix time (UTC) at which the bucket starts, a multiple of
+        ``granularity``.
+    service : str
+        Case-folded service of the counted entries, empty when unknown.
+    level : str
+        Case-folded level of the counted entries, empty when unknown.
+    event_id : str
+        Event id of the counted entries, empty when unknown.
+    count : int
+        Number of entries.
+    """
+
+    granularity = models.IntegerField()
+    bucket = models.BigIntegerField()
+    service = models.CharField(max_length=100, blank=True, default="")
+    level = models.CharField(max_length=20, blank=True, default="")
+    event_id = models.CharField(max_length=32, blank=True, default="")
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "granularity",
+                    "bucket",
+                    "service",
+                    "level",
+                    "event_id",
+                ],
+                name="logrollup_unique_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket}/{self.granularity}s: {self.count}"
+
+
+class LogSketch(models.Model):
+    """
+    LogSketch model holding a serialized sketch of the log entries of one time
+    bucket: a Space-Saving summary of the most frequent values or a
+    HyperLogLog counter of the distinct values (see ``logapp.sketches``).
+    Imports update it as they commit; queries over a range merge the sketches
+    of its buckets.
+
+    Parameters
+    ----------
+    sketch : str
+        Name of the sketch, such as ``"top:template"`` or
+        ``"distinct:host:errors"``.
+    granularity : int
+        Width of the bucket in seconds, an hour or a day.
+    bucket : int
+        Unix time (UTC) at which the bucket starts, a multiple of
+        ``granularity``.
+    data : bytes
+        The serialized sketch.
+    """
+
+    sketch = models.CharField(max_length=32)
+    granularity = models.IntegerField()
+    bucket = models.BigIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sketch", "granularity", "bucket"],
+                name="logsketch_unique_key",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.sketch} {self.bucket}/{self.granularity}s"
+
+
+class LogAnomaly(models.Model):
+    """
+    LogAnomaly model recording a spike or drop in the rate of the log entries
+    of one service, level and event id, flagged at ingest by
+    ``logapp.anomalies.RateDetector``.
+
+    Parameters
+    ----------
+    bucket : int
+        Unix time (UTC) at which the anomalous bucket starts.
+    interval : int
+        Width of the bucket in seconds.
+    service : str
+        Case-folded service of the entries, empty when unknown.
+    level : str
+        Case-folded level of the entries, empty when unknown.
+    event_id : str
+        Event id of the entries, empty when unknown.
+    kind : str
+        ``"spike"`` or ``"drop"``.
+    count : int
+        Number of entries in the bucket.
+    expected : float
+        Number of entries the baseline expected.
+    score : float
+        Distance of ``count`` from ``expected``, in standard deviations.
+    detected_at : datetime
+        When the anomaly was recorded.
+    """
+
+    bucket = models.BigIntegerField()
+    interval = models.IntegerField()
+    service = models.CharField(max_length=100, blank=True, default="")
+    level = models.CharField(max_length=20, blank=True, default="")
+    event_id = models.CharField(max_length=32, blank=True, default="")
+    kind = models.CharField(max_length=8)
+    count = models.BigIntegerField()
+    expected = models.FloatField()
+    score = models.FloatField()
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["bucket"], name="loganomaly_bucket"),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.kind} of {self.service}/{self.level}/{self.event_id} "
+            f"at {self.bucket}: {self.count} (expected {self.expected:.1f})"
+        )
+
+
+class LogIdentifier(models.Model):
+    """
+    LogIdentifier model mapping an identifier found in a log message, such
+    as an HDFS block id or an IP address, to the entry mentioning it (see
+    ``logapp.identifiers``).
+
+    Parameters
+    ----------
+    kind : str
+        Kind of identifier, a key of ``settings.LOGFLOW_IDENTIFIER_PATTERNS``.
+    value : str
+        The identifier as it appears in the message.
+    entry : LogEntry
+        The entry whose message mentions it.
+    """
+
+    kind = models.CharField(max_length=16)
+    value = models.CharField(max_length=64)
+    # Only the (kind, value, entry) index is kept up to date at ingest: rows of
+    # deleted entries are left behind, and drop out of the joins.
+    entry = models.ForeignKey(
+        LogEntry,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="identifiers",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["kind", "value", "entry"],
+                name="logidentifier_lookup",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.value} -> {self.entry_id}"
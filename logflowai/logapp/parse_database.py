@@ -1,11 +1,92 @@
+import base64
+import binascii
 import re
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from itertools import count, repeat
 import pytz
-from django.db.models import Count, F
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.utils import timezone
+from django.db.models.expressions import RawSQL
 from django.db.models.functions import ExtractHour
+from django.db.models.sql import Query
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from .models import LogEntry
+from .fulltext import fulltext_filter, fulltext_ids
+from .models import LogEntry, LogTemplate, SearchScore, casefold
+from .query_cache import get_query_cache
+from .query_language import compile_filters, parse_query
+from .rollups import hour_of_day_counts
+from .search_index import get_search_index
+from .semantic_index import get_semantic_index
+from .trigram_index import get_trigram_index
+
+SEARCH_MODES = ("rows", "templates", "semantic")
+
+# Most templates a semantic search expands to rows.
+SEMANTIC_TEMPLATES = 50
+
+# Default reach of a "more like this" lookup around the entry's timestamp, in
+# seconds, and the default and largest number of entries it returns.
+DEFAULT_SIMILAR_WINDOW = 24 * 3600
+DEFAULT_SIMILAR_LIMIT = 50
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+SCORE_TABLE = SearchScore._meta.db_table
+CREATE_SCORE_TABLE_SQL = [
+    f"CREATE TEMP TABLE IF NOT EXISTS {SCORE_TABLE} ("
+    "id INTEGER PRIMARY KEY, search_id INTEGER NOT NULL, "
+    "entry_id INTEGER NOT NULL, similarity REAL NOT NULL, rank REAL)",
+    f"CREATE UNIQUE INDEX IF NOT EXISTS temp.{SCORE_TABLE}_entry "
+    f"ON {SCORE_TABLE} (search_id, entry_id)",
+]
+
+# Candidate entries of a regex search read per query, and the share of the
+# indexed entries above which scanning every message is cheaper than reading
+# the candidates one by one.
+REGEX_CHUNK_SIZE = 500
+REGEX_SCAN_FRACTION = 0.1
+
+# How many of the latest search ids keep their scores, so recently returned
+# querysets can still be evaluated.
+KEEP_SEARCHES = 16
+
+search_ids = count(1)
+
+
+class ExpiredSearchError(RuntimeError):
+    """
+    Raised when a queryset joining stored search scores is evaluated after
+    they were dropped, or on another database connection (see
+    ``store_scores``).
+    """
+
+
+class ScoredQuery(Query):
+    """
+    A query joining the scores stored under ``search_ids``, which raises
+    ``ExpiredSearchError`` rather than run without them.
+    """
+
+    search_ids = ()
+
+    def get_compiler(self, using=None, connection=None, elide_empty=True):
+        if connection is None and using is not None:
+            connection = connections[using]
+        if connection is not None:
+            live = live_searches(connection)
+            for search_id in self.search_ids:
+                if search_id not in live:
+                    raise ExpiredSearchError(
+                        f"The scores of search {search_id} were dropped; "
+                        "evaluate the results of filter_logs before "
+                        f"{KEEP_SEARCHES} more searches, on the same "
+                        "connection."
+                    )
+        return super().get_compiler(using, connection, elide_empty)
 
 
 def filter_logs(
@@ -15,66 +96,483 @@ def filter_logs(
     start_date=None,
     end_date=None,
     similarity_threshold=0.1,
+    mode="rows",
+    regex=None,
+    top_k=None,
 ):
     """
     Filter logs based on a search query, log level, service, and date range.
+
+    ``query`` may contain ``field:value`` clauses (see
+    ``logapp.query_language``), which become lookups on indexed columns; only
+    its remaining free text is searched for. A query made of clauses alone
+    skips the search and returns the matching entries in timestamp order.
+    Raises ``ValueError`` for a malformed query.
+
+    ``regex`` additionally requires the message to match that regular
+    expression (see ``regex_filter``).
+
+    Level and service are matched case-insensitively through the case-folded
+    ``level_norm``/``service_norm`` columns, and the date range becomes a
+    half-open timestamp range, so the filters can use the indexes.
+
+    Exact matches are looked up in the FTS5 index (see
+    ``logapp.fulltext.build_match_query`` for the query syntax) and ranked
+    by BM25 in the ``rank`` annotation; they score a ``similarity`` of 1.0.
+
+    ``mode`` selects how similar messages are found: ``"rows"`` scores every
+    row through the search index, ``"templates"`` scores the distinct event
+    templates and returns the rows of the qualifying ones (see
+    ``template_matches``), and ``"semantic"`` does the same with the nearest
+    templates in the embedding space, which also finds paraphrases (see
+    ``semantic_matches``). ``top_k`` keeps only that many of the most similar
+    index hits, before the other filters apply; exact matches are always
+    kept.
+
+    The ranked results of a search (and the matches of ``regex``) are stored
+    in a per-connection temporary table and joined lazily, so the returned
+    queryset must be evaluated in the same thread, before ``KEEP_SEARCHES``
+    further searches drop its scores (see ``store_scores``); otherwise it
+    raises ``ExpiredSearchError``.
     """
-    logs = LogEntry.objects.all()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode: {mode!r}.")
+    parsed = parse_query(query)
+    query = parsed.text
+    logs = LogEntry.objects.filter(compile_filters(parsed.filters))
 
     if level:
-        logs = logs.filter(level__iexact=level)
+        logs = logs.filter(level_norm=casefold(level))
     if service:
-        logs = logs.filter(service__iexact=service)
+        logs = logs.filter(service_norm=casefold(service))
     if start_date and end_date:
-        logs = logs.filter(timestamp__date__range=[start_date, end_date])
+        start, end = date_range_bounds(start_date, end_date)
+        logs = logs.filter(timestamp__gte=start, timestamp__lt=end)
+    if regex:
+        logs = regex_filter(logs, regex)
 
-    if not query:
-        return logs.order_by("timestamp").distinct()
+    if parsed.is_precise:
+        # Filters alone answer the query; there is nothing to rank.
+        return logs.order_by("timestamp", "id")
 
-    # Exact match on the message
-    exact_matches = logs.filter(message__icontains=query)
-    log_list = list(
-        logs.exclude(id__in=exact_matches.values_list("id", flat=True))
+    # Exact match on the message: a full-text match where the FTS5 index
+    # exists, ranked by BM25, and a substring match otherwise.
+    exact_matches = fulltext_filter(logs, query)
+    exact_ids = fulltext_ids(logs, query)
+    if exact_matches is None:
+        exact_matches = logs.filter(message__icontains=query).annotate(
+            rank=Value(0.0, output_field=FloatField())
+        )
+        exact_ids = exact_matches.values("id")
+
+    if mode == "templates":
+        return template_matches(logs, query, exact_ids, similarity_threshold)
+    if mode == "semantic":
+        return semantic_matches(logs, query, exact_ids, similarity_threshold)
+
+    # Similar messages come from the persistent index, which is first caught
+    # up with rows inserted since its last update; only imports rebuild it.
+    index = get_search_index()
+    index.update(rebuild=False)
+    hit_ids, hit_scores = index.search(
+        query, similarity_threshold, top_k=top_k
     )
-    if not log_list:
-        return exact_matches
 
-    messages = [preprocess_text(log.message) for log in log_list]
-    processed_query = preprocess_text(query)
-    similarity_scores = compute_similarity_scores(processed_query, messages)
+    # Exact matches score 1.0; joining the stored scores back applies the
+    # filters to the index hits and orders everything in one query.
+    exact_scores = [
+        (log_id, 1.0, rank)
+        for log_id, rank in exact_matches.values_list("id", "rank")
+    ]
+    search_id = store_scores(
+        logs.db,
+        exact_scores,
+        zip(hit_ids.tolist(), hit_scores.tolist(), repeat(None)),
+    )
+    return scored(
+        logs.filter(search_scores__search_id=search_id)
+        .annotate(
+            similarity=F("search_scores__similarity"),
+            rank=F("search_scores__rank"),
+        )
+        .order_by("-similarity", "rank", "id"),
+        search_id,
+    )
 
-    log_scores = [
-        (log.id, score)
-        for log, score in zip(log_list, similarity_scores)
-        if score >= similarity_threshold
+
+def regex_filter(logs, pattern):
+    """
+    Restrict ``logs`` to the entries whose message matches the regular
+    expression ``pattern`` anywhere (``re.search``). Raises ``ValueError``
+    for an invalid pattern.
+
+    The trigram index narrows the entries down to candidates containing
+    every trigram a match needs; only those, and entries newer than the
+    index, are read and matched in Python. Patterns without such trigrams,
+    or with candidates making up more than ``REGEX_SCAN_FRACTION`` of the
+    index, are matched against every message by the database instead.
+    """
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid regex {pattern!r}: {e}.") from None
+    index = get_trigram_index()
+    index.update()
+    candidates = index.candidates(pattern)
+    if (
+        candidates is None
+        or len(candidates) > REGEX_SCAN_FRACTION * index.doc_count
+    ):
+        return logs.filter(message__regex=pattern)
+
+    chunks = [
+        logs.filter(
+            id__in=candidates[start : start + REGEX_CHUNK_SIZE].tolist()
+        )
+        for start in range(0, len(candidates), REGEX_CHUNK_SIZE)
+    ]
+    chunks.append(logs.filter(id__gt=index.last_id))
+    matches = [
+        log_id
+        for chunk in chunks
+        for log_id, message in chunk.values_list("id", "message")
+        if message and compiled.search(message)
     ]
+    # The matches are joined back like search scores, as an id list this
+    # long would exceed SQLite's parameter limit.
+    search_id = store_scores(
+        logs.db, [(log_id, 1.0, None) for log_id in matches]
+    )
+    return scored(
+        logs.filter(
+            id__in=RawSQL(
+                f"SELECT entry_id FROM {SCORE_TABLE} WHERE search_id = %s",
+                [search_id],
+            )
+        ),
+        search_id,
+    )
 
-    if not log_scores:
-        return exact_matches
 
-    # Combine exact matches (score=1.0) with similarity scores
-    from django.db.models import Case, When, FloatField, Value
+def store_scores(using, *scores):
+    """
+    Write ``(entry_id, similarity, rank)`` iterables into the connection's
+    temporary ``SearchScore`` table under a new search id and return it.
+    The first score stored for an entry wins.
+
+    The table only lives as long as the database connection. Scores of
+    searches more than ``KEEP_SEARCHES`` search ids old are deleted; querysets
+    joining them then raise ``ExpiredSearchError`` (see ``scored``).
+    """
+    search_id = next(search_ids)
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in CREATE_SCORE_TABLE_SQL:
+            cursor.execute(sql)
+        cursor.execute(
+            f"DELETE FROM {SCORE_TABLE} WHERE search_id <= %s",
+            [search_id - KEEP_SEARCHES],
+        )
+        for rows in scores:
+            cursor.executemany(
+                f"INSERT OR IGNORE INTO {SCORE_TABLE} "
+                "(search_id, entry_id, similarity, rank) "
+                "VALUES (%s, %s, %s, %s)",
+                [(search_id, *row) for row in rows],
+            )
+    live = live_searches(connection)
+    live.difference_update(
+        [old_id for old_id in live if old_id <= search_id - KEEP_SEARCHES]
+    )
+    live.add(search_id)
+    return search_id
+
+
+def live_searches(connection):
+    """
+    Return the set of search ids whose scores the current session of
+    ``connection`` still holds; a new session starts with none.
+    """
+    session, live = getattr(connection, "logflow_searches", (None, None))
+    if live is None or session is not connection.connection:
+        live = set()
+        connection.logflow_searches = (connection.connection, live)
+    return live
+
+
+def scored(logs, search_id):
+    """
+    Return ``logs``, which joins the scores stored under ``search_id``, as a
+    queryset raising ``ExpiredSearchError`` when it is evaluated once they
+    are gone.
+    """
+    query = logs.query.chain(ScoredQuery)
+    query.search_ids = (*query.search_ids, search_id)
+    logs = logs.all()
+    logs.query = query
+    return logs
 
-    exact_scores = [(log.id, 1.0) for log in exact_matches]
-    all_scores = exact_scores + log_scores
 
-    score_cases = [
-        When(pk=log_id, then=Value(score)) for log_id, score in all_scores
+def paginate_logs(logs, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Return ``(page, next_cursor)``: up to ``page_size`` entries of ``logs``
+    that have a timestamp, in ``(timestamp, id)`` order, starting after the
+    position encoded in ``cursor``. ``next_cursor`` is ``None`` on the last
+    page.
+
+    Pages are fetched by keyset rather than by offset, so every page costs
+    the same however deep it is. Raises ``ValueError`` for a malformed
+    cursor.
+    """
+    logs = logs.filter(timestamp__isnull=False).order_by("timestamp", "id")
+    if cursor:
+        timestamp, log_id = decode_cursor(cursor)
+        # The redundant lower bound lets the timestamp index do the seek.
+        logs = logs.filter(
+            Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=log_id),
+            timestamp__gte=timestamp,
+        )
+    page = list(logs[: page_size + 1])
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(page[-1].timestamp, page[-1].id)
+
+
+def encode_cursor(timestamp, log_id):
+    """
+    Encode the position after the entry ``(timestamp, log_id)`` as an
+    opaque URL-safe string.
+    """
+    value = f"{timestamp.isoformat()}|{log_id}".encode("ascii")
+    return base64.urlsafe_b64encode(value).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Invert ``encode_cursor``, raising ``ValueError`` for invalid input.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value = base64.urlsafe_b64decode(padded.encode("ascii")).decode(
+            "ascii"
+        )
+        timestamp, log_id = value.split("|")
+        timestamp = datetime.fromisoformat(timestamp)
+        log_id = int(log_id)
+    except (UnicodeError, binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}.") from e
+    if timestamp.tzinfo is None:
+        raise ValueError(f"Invalid cursor: {cursor!r}.")
+    return timestamp, log_id
+
+
+def group_by_date(logs):
+    """
+    Group entries by the UTC date of their timestamp, keeping their order.
+    """
+    groups = {}
+    for log in logs:
+        date = log.timestamp.astimezone(pytz.UTC).date()
+        groups.setdefault(date, []).append(log)
+    return groups
+
+
+def template_matches(logs, query, exact_ids, similarity_threshold):
+    """
+    Score ``query`` against the distinct ``LogTemplate`` texts and return
+    the entries of ``logs`` whose template scores at least
+    ``similarity_threshold``, plus the exact matches selected by the
+    ``exact_ids`` subquery, annotated with their
+    ``similarity`` (1.0 for exact matches).
+
+    The cost grows with the number of templates rather than rows: the
+    qualifying event ids are expanded to rows through the ``event_id``
+    index.
+    """
+    templates = list(LogTemplate.objects.values_list("event_id", "template"))
+    scores = compute_similarity_scores(
+        preprocess_text(query),
+        [preprocess_text(template) for _, template in templates],
+    )
+    template_scores = [
+        (event_id, score)
+        for (event_id, _), score in zip(templates, scores)
+        if score >= similarity_threshold
     ]
+    return template_rows(logs, exact_ids, template_scores)
+
+
+def semantic_matches(logs, query, exact_ids, similarity_threshold):
+    """
+    Like ``template_matches``, but score the ``SEMANTIC_TEMPLATES`` nearest
+    templates to ``query`` in the embedding space of the semantic index
+    (see ``logapp.semantic_index``), caught up with new templates first.
+    """
+    index = get_semantic_index()
+    index.update(retrain=False)
+    keys, scores = index.search_text(query, SEMANTIC_TEMPLATES)
+    event_ids = dict(
+        LogTemplate.objects.filter(id__in=keys.tolist()).values_list(
+            "id", "event_id"
+        )
+    )
+    template_scores = [
+        (event_ids[key], score)
+        for key, score in zip(keys.tolist(), scores.tolist())
+        if key in event_ids and score >= similarity_threshold
+    ]
+    return template_rows(logs, exact_ids, template_scores)
+
+
+def similar_logs(
+    entry,
+    window=DEFAULT_SIMILAR_WINDOW,
+    service=None,
+    limit=DEFAULT_SIMILAR_LIMIT,
+    similarity_threshold=0.1,
+    top_k=None,
+):
+    """
+    Return ``(mode, logs)``: a list of the ``limit`` entries most similar to
+    the ``LogEntry`` ``entry``, other than itself, annotated with their
+    ``similarity`` and ordered by it, then by timestamp.
+
+    The search is restricted to ``window`` seconds on either side of the
+    entry's timestamp (no restriction when ``None`` or when the entry has no
+    timestamp) and to ``service``, matched case-insensitively, when given.
+
+    An entry whose template is in the semantic index is looked up by the
+    stored vector of that template (``mode`` is ``"templates"``): the rows of
+    the ``SEMANTIC_TEMPLATES`` nearest templates qualify, those of its own
+    template first, and are read template by template through the
+    ``(event_id, timestamp)`` index until ``limit`` are found. Other entries
+    are looked up in the TF-IDF index by their message (``mode`` is
+    ``"rows"``), keeping the ``top_k`` best hits when given. Neither path
+    fits a model or scans the table.
+    """
+    logs = LogEntry.objects.exclude(id=entry.id)
+    if service:
+        logs = logs.filter(service_norm=casefold(service))
+    if window is not None and entry.timestamp is not None:
+        reach = timedelta(seconds=window)
+        logs = logs.filter(
+            timestamp__gte=entry.timestamp - reach,
+            timestamp__lte=entry.timestamp + reach,
+        )
+
+    vector = None
+    if entry.event_id:
+        key = (
+            LogTemplate.objects.filter(event_id=entry.event_id)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if key is not None:
+            index = get_semantic_index()
+            index.update(retrain=False)
+            vector = index.vector(key)
+    if vector is not None:
+        keys, scores = index.search(vector, SEMANTIC_TEMPLATES)
+        event_ids = dict(
+            LogTemplate.objects.filter(id__in=keys.tolist()).values_list(
+                "id", "event_id"
+            )
+        )
+        found = []
+        for key, score in zip(keys.tolist(), scores.tolist()):
+            if len(found) >= limit or score < similarity_threshold:
+                break
+            if key not in event_ids:
+                continue
+            rows = logs.filter(event_id=event_ids[key]).order_by(
+                "timestamp", "id"
+            )
+            for log in rows[: limit - len(found)]:
+                log.similarity = score
+                found.append(log)
+        return "templates", found
+
+    index = get_search_index()
+    index.update(rebuild=False)
+    hit_ids, hit_scores = index.search(
+        entry.message, similarity_threshold, top_k=top_k
+    )
+    search_id = store_scores(
+        logs.db, zip(hit_ids.tolist(), hit_scores.tolist(), repeat(None))
+    )
+    return "rows", list(
+        logs.filter(search_scores__search_id=search_id)
+        .annotate(similarity=F("search_scores__similarity"))
+        .order_by("-similarity", "timestamp", "id")[:limit]
+    )
+
+
+def similar_page(
+    entry,
+    window=DEFAULT_SIMILAR_WINDOW,
+    service=None,
+    limit=DEFAULT_SIMILAR_LIMIT,
+):
+    """
+    Return ``similar_logs(entry, window, service, limit)`` through the query
+    cache. Index hits are limited to the ``settings.LOGFLOW_SEARCH_TOP_K``
+    best.
+    """
+    top_k = getattr(settings, "LOGFLOW_SEARCH_TOP_K", None)
+    params = {
+        "entry": entry.id,
+        "window": window,
+        "service": casefold(service) if service else None,
+        "limit": limit,
+        "top_k": top_k,
+    }
+
+    def compute():
+        return similar_logs(entry, window, service, limit, top_k=top_k)
+
+    return get_query_cache().get_or_compute("similar_page", params, compute)
+
 
+def template_rows(logs, exact_ids, template_scores):
+    """
+    Return the entries of ``logs`` selected by the ``exact_ids`` subquery or
+    carrying an event id of ``template_scores`` (``(event_id, score)``
+    pairs), annotated with their ``similarity`` (1.0 for exact matches,
+    otherwise the score of their template).
+    """
     return (
-        LogEntry.objects.filter(id__in=[log_id for log_id, _ in all_scores])
+        logs.filter(
+            Q(id__in=exact_ids)
+            | Q(event_id__in=[event_id for event_id, _ in template_scores])
+        )
         .annotate(
             similarity=Case(
-                *score_cases,
+                When(id__in=exact_ids, then=Value(1.0)),
+                *[
+                    When(event_id=event_id, then=Value(score))
+                    for event_id, score in template_scores
+                ],
                 default=0.0,
                 output_field=FloatField(),
             )
         )
-        .order_by("-similarity")
+        .order_by("-similarity", "timestamp")
     )
 
 
+def date_range_bounds(start_date, end_date):
+    """
+    Return aware datetimes ``(start, end)`` such that ``start <= timestamp <
+    end`` selects the days ``start_date`` through ``end_date`` (inclusive)
+    in the current time zone.
+    """
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(start_date, time.min, tzinfo=tz)
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=tz)
+    return start, end
+
+
 def preprocess_text(text: str) -> str:
     """
     Lowercase, remove special characters, and trim whitespace.
@@ -86,6 +584,9 @@ def preprocess_text(text: str) -> str:
 def compute_similarity_scores(query: str, messages: list) -> list:
     """
     Compute cosine similarity scores between the query and each log message.
+
+    ``filter_logs`` no longer uses this: it queries the persistent index in
+    ``logapp.search_index`` instead of fitting a vectorizer per request.
     """
     if not query or not messages:
         return [0] * len(messages)
@@ -97,9 +598,63 @@ def compute_similarity_scores(query: str, messages: list) -> list:
     return similarities[0]
 
 
+def search_page(
+    query="",
+    level=None,
+    service=None,
+    start_date=None,
+    end_date=None,
+    mode="rows",
+    cursor=None,
+    page_size=DEFAULT_PAGE_SIZE,
+    regex=None,
+):
+    """
+    Return ``paginate_logs(filter_logs(...), cursor, page_size)`` through the
+    query cache, so repeating a search (or paging back) until new data is
+    imported costs one cache lookup. Similar messages are limited to the
+    ``settings.LOGFLOW_SEARCH_TOP_K`` best index hits. Raises ``ValueError``
+    for an unknown mode or a malformed cursor.
+    """
+    top_k = getattr(settings, "LOGFLOW_SEARCH_TOP_K", None)
+    if cursor:
+        decode_cursor(cursor)
+    has_range = bool(start_date and end_date)
+    params = {
+        "query": query or "",
+        "level": casefold(level) if level else None,
+        "service": casefold(service) if service else None,
+        "start_date": start_date.isoformat() if has_range else None,
+        "end_date": end_date.isoformat() if has_range else None,
+        "mode": mode,
+        "cursor": cursor or None,
+        "page_size": page_size,
+        "regex": regex or None,
+        "top_k": top_k,
+    }
+
+    def compute():
+        logs = filter_logs(
+            query=query,
+            level=level,
+            service=service,
+            start_date=start_date,
+            end_date=end_date,
+            mode=mode,
+            regex=regex,
+            top_k=top_k,
+        )
+        return paginate_logs(logs, cursor, page_size)
+
+    return get_query_cache().get_or_compute("search_page", params, compute)
+
+
 def get_logs_by_hour(logs, timezone):
     """
     Group logs by the hour of their timestamp, adjusting to the specified timezone.
+
+    ``hourly_log_counts`` no longer uses this: it reads the hourly rollups
+    in ``logapp.rollups`` instead of aggregating every row.
     """
     logs_by_hour = (
         logs.exclude(timestamp__isnull=True)
@@ -111,8 +666,34 @@ def get_logs_by_hour(logs, timezone):
     return logs_by_hour
 
 
+def hourly_log_counts(min_hour=0, max_hour=23):
+    """
+    Return the cached number of logs per UTC hour of day, as a list of
+    ``{"hour": h, "log_count": n}`` restricted to the hours ``min_hour`` to
+    ``max_hour``. The counts are summed from the hourly rollups, so the cost
+    grows with the number of hours covered by the data, not with the number
+    of rows.
+    """
+    params = {"min_hour": int(min_hour), "max_hour": int(max_hour)}
+
+    def compute():
+        return hour_of_day_counts(params["min_hour"], params["max_hour"])
+
+    return get_query_cache().get_or_compute("logs_by_hour", params, compute)
+
+
 def get_unique_services():
     """
     Retrieve a sorted list of unique service names from the logs.
+
+    The list is cached until the next import.
     """
-    return LogEntry.objects.values_list("service", flat=True).distinct()
+
+    def compute():
+        return sorted(
+            LogEntry.objects.exclude(service__isnull=True)
+            .values_list("service", flat=True)
+            .distinct()
+        )
+
+    return get_query_cache().get_or_compute("unique_services", {}, compute)
@@ -0,0 +1,222 @@
+"""
+Cache of search and dashboard query results, invalidated by a data version.
+
+Results are stored in the Django cache named by
+``settings.LOGFLOW_QUERY_CACHE``, a file cache by default (any backend works,
+but the local-memory cache is per process, so imports in another process
+would not invalidate the web server's entries before they expire). Keys
+combine the query name, its normalized parameters and the current data
+version, a counter kept in the same cache that ``commit_batches`` bumps after
+every committed batch. Bumping the version makes every older entry
+unreachable at once; those entries are then evicted like any other.
+
+Each process keeps an LRU index of the entries it stored or read, with their
+pickled sizes, and deletes the least recently used ones once there are more
+than ``max_entries`` of them or they exceed ``max_bytes`` together. Results
+larger than ``max_bytes`` are not cached at all. The backend's own limits
+(``MAX_ENTRIES``) still apply on top, which bounds entries written by other
+processes.
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from django.conf import settings
+from django.core.cache import caches
+
+DATA_VERSION_KEY = "logflow:data-version"
+KEY_PREFIX = "logflow:query"
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+_missing = object()
+
+
+@dataclass
+class QueryCacheStats:
+    """
+    Counters of a ``QueryCache`` since it was created or last cleared.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    too_large: int = 0
+
+
+class QueryCache:
+    """
+    Size-bounded LRU cache of query results on top of a Django cache.
+
+    Parameters
+    ----------
+    alias : str
+        Name of the Django cache to store results in.
+    max_entries : int
+        Most entries this process keeps before evicting the least recently
+        used one.
+    max_bytes : int
+        Most pickled bytes this process keeps; also the largest result that
+        is cached.
+    timeout : float, optional
+        Expiry of entries in seconds; ``None`` keeps them until evicted or
+        invalidated.
+    """
+
+    def __init__(
+        self,
+        alias="default",
+        max_entries=DEFAULT_MAX_ENTRIES,
+        max_bytes=DEFAULT_MAX_BYTES,
+        timeout=None,
+    ):
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError("max_entries and max_bytes must be positive.")
+        self.alias = alias
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.stats = QueryCacheStats()
+        self._sizes = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def data_version(self):
+        """
+        Return the current data version, initializing it if the cache lost
+        it. A fresh version is the current time in nanoseconds rather than a
+        constant, so it cannot revive entries stored under an earlier one.
+        """
+        version = self.cache.get(DATA_VERSION_KEY)
+        if version is None:
+            self.cache.add(DATA_VERSION_KEY, time.time_ns(), timeout=None)
+            version = self.cache.get(DATA_VERSION_KEY)
+        return version
+
+    def bump_data_version(self):
+        """
+        Invalidate every cached result; call it after committing new data.
+        """
+        try:
+            return self.cache.incr(DATA_VERSION_KEY)
+        except ValueError:
+            version = time.time_ns()
+            self.cache.set(DATA_VERSION_KEY, version, timeout=None)
+            return version
+
+    def make_key(self, name, params):
+        """
+        Build the cache key of query ``name`` with the normalized ``params``
+        (a dictionary of hashable, ``repr``-stable values) under the current
+        data version.
+        """
+        digest = hashlib.sha1(
+            repr(sorted(params.items())).encode("utf-8")
+        ).hexdigest()
+        return f"{KEY_PREFIX}:{name}:{self.data_version()}:{digest}"
+
+    def get_or_compute(self, name, params, compute):
+        """
+        Return the cached result of query ``name`` for ``params``, calling
+        ``compute()`` and caching its result on a miss. Exceptions raised by
+        ``compute`` propagate and nothing is cached.
+        """
+        key = self.make_key(name, params)
+        value = self.cache.get(key, _missing)
+        if value is not _missing:
+            with self._lock:
+                self.stats.hits += 1
+                if key in self._sizes:
+                    self._sizes.move_to_end(key)
+                    return value
+            # Stored by another process: account for it here too.
+            self._remember(key, len(pickle.dumps(value, -1)))
+            return value
+
+        with self._lock:
+            self.stats.misses += 1
+        value = compute()
+        size = len(pickle.dumps(value, -1))
+        if size > self.max_bytes:
+            with self._lock:
+                self.stats.too_large += 1
+            return value
+        self.cache.set(key, value, timeout=self.timeout)
+        with self._lock:
+            self.stats.stores += 1
+        self._remember(key, size)
+        return value
+
+    def _remember(self, key, size):
+        evicted = []
+        with self._lock:
+            self._bytes += size - self._sizes.pop(key, 0)
+            self._sizes[key] = size
+            while len(self._sizes) > self.max_entries or (
+                self._bytes > self.max_bytes and len(self._sizes) > 1
+            ):
+                old_key, old_size = self._sizes.popitem(last=False)
+                self._bytes -= old_size
+                evicted.append(old_key)
+            self.stats.evictions += len(evicted)
+        if evicted:
+            self.cache.delete_many(evicted)
+
+    def clear(self):
+        """
+        Delete this process's entries and reset the statistics.
+        """
+        with self._lock:
+            keys = list(self._sizes)
+            self._sizes.clear()
+            self._bytes = 0
+            self.stats = QueryCacheStats()
+        self.cache.delete_many(keys)
+
+    def get_stats(self):
+        """
+        Return the statistics as a dictionary, with the hit rate, the number
+        and total size of entries tracked by this process and the current
+        data version.
+        """
+        with self._lock:
+            stats = asdict(self.stats)
+            stats["entries"] = len(self._sizes)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["data_version"] = self.data_version()
+        stats["backend"] = type(self.cache).__name__
+        return stats
+
+
+_query_caches = {}
+_query_caches_lock = threading.Lock()
+
+
+def get_query_cache():
+    """
+    Return the process-wide ``QueryCache`` configured by the
+    ``LOGFLOW_QUERY_CACHE*`` settings.
+    """
+    config = (
+        getattr(settings, "LOGFLOW_QUERY_CACHE", "default"),
+        getattr(
+            settings, "LOGFLOW_QUERY_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES
+        ),
+        getattr(settings, "LOGFLOW_QUERY_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES),
+        getattr(settings, "LOGFLOW_QUERY_CACHE_TIMEOUT", None),
+    )
+    with _query_caches_lock:
+        query_cache = _query_caches.get(config)
+        if query_cache is None:
+            query_cache = _query_caches[config] = QueryCache(*config)
+    return query_cache
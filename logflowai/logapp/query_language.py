@@ -0,0 +1,176 @@
+"""
+Structured search box queries.
+
+A query is a whitespace-separated list of clauses, all of which must hold:
+
+- ``field:value`` restricts an indexed column, e.g. ``level:ERROR``,
+  ``service:dfs.DataNode*`` or ``event:E5``. A trailing ``*`` matches values
+  starting with the rest, ``a,b`` matches either value, ``field:"a b"`` quotes
+  a value with spaces and a leading ``-`` negates the clause.
+- ``after:`` and ``before:`` take an ISO 8601 date or datetime and bound the
+  timestamp (``after`` inclusive, ``before`` exclusive); naive values are in
+  the current time zone.
+- Anything else is free text, passed on to the full-text and similarity
+  search. Words with a colon that do not start with a known field name, such
+  as ``10.0.0.1:50010``, are free text too.
+
+``parse_query`` turns a query into a ``SearchQuery`` whose ``filters`` compile
+to a ``Q`` object over indexed columns (``compile_filters``).
+"""
+
+import re
+from dataclasses import dataclass
+from dateutil import parser
+from django.db.models import Q
+from django.utils import timezone
+from .models import casefold
+
+# Query field -> (LogEntry column, value normalization).
+FIELDS = {
+    "level": ("level_norm", casefold),
+    "service": ("service_norm", casefold),
+    "host": ("host", None),
+    "event": ("event_id", None),
+    "source": ("source", None),
+    "line": ("line_id", int),
+}
+TIME_FIELDS = {"after": "timestamp__gte", "before": "timestamp__lt"}
+
+CLAUSE_PATTERN = re.compile(
+    r"(?P<negated>-?)(?P<field>[A-Za-z_]+):"
+    r'(?:"(?P<quoted>[^"]*)"|(?P<value>[^\s"]*))(?=\s|$)'
+    r'|(?P<text>"[^"]*"\*?|\S+)'
+)
+
+
+class QuerySyntaxError(ValueError):
+    """
+    Raised for a query that cannot be parsed.
+    """
+
+
+@dataclass(frozen=True)
+class FieldFilter:
+    """
+    One ``field:value`` clause; ``values`` holds the alternatives, each
+    ending in ``*`` when it is a prefix.
+    """
+
+    field: str
+    values: tuple
+    negated: bool = False
+
+
+@dataclass(frozen=True)
+class SearchQuery:
+    """
+    A parsed query: its field ``filters`` and the remaining free ``text``.
+    """
+
+    filters: tuple = ()
+    text: str = ""
+
+    @property
+    def is_precise(self):
+        """
+        Whether the query is answered by its filters alone, without any
+        ranking.
+        """
+        return not self.text
+
+
+def parse_query(query):
+    """
+    Parse a search box query into a ``SearchQuery``. Raises
+    ``QuerySyntaxError`` for a clause without a value.
+    """
+    filters = []
+    text = []
+    for match in CLAUSE_PATTERN.finditer(query or ""):
+        field = (match.group("field") or "").lower()
+        if field not in FIELDS and field not in TIME_FIELDS:
+            text.append(match.group(0))
+            continue
+        value = match.group("quoted")
+        if value is None:
+            value = match.group("value")
+            values = tuple(v for v in value.split(",") if v)
+        else:
+            values = (value,) if value else ()
+        if not values:
+            raise QuerySyntaxError(f"Missing value for {field}:.")
+        if field in TIME_FIELDS and len(values) > 1:
+            raise QuerySyntaxError(f"{field}: takes a single value.")
+        filters.append(
+            FieldFilter(field, values, bool(match.group("negated")))
+        )
+    return SearchQuery(tuple(filters), " ".join(text))
+
+
+def parse_time(field, value):
+    try:
+        moment = parser.isoparse(value)
+    except (ValueError, OverflowError):
+        raise QuerySyntaxError(
+            f"Invalid date for {field}: {value!r}."
+        ) from None
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def prefix_range(column, prefix):
+    """
+    Return a ``Q`` matching the values of ``column`` that start with
+    ``prefix`` as a range, which an index on ``column`` can serve, unlike
+    ``LIKE``.
+    """
+    if not prefix:
+        return Q(**{f"{column}__isnull": False})
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f"{column}__gte": prefix, f"{column}__lt": upper})
+
+
+def compile_filter(clause):
+    """
+    Compile one ``FieldFilter`` to a ``Q`` object.
+    """
+    if clause.field in TIME_FIELDS:
+        lookup = TIME_FIELDS[clause.field]
+        condition = Q(**{lookup: parse_time(clause.field, clause.values[0])})
+        return ~condition if clause.negated else condition
+
+    column, normalize = FIELDS[clause.field]
+    exact = []
+    condition = Q()
+    for value in clause.values:
+        prefix = value.endswith("*") and normalize is not int
+        if prefix:
+            value = value[:-1]
+        if normalize is not None:
+            try:
+                value = normalize(value)
+            except ValueError:
+                raise QuerySyntaxError(
+                    f"Invalid value for {clause.field}: {value!r}."
+                ) from None
+        if prefix:
+            condition |= prefix_range(column, value)
+        else:
+            exact.append(value)
+    if len(exact) == 1:
+        condition |= Q(**{column: exact[0]})
+    elif exact:
+        condition |= Q(**{f"{column}__in": exact})
+    return ~condition if clause.negated else condition
+
+
+def compile_filters(filters):
+    """
+    Compile ``FieldFilter`` clauses to one ``Q`` object requiring all of
+    them.
+    """
+    condition = Q()
+    for clause in filters:
+        condition &= compile_filter(clause)
+    return condition
@@ -0,0 +1,135 @@
+"""
+Time-bucket rollups of the log entry counts, read by the dashboard.
+
+``LogRollup`` holds the number of entries per bucket, case-folded service and
+level, and event id, at a minute, hour and day granularity. ``insert_entries``
+adds the rows it writes to the rollups in the same transaction, with one
+upsert per distinct key, so the counts always match the committed entries and
+a chart costs a query over its buckets rather than over every row. Rows written
+directly through the ORM are not counted; ``rebuild_rollups`` (the
+``rebuild_rollups`` command) recomputes every count from ``LogEntry``, which
+also backfills the entries stored before the rollups existed.
+"""
+
+from collections import Counter
+from datetime import timezone
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from .models import LogEntry, LogRollup
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+GRANULARITIES = (MINUTE, HOUR, DAY)
+DEFAULT_CHUNK_SIZE = 10_000
+
+ROLLUP_KEY = ("granularity", "bucket", "service", "level", "event_id")
+
+
+def bucket_start(timestamp, granularity):
+    """
+    Return the Unix time of the start of the ``granularity``-second bucket
+    holding ``timestamp``; naive timestamps are taken as UTC.
+    """
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp()) // granularity * granularity
+
+
+def rollup_counts(fields_list):
+    """
+    Count ``LogEntry`` field dictionaries (with their derived columns filled
+    in) per ``ROLLUP_KEY`` at every granularity. Entries without a
+    timestamp are not counted.
+    """
+    counts = Counter()
+    for fields in fields_list:
+        timestamp = fields.get("timestamp")
+        if timestamp is None:
+            continue
+        seconds = bucket_start(timestamp, 1)
+        key = (
+            fields.get("service_norm") or "",
+            fields.get("level_norm") or "",
+            fields.get("event_id") or "",
+        )
+        for granularity in GRANULARITIES:
+            bucket = seconds // granularity * granularity
+            counts[(granularity, bucket, *key)] += 1
+    return counts
+
+
+def add_counts(counts):
+    """
+    Add ``rollup_counts`` to the stored rollups with one upsert statement.
+    """
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    table = quote(LogRollup._meta.db_table)
+    key = ", ".join(quote(column) for column in ROLLUP_KEY)
+    sql = (
+        f"INSERT INTO {table} ({key}, {quote('count')}) "
+        f"VALUES ({', '.join(['%s'] * (len(ROLLUP_KEY) + 1))}) "
+        f"ON CONFLICT ({key}) DO UPDATE SET {quote('count')} = "
+        f"{table}.{quote('count')} + excluded.{quote('count')}"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql, [(*key, count) for key, count in counts.items()]
+        )
+
+
+def add_to_rollups(fields_list):
+    """
+    Count newly inserted ``LogEntry`` field dictionaries into the rollups.
+    """
+    add_counts(rollup_counts(fields_list))
+
+
+def rebuild_rollups(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Replace the rollups with counts of every log entry, walking the table by
+    primary key in chunks of ``chunk_size``. Runs in one transaction, so
+    readers see either the old or the new counts. Returns the number of
+    counted entries.
+    """
+    count = 0
+    with transaction.atomic():
+        LogRollup.objects.all().delete()
+        last_id = 0
+        while True:
+            chunk = list(
+                LogEntry.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values(
+                    "id", "timestamp", "service_norm", "level_norm", "event_id"
+                )[:chunk_size]
+            )
+            if not chunk:
+                break
+            counts = rollup_counts(chunk)
+            add_counts(counts)
+            count += sum(
+                value
+                for (granularity, *_), value in counts.items()
+                if granularity == DAY
+            )
+            last_id = chunk[-1]["id"]
+    return count
+
+
+def hour_of_day_counts(min_hour=0, max_hour=23):
+    """
+    Return ``[{"hour": h, "log_count": n}, ...]``, the number of entries per
+    UTC hour of day from ``min_hour`` to ``max_hour``, summed over the
+    hourly rollups.
+    """
+    return list(
+        LogRollup.objects.filter(granularity=HOUR)
+        .annotate(hour=F("bucket") / HOUR % 24)
+        .filter(hour__gte=min_hour, hour__lte=max_hour)
+        .values("hour")
+        .annotate(log_count=Sum("count"))
+        .order_by("hour")
+    )
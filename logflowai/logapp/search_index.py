@@ -0,0 +1,615 @@
+"""
+Persistent TF-IDF index over ``LogEntry.message`` used by ``filter_logs``.
+
+The index lives in ``settings.LOGFLOW_INDEX_DIR`` and consists of a vocabulary,
+the IDF weight of every term and one or more segments. A segment stores the
+L2-normalized TF-IDF rows of a range of log entries as a CSC matrix (one
+posting list per term) plus the ``LogEntry`` ids of its rows, saved as ``.npy``
+files that are memory-mapped when the index is opened. A query is therefore
+vectorized with the stored vocabulary and scored by summing the postings of its
+terms; no vectorizer is fitted per request.
+
+Searches split the segments into row chunks of ``LOGFLOW_SEARCH_CHUNK_ROWS``
+and score them on a thread pool: every chunk gathers the part of each query
+term's posting list that falls into its rows and multiplies it with the query
+vector as a SciPy sparse product, which releases the GIL. Only hits above the
+threshold leave a chunk, and with ``top_k`` only that many, merged through a
+bounded heap; no score vector over the whole corpus is ever materialized.
+
+New rows are added incrementally as extra segments (``update``), weighted with
+the existing IDF; terms first seen after the last rebuild are ignored until the
+next ``rebuild``, which refits vocabulary and IDF over every row. Imports
+call ``update``, which rebuilds by itself once the index has grown
+``settings.LOGFLOW_INDEX_REBUILD_GROWTH`` times beyond the rows of the last
+rebuild, so rebuilds get geometrically rarer and their cost stays linear in
+the number of rows overall. Searches call ``update(rebuild=False)``, which
+only ever appends. Small segments are merged once there are more than
+``MAX_SEGMENTS`` of them. All files are written to temporary paths and
+swapped in with ``os.replace``, and writers serialize on a lock file, so
+readers in other processes always see a consistent manifest.
+"""
+
+import json
+import math
+import os
+import shutil
+import tempfile
+import heapq
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from .models import LogEntry
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+MANIFEST = "manifest.json"
+DEFAULT_CHUNK_SIZE = 10_000
+MAX_SEGMENTS = 8
+REBUILD_GROWTH = 4
+SEGMENT_ARRAYS = ("data", "indices", "indptr", "doc_ids")
+DEFAULT_SCORE_CHUNK_ROWS = 1 << 18
+
+
+def default_index_dir():
+    return str(
+        getattr(
+            settings,
+            "LOGFLOW_INDEX_DIR",
+            os.path.join(settings.BASE_DIR, "search_index"),
+        )
+    )
+
+
+def build_analyzer():
+    """
+    Return the tokenizer shared by indexing and querying: the same
+    preprocessing and English stop words that ``filter_logs`` always used.
+    """
+    from .parse_database import preprocess_text
+
+    return TfidfVectorizer(
+        stop_words="english", preprocessor=preprocess_text
+    ).build_analyzer()
+
+
+def newest_entry_id():
+    return (
+        LogEntry.objects.order_by("-id").values_list("id", flat=True).first()
+    )
+
+
+def iter_messages(after_id, until_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of ``(id, message)`` for log entries with
+    ``after_id < id <= until_id``, walking the table by primary key.
+    """
+    while True:
+        chunk = list(
+            LogEntry.objects.filter(id__gt=after_id, id__lte=until_id)
+            .order_by("id")
+            .values_list("id", "message")[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+
+def score_chunk(
+    segment, start, stop, columns, weights, threshold=0.0, top_k=None
+):
+    """
+    Score rows ``start`` to ``stop`` of a segment against the query vector
+    ``(columns, weights)``. Returns the ``(ids, scores)`` of the rows whose
+    score is positive and at least ``threshold``, only the ``top_k`` best of
+    them when given, in no particular order.
+    """
+    indptr, indices, data = (
+        segment["indptr"],
+        segment["indices"],
+        segment["data"],
+    )
+    whole = start == 0 and stop == len(segment["doc_ids"])
+    spans = []
+    for column in columns:
+        low, high = int(indptr[column]), int(indptr[column + 1])
+        if not whole:
+            # Row indices are sorted within every column. The bounds take
+            # their dtype, or searchsorted would convert the whole slice.
+            rows = indices[low:high]
+            bounds = np.array([start, stop], dtype=rows.dtype)
+            low, high = low + np.searchsorted(rows, bounds)
+        spans.append((low, high))
+    lengths = [high - low for low, high in spans]
+    matrix = sparse.csc_matrix(
+        (
+            np.concatenate([data[low:high] for low, high in spans]),
+            np.concatenate([indices[low:high] for low, high in spans]) - start,
+            np.concatenate(([0], np.cumsum(lengths))),
+        ),
+        shape=(stop - start, len(columns)),
+    )
+    scores = matrix @ weights
+    hits = np.flatnonzero((scores > 0) & (scores >= threshold))
+    if top_k is not None and len(hits) > top_k:
+        hits = hits[np.argpartition(scores[hits], -top_k)[-top_k:]]
+    return np.asarray(segment["doc_ids"][start:stop][hits]), scores[hits]
+
+
+_score_executors = {}
+_score_executors_lock = threading.Lock()
+
+
+def get_score_executor(workers):
+    """
+    Return the process-wide thread pool of ``workers`` threads scoring
+    search chunks.
+    """
+    with _score_executors_lock:
+        executor = _score_executors.get(workers)
+        if executor is None:
+            executor = _score_executors[workers] = ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix="search-score"
+            )
+    return executor
+
+
+class IndexDirectory:
+    """
+    Base class of the on-disk indexes: a directory of immutable files
+    described by a JSON manifest, which writers holding the lock file replace
+    atomically.
+
+    Subclasses open the files of a manifest in ``_open``, reset their state
+    in ``_reset`` and list the files a manifest uses in ``_files``.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding the manifest and the index files.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.manifest = None
+        self._mtime = None
+        self._thread_lock = threading.RLock()
+
+    @property
+    def last_id(self):
+        return self.manifest["last_id"] if self.manifest else 0
+
+    def load(self):
+        """
+        Memory-map the index as described by its manifest, unless it is
+        already loaded. Returns ``False`` when no index has been built yet.
+        """
+        with self._thread_lock:
+            for _ in range(3):
+                try:
+                    return self._load()
+                except FileNotFoundError:
+                    # A writer replaced files between reading the manifest
+                    # and opening them; read the new manifest.
+                    self._mtime = None
+            return self._load()
+
+    def _load(self):
+        manifest_path = os.path.join(self.path, MANIFEST)
+        try:
+            mtime = os.stat(manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            self.manifest, self._mtime = None, None
+            self._reset()
+            return False
+        if mtime == self._mtime:
+            return True
+        with open(manifest_path, encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        self._open(manifest)
+        self.manifest = manifest
+        self._mtime = mtime
+        return True
+
+    def _open(self, manifest):
+        raise NotImplementedError
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _files(self, manifest):
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self):
+        """
+        Serialize writers across threads and processes.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        with self._thread_lock, open(
+            os.path.join(self.path, ".lock"), "w"
+        ) as fh:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _new_name(self, prefix):
+        return f"{prefix}-{os.urandom(6).hex()}"
+
+    def _staging(self, name):
+        os.makedirs(self.path, exist_ok=True)
+        return tempfile.mkdtemp(prefix=f".{name}-", dir=self.path)
+
+    def _publish(self, staging_path, name):
+        os.replace(staging_path, os.path.join(self.path, name))
+
+    def _save_manifest(self, manifest):
+        manifest_path = os.path.join(self.path, MANIFEST)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp_path, manifest_path)
+        self._mtime = None
+        self._load()
+        # Readers that still map removed files keep a valid mapping.
+        keep = set(self._files(manifest))
+        for name in os.listdir(self.path):
+            if (
+                name.startswith(("base-", "segment-", "."))
+                and name not in keep
+            ):
+                path = os.path.join(self.path, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+
+
+class SearchIndex(IndexDirectory):
+    """
+    A TF-IDF index stored in ``path``.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding the manifest, vocabulary, IDF and segments.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.analyzer = build_analyzer()
+        self.vocabulary = {}
+        self.idf = np.zeros(0, dtype=np.float32)
+        self.segments = []
+
+    @property
+    def doc_count(self):
+        return sum(len(segment["doc_ids"]) for segment in self.segments)
+
+    def _open(self, manifest):
+        base = os.path.join(self.path, manifest["base"])
+        with open(
+            os.path.join(base, "vocabulary.json"), encoding="utf-8"
+        ) as fh:
+            vocabulary = json.load(fh)
+        idf = np.load(os.path.join(base, "idf.npy"), mmap_mode="r")
+        segments = [self._open_segment(name) for name in manifest["segments"]]
+        # Swap everything at once so concurrent searches see one version.
+        self.vocabulary, self.idf, self.segments = vocabulary, idf, segments
+
+    def _reset(self):
+        self.segments = []
+
+    def _files(self, manifest):
+        return [manifest["base"], *manifest["segments"]]
+
+    def vectorize(self, text, vocabulary=None, idf=None):
+        """
+        Return ``(columns, weights)`` of the L2-normalized TF-IDF vector of
+        ``text`` over the stored vocabulary.
+        """
+        if vocabulary is None:
+            vocabulary, idf = self.vocabulary, self.idf
+        counts = Counter(
+            vocabulary[token]
+            for token in self.analyzer(text or "")
+            if token in vocabulary
+        )
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(
+            counts.values(), dtype=np.float32, count=len(counts)
+        ) * np.asarray(idf[columns])
+        return columns, weights / np.linalg.norm(weights)
+
+    def iter_search(
+        self,
+        query,
+        threshold=0.0,
+        top_k=None,
+        chunk_rows=None,
+        workers=None,
+        ordered=False,
+    ):
+        """
+        Score ``query`` against every segment in chunks of ``chunk_rows`` rows
+        (default ``settings.LOGFLOW_SEARCH_CHUNK_ROWS``) on ``workers``
+        threads (default ``settings.LOGFLOW_SEARCH_WORKERS`` or one per CPU)
+        and yield the ``(ids, scores)`` found in each chunk (see
+        ``score_chunk``) as soon as it is scored, or in index order with
+        ``ordered``. Only the posting lists of the query's terms are read.
+        """
+        vocabulary, idf, segments = self.vocabulary, self.idf, self.segments
+        columns, weights = self.vectorize(query, vocabulary, idf)
+        if not len(columns):
+            return
+        if chunk_rows is None:
+            chunk_rows = getattr(
+                settings, "LOGFLOW_SEARCH_CHUNK_ROWS", DEFAULT_SCORE_CHUNK_ROWS
+            )
+        if workers is None:
+            workers = getattr(settings, "LOGFLOW_SEARCH_WORKERS", None)
+        workers = workers or os.cpu_count() or 1
+        tasks = [
+            (segment, start, min(start + chunk_rows, len(segment["doc_ids"])))
+            for segment in segments
+            for start in range(0, len(segment["doc_ids"]), chunk_rows)
+        ]
+        score = partial(
+            score_chunk,
+            columns=columns,
+            weights=weights.astype(np.float64),
+            threshold=threshold,
+            top_k=top_k,
+        )
+        if workers == 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield score(*task)
+            return
+        executor = get_score_executor(workers)
+        futures = [executor.submit(score, *task) for task in tasks]
+        try:
+            for future in futures if ordered else as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def search(self, query, threshold=0.0, top_k=None, **options):
+        """
+        Return ``(ids, scores)`` arrays of the entries whose cosine similarity
+        to ``query`` is positive and at least ``threshold``, in index order.
+
+        With ``top_k``, return only the ``top_k`` best, best first; they are
+        merged from the chunks through a heap of at most ``top_k`` hits.
+        ``options`` are passed on to ``iter_search``.
+        """
+        if top_k is None:
+            found = list(
+                self.iter_search(query, threshold, ordered=True, **options)
+            )
+            if not found:
+                return np.zeros(0, dtype=np.int64), np.zeros(0)
+            ids, scores = zip(*found)
+            return np.concatenate(ids), np.concatenate(scores)
+
+        heap = []
+        for ids, scores in self.iter_search(
+            query, threshold, top_k, **options
+        ):
+            if len(heap) == top_k:
+                better = scores > heap[0][0]
+                ids, scores = ids[better], scores[better]
+            for entry_id, score in zip(ids.tolist(), scores.tolist()):
+                if len(heap) < top_k:
+                    heapq.heappush(heap, (score, entry_id))
+                elif score > heap[0][0]:
+                    heapq.heappushpop(heap, (score, entry_id))
+        heap.sort(reverse=True)
+        return (
+            np.array([entry_id for _, entry_id in heap], dtype=np.int64),
+            np.array([score for score, _ in heap], dtype=np.float64),
+        )
+
+    def rebuild(self, chunk_size=DEFAULT_CHUNK_SIZE, min_df=None):
+        """
+        Refit vocabulary and IDF over every log entry and rewrite the index
+        as a single segment. Returns the number of indexed entries.
+
+        Terms occurring in fewer than ``min_df`` entries (default
+        ``settings.LOGFLOW_INDEX_MIN_DF``, 1) are left out of the vocabulary.
+        """
+        with self.lock():
+            return self._rebuild(chunk_size, min_df)
+
+    def update(self, chunk_size=DEFAULT_CHUNK_SIZE, rebuild=True):
+        """
+        Index the entries added since the last update as a new segment,
+        weighted with the current IDF. Builds the index from scratch when
+        there is none, the table was recreated or it grew
+        ``settings.LOGFLOW_INDEX_REBUILD_GROWTH`` times since the last
+        rebuild (0 never rebuilds). Returns the number of newly indexed
+        entries.
+
+        With ``rebuild=False``, as searches call it, only a segment is ever
+        appended: without a usable index nothing is done, and rebuilds are
+        left to the next import or ``rebuild_search_index``, so a request
+        never waits for a pass over the whole table.
+        """
+        newest = newest_entry_id() or 0
+        if self.load() and newest == self.last_id:
+            return 0
+        growth = getattr(
+            settings, "LOGFLOW_INDEX_REBUILD_GROWTH", REBUILD_GROWTH
+        )
+        with self.lock():
+            if not self.load() or newest < self.last_id:
+                return self._rebuild(chunk_size) if rebuild else 0
+            if newest == self.last_id:
+                return 0
+            if rebuild and growth:
+                added = LogEntry.objects.filter(
+                    id__gt=self.last_id, id__lte=newest
+                ).count()
+                rebuilt_with = self.manifest.get("rebuilt_with", 0)
+                if self.doc_count + added > growth * rebuilt_with:
+                    return self._rebuild(chunk_size)
+            segment, count = self._write_segment(
+                iter_messages(self.last_id, newest, chunk_size),
+                self.vocabulary,
+                self.idf,
+            )
+            segments = self.manifest["segments"] + [segment] * bool(segment)
+            while len(segments) > MAX_SEGMENTS:
+                segments = self._merge_smallest(segments)
+            self._save_manifest(
+                dict(self.manifest, segments=segments, last_id=newest)
+            )
+            return count
+
+    def _rebuild(self, chunk_size=DEFAULT_CHUNK_SIZE, min_df=None):
+        if min_df is None:
+            min_df = getattr(settings, "LOGFLOW_INDEX_MIN_DF", 1)
+        newest = newest_entry_id() or 0
+
+        # Pass 1: document frequencies.
+        document_frequency = Counter()
+        count = 0
+        for chunk in iter_messages(0, newest, chunk_size):
+            for _, message in chunk:
+                document_frequency.update(set(self.analyzer(message or "")))
+            count += len(chunk)
+        terms = sorted(
+            term for term, df in document_frequency.items() if df >= min_df
+        )
+        # Smoothed IDF, as computed by scikit-learn's TfidfTransformer.
+        idf = np.array(
+            [
+                math.log((1 + count) / (1 + document_frequency[term])) + 1
+                for term in terms
+            ],
+            dtype=np.float32,
+        )
+        del document_frequency
+        vocabulary = {term: column for column, term in enumerate(terms)}
+
+        base = self._new_name("base")
+        path = self._staging(base)
+        with open(
+            os.path.join(path, "vocabulary.json"), "w", encoding="utf-8"
+        ) as fh:
+            json.dump(vocabulary, fh)
+        np.save(os.path.join(path, "idf.npy"), idf)
+        self._publish(path, base)
+
+        # Pass 2: document vectors.
+        segment, _ = self._write_segment(
+            iter_messages(0, newest, chunk_size), vocabulary, idf
+        )
+        self._save_manifest(
+            {
+                "base": base,
+                "segments": [segment] if segment else [],
+                "last_id": newest,
+                "rebuilt_with": count,
+            }
+        )
+        return count
+
+    def _write_segment(self, chunks, vocabulary, idf):
+        """
+        Vectorize ``(id, message)`` chunks into a new CSC segment. Returns
+        its directory name (``None`` when there was nothing to write) and the
+        number of rows.
+        """
+        rows, columns, values, doc_ids = [], [], [], []
+        for chunk in chunks:
+            for entry_id, message in chunk:
+                column_ids, weights = self.vectorize(message, vocabulary, idf)
+                rows.append(np.full(len(column_ids), len(doc_ids)))
+                columns.append(column_ids)
+                values.append(weights)
+                doc_ids.append(entry_id)
+        if not doc_ids:
+            return None, 0
+        matrix = sparse.csc_matrix(
+            (
+                np.concatenate(values).astype(np.float32),
+                (np.concatenate(rows), np.concatenate(columns)),
+            ),
+            shape=(len(doc_ids), len(vocabulary)),
+        )
+        doc_ids = np.array(doc_ids, dtype=np.int64)
+        return self._save_segment(matrix, doc_ids), len(doc_ids)
+
+    def _save_segment(self, matrix, doc_ids):
+        name = self._new_name("segment")
+        path = self._staging(name)
+        matrix.sum_duplicates()
+        np.save(os.path.join(path, "data.npy"), matrix.data)
+        np.save(os.path.join(path, "indices.npy"), matrix.indices)
+        np.save(os.path.join(path, "indptr.npy"), matrix.indptr)
+        np.save(os.path.join(path, "doc_ids.npy"), doc_ids)
+        self._publish(path, name)
+        return name
+
+    def _merge_smallest(self, names):
+        """
+        Merge the two adjacent segments with the fewest rows, so that big
+        segments are rewritten rarely. Row order is preserved.
+        """
+        sizes = [len(self._open_segment(name)["doc_ids"]) for name in names]
+        i = min(range(len(names) - 1), key=lambda i: sizes[i] + sizes[i + 1])
+        pair = [self._open_segment(name) for name in names[i : i + 2]]
+        matrix = sparse.vstack(
+            [
+                sparse.csc_matrix(
+                    (segment["data"], segment["indices"], segment["indptr"]),
+                    shape=(len(segment["doc_ids"]), len(self.vocabulary)),
+                )
+                for segment in pair
+            ],
+            format="csc",
+        )
+        doc_ids = np.concatenate([segment["doc_ids"] for segment in pair])
+        return (
+            names[:i] + [self._save_segment(matrix, doc_ids)] + names[i + 2 :]
+        )
+
+    def _open_segment(self, name):
+        return {
+            array: np.load(
+                os.path.join(self.path, name, f"{array}.npy"), mmap_mode="r"
+            )
+            for array in SEGMENT_ARRAYS
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(path=None):
+    """
+    Return the process-wide ``SearchIndex`` for ``path`` (default
+    ``settings.LOGFLOW_INDEX_DIR``), loaded from disk if it exists.
+    """
+    path = str(path or default_index_dir())
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = SearchIndex(path)
+    index.load()
+    return index
@@ -0,0 +1,571 @@
+"""
+Semantic search over the event templates with hashed n-gram embeddings and an
+approximate nearest-neighbor index.
+
+TF-IDF only matches the words of a query, so "disk full" never finds "No space
+left on device". ``HashedEmbedder`` maps a text to a dense vector without any
+model download: the words are split (``allocateBlock`` becomes ``allocate
+block``), numbers and identifiers are dropped, and every stem, character
+trigram and *concept* of the text is hashed into ``dim`` signed buckets.
+Concepts come from ``CONCEPTS``, a small lexicon of log vocabulary in which
+"disk", "full", "space" and "device" all stand for ``storage``, so paraphrases
+built from different words still share most of their weight.
+
+``SemanticIndex`` stores the L2-normalized vectors of the ``LogTemplate`` rows
+as an inverted file (IVF): spherical k-means centroids partition the vectors
+into ``nlist`` lists, and a query only scores the lists of its ``nprobe``
+nearest centroids. Vectors are quantized to int8 with one float32 scale per
+vector, a quarter of their float32 size. Segments keep their rows sorted by
+list, so a list is a contiguous slice of the memory-mapped ``codes.npy``.
+
+The index lives in ``settings.LOGFLOW_SEMANTIC_INDEX_DIR`` and is maintained
+like the TF-IDF index (see ``logapp.search_index``): ``update`` embeds the
+templates written since the last update into a new segment, assigned to the
+existing centroids, and a newer vector of a template replaces the older one.
+The centroids are retrained by ``rebuild``, and by ``update`` once the index
+has grown ``RETRAIN_GROWTH`` times beyond the vectors they were trained on;
+searches call ``update(retrain=False)``, which only adds segments, so that
+retraining stays with imports and ``rebuild_search_index``.
+"""
+
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from .models import LogTemplate
+from .search_index import IndexDirectory
+
+DEFAULT_DIM = 256
+DEFAULT_NPROBE = 8
+MAX_SEGMENTS = 8
+SEGMENT_ARRAYS = ("keys", "codes", "scales", "offsets")
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 256
+RETRAIN_GROWTH = 4
+
+# Feature weights before normalization: every stem, its character trigrams
+# together, and every concept the stem belongs to.
+WORD_WEIGHT = 1.0
+TRIGRAM_WEIGHT = 0.5
+CONCEPT_WEIGHT = 2.0
+
+CONCEPTS = {
+    "storage": (
+        "disk drive space device volume partition filesystem storage quota "
+        "inode full capacity mount"
+    ),
+    "memory": "memory heap oom outofmemory allocation swap gc",
+    "network": (
+        "network connection socket peer host unreachable refused reset "
+        "route dns port tcp"
+    ),
+    "timeout": "timeout timed expired deadline slow latency hang stall",
+    "failure": (
+        "error exception fail failure fatal crash abort panic broken "
+        "corrupt invalid"
+    ),
+    "access": (
+        "denied permission unauthorized forbidden authentication login "
+        "credential password token"
+    ),
+    "shutdown": "shutdown stop terminate exit kill halt down",
+    "startup": "start initialize boot launch up register",
+    "deletion": "delete remove purge drop evict invalidate",
+    "transfer": (
+        "receive send serve transfer transmit copy replicate replica upload "
+        "download packet"
+    ),
+    "verification": "verify verification check checksum valid succeed",
+}
+
+TOKEN_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+SUFFIXES = ("ation", "ing", "ed", "es", "er", "s")
+
+
+def default_semantic_dir():
+    return str(
+        getattr(
+            settings,
+            "LOGFLOW_SEMANTIC_INDEX_DIR",
+            os.path.join(settings.BASE_DIR, "semantic_index"),
+        )
+    )
+
+
+def stem(word):
+    """
+    Strip one common English suffix, or else a final "e", keeping at least
+    four letters, so that "delete", "deleted" and "deleting" share a stem.
+    """
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    if word.endswith("e") and len(word) > 4:
+        return word[:-1]
+    return word
+
+
+def split_words(text):
+    """
+    Return the lowercased stems of the words of ``text``, splitting
+    camelCase and leaving out numbers, identifiers and stop words.
+    """
+    words = []
+    for token in TOKEN_PATTERN.findall(text or ""):
+        word = token.lower()
+        if (
+            len(word) > 1
+            and not word.isdigit()
+            and word not in ENGLISH_STOP_WORDS
+        ):
+            words.append(stem(word))
+    return words
+
+
+CONCEPT_STEMS = {}
+for _concept, _words in CONCEPTS.items():
+    for _word in _words.split():
+        CONCEPT_STEMS.setdefault(stem(_word), []).append(_concept)
+
+
+def hash_feature(feature):
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+class HashedEmbedder:
+    """
+    Embed texts as L2-normalized float32 vectors of ``dim`` signed hash
+    buckets of their stems, character trigrams and concepts. The hash is
+    stable across processes, so stored vectors stay comparable.
+    """
+
+    def __init__(self, dim=DEFAULT_DIM):
+        if dim < 1:
+            raise ValueError("dim must be positive.")
+        self.dim = dim
+
+    @property
+    def config(self):
+        return {"kind": "hashed", "dim": self.dim, "version": 1}
+
+    def features(self, text):
+        """
+        Return a ``Counter`` of the weighted features of ``text``.
+        """
+        features = Counter()
+        for word in split_words(text):
+            features[f"w:{word}"] += WORD_WEIGHT
+            padded = f"<{word}>"
+            trigrams = [padded[i : i + 3] for i in range(len(padded) - 2)]
+            for trigram in trigrams:
+                features[f"c:{trigram}"] += TRIGRAM_WEIGHT / len(trigrams)
+            for concept in CONCEPT_STEMS.get(word, ()):
+                features[f"k:{concept}"] += CONCEPT_WEIGHT
+        return features
+
+    def embed(self, texts):
+        """
+        Return the ``(len(texts), dim)`` float32 matrix of the normalized
+        vectors of ``texts``; texts without features get a zero row.
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self.features(text).items():
+                hashed = hash_feature(feature)
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                vectors[row, hashed % self.dim] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+def get_embedder():
+    """
+    Return the embedder configured by ``settings.LOGFLOW_EMBEDDING_DIM``.
+    """
+    return HashedEmbedder(
+        getattr(settings, "LOGFLOW_EMBEDDING_DIM", DEFAULT_DIM)
+    )
+
+
+def quantize(vectors):
+    """
+    Quantize float vectors to int8 codes with one scale per vector, such
+    that ``codes * scales[:, None]`` approximates ``vectors``.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    scales = np.abs(vectors).max(axis=1, initial=0.0) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def assign_lists(vectors, centroids, scales=None, chunk_rows=65_536):
+    """
+    Return the index of the nearest (highest cosine) centroid of every
+    vector, given as int8 codes when ``scales`` is given.
+    """
+    lists = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), chunk_rows):
+        block = np.asarray(vectors[start : start + chunk_rows], np.float32)
+        if scales is not None:
+            block *= scales[start : start + chunk_rows, None]
+        lists[start : start + len(block)] = (block @ centroids.T).argmax(1)
+    return lists
+
+
+def train_centroids(vectors, nlist, iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Train ``nlist`` unit-length centroids with spherical k-means on a
+    sample of at most ``KMEANS_SAMPLE`` vectors per centroid.
+    """
+    rng = np.random.default_rng(seed)
+    if len(vectors) > KMEANS_SAMPLE * nlist:
+        sample = np.sort(
+            rng.choice(len(vectors), KMEANS_SAMPLE * nlist, replace=False)
+        )
+        vectors = vectors[sample]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)]
+    for _ in range(iterations):
+        lists = assign_lists(vectors, centroids)
+        members = sparse.csr_matrix(
+            (np.ones(len(lists), np.float32), (lists, np.arange(len(lists)))),
+            shape=(nlist, len(vectors)),
+        )
+        sums = np.asarray(members @ vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        # Empty lists keep their centroid.
+        filled = norms > 0
+        centroids[filled] = sums[filled] / norms[filled, None]
+    return centroids
+
+
+def nlist_for(count):
+    """
+    Number of IVF lists for ``count`` vectors: about ``sqrt(count)``.
+    """
+    return max(1, min(count, round(math.sqrt(count))))
+
+
+def iter_templates(after=None):
+    """
+    Return ``(id, text, updated_at)`` of the templates written after the
+    ``updated_at`` timestamp ``after`` (all when ``None``), oldest first.
+    """
+    templates = LogTemplate.objects.order_by("updated_at", "id")
+    if after is not None:
+        templates = templates.filter(updated_at__gt=after)
+    return list(templates.values_list("id", "template", "updated_at"))
+
+
+class SemanticIndex(IndexDirectory):
+    """
+    An IVF index of int8-quantized template vectors stored in ``path``.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding the manifest, the centroids and the segments.
+    embedder : HashedEmbedder, optional
+        Embeds templates and queries; defaults to ``get_embedder()``.
+    """
+
+    def __init__(self, path, embedder=None):
+        super().__init__(path)
+        self.embedder = embedder or get_embedder()
+        self.centroids = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self.segments = []
+
+    @property
+    def doc_count(self):
+        return sum(int(segment["live"].sum()) for segment in self.segments)
+
+    def _open(self, manifest):
+        base = os.path.join(self.path, manifest["base"])
+        centroids = np.load(os.path.join(base, "centroids.npy"))
+        segments = [
+            self._open_segment(name) for name, _ in manifest["segments"]
+        ]
+        # A key stored again in a newer segment is dead in the older ones.
+        seen = np.zeros(0, dtype=np.int64)
+        for segment in reversed(segments):
+            keys = np.asarray(segment["keys"])
+            segment["live"] = ~np.isin(keys, seen)
+            seen = np.union1d(seen, keys)
+        self.centroids, self.segments = centroids, segments
+
+    def _reset(self):
+        self.centroids = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self.segments = []
+
+    def _files(self, manifest):
+        return [manifest["base"], *(name for name, _ in manifest["segments"])]
+
+    def search(self, vector, k=10, nprobe=None, exact=False):
+        """
+        Return ``(keys, scores)`` of the ``k`` stored vectors with the
+        highest cosine similarity to ``vector``, best first. Only the lists
+        of the ``nprobe`` nearest centroids (default
+        ``settings.LOGFLOW_SEMANTIC_NPROBE``) are scored, or every vector
+        with ``exact``.
+        """
+        centroids, segments = self.centroids, self.segments
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if not len(centroids) or k < 1:
+            return empty
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if exact:
+            probes = np.arange(len(centroids))
+        else:
+            if nprobe is None:
+                nprobe = getattr(
+                    settings, "LOGFLOW_SEMANTIC_NPROBE", DEFAULT_NPROBE
+                )
+            nprobe = min(nprobe, len(centroids))
+            probes = np.argpartition(-(centroids @ vector), nprobe - 1)[
+                :nprobe
+            ]
+
+        keys, scores = [], []
+        for segment in segments:
+            offsets = segment["offsets"]
+            spans = [
+                (int(offsets[i]), int(offsets[i + 1]))
+                for i in np.sort(probes)
+                if offsets[i + 1] > offsets[i]
+            ]
+            for start, end in spans:
+                live = segment["live"][start:end]
+                codes = segment["codes"][start:end]
+                found = (codes @ vector) * segment["scales"][start:end]
+                keys.append(segment["keys"][start:end][live])
+                scores.append(found[live])
+        if not keys:
+            return empty
+        keys, scores = np.concatenate(keys), np.concatenate(scores)
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            keys, scores = keys[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return keys[order], scores[order]
+
+    def search_text(self, text, k=10, nprobe=None, exact=False):
+        """
+        Embed ``text`` and ``search`` for it. Finds nothing in an index built
+        by another embedder.
+        """
+        if self.manifest and self.manifest.get("embedder") != (
+            self.embedder.config
+        ):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return self.search(
+            self.embedder.embed([text])[0], k, nprobe=nprobe, exact=exact
+        )
+
+    def vector(self, key):
+        """
+        Return the stored (dequantized) vector of ``key``, or ``None``.
+        """
+        for segment in reversed(self.segments):
+            rows = np.flatnonzero(np.asarray(segment["keys"]) == key)
+            if len(rows):
+                row = rows[0]
+                return segment["codes"][row] * segment["scales"][row]
+        return None
+
+    def build(self, keys, vectors, nlist=None, **manifest):
+        """
+        Train centroids on ``vectors`` and replace the index with them,
+        stored under ``keys``. Extra ``manifest`` values are saved along.
+        """
+        with self.lock():
+            self._build(keys, vectors, nlist, manifest)
+
+    def add(self, keys, vectors, **manifest):
+        """
+        Insert ``vectors`` under ``keys`` as a new segment, replacing
+        vectors stored earlier under the same keys. Builds the index when
+        there is none.
+        """
+        with self.lock():
+            self._add(keys, vectors, manifest)
+
+    def rebuild(self):
+        """
+        Embed every template and retrain the centroids. Returns the number
+        of indexed templates.
+        """
+        with self.lock():
+            return self._rebuild()
+
+    def update(self, retrain=True):
+        """
+        Embed the templates written since the last update into a new
+        segment. Rebuilds the index when there is none, it was built by
+        another embedder, the table was recreated or it grew
+        ``RETRAIN_GROWTH`` times since the centroids were trained. Returns
+        the number of newly indexed templates.
+
+        With ``retrain=False``, as searches call it, only a segment is ever
+        added: without a usable index nothing is done, and retraining is
+        left to the next import or ``rebuild_search_index``.
+        """
+        newest = LogTemplate.objects.order_by("-updated_at").first()
+        newest = newest.updated_at.isoformat() if newest else None
+        if self.load() and newest == self.manifest.get("updated_at"):
+            return 0
+        with self.lock():
+            if (
+                not self.load()
+                or self.manifest.get("embedder") != self.embedder.config
+                or not LogTemplate.objects.filter(id=self.last_id).exists()
+            ):
+                return self._rebuild() if retrain else 0
+            after = self.manifest.get("updated_at")
+            templates = iter_templates(after)
+            if not templates:
+                return 0
+            if (
+                retrain
+                and self.doc_count + len(templates)
+                > RETRAIN_GROWTH * self.manifest["trained"]
+            ):
+                return self._rebuild()
+            self._add(*self._embed(templates, self.last_id))
+            return len(templates)
+
+    def _embed(self, templates, last_id=0):
+        """
+        Return the keys, vectors and manifest watermarks of ``templates``.
+        """
+        keys = np.array([key for key, _, _ in templates], dtype=np.int64)
+        vectors = self.embedder.embed([text for _, text, _ in templates])
+        manifest = {
+            "updated_at": templates[-1][2].isoformat(),
+            "last_id": max(last_id, int(keys.max())),
+        }
+        return keys, vectors, manifest
+
+    def _rebuild(self):
+        templates = iter_templates()
+        if not templates:
+            self._build(
+                np.zeros(0, np.int64), np.zeros((0, self.embedder.dim)), 1, {}
+            )
+            return 0
+        keys, vectors, manifest = self._embed(templates)
+        self._build(keys, vectors, None, manifest)
+        return len(templates)
+
+    def _build(self, keys, vectors, nlist, manifest):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if nlist is None:
+            nlist = nlist_for(len(vectors))
+        if len(vectors):
+            centroids = train_centroids(vectors, min(nlist, len(vectors)))
+        else:
+            centroids = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        base = self._new_name("base")
+        path = self._staging(base)
+        np.save(os.path.join(path, "centroids.npy"), centroids)
+        self._publish(path, base)
+        segments = []
+        if len(vectors):
+            codes, scales = quantize(vectors)
+            segment = self._save_segment(keys, codes, scales, centroids)
+            segments.append([segment, len(keys)])
+        self._save_manifest(
+            {
+                "last_id": 0,
+                "updated_at": None,
+                **manifest,
+                "base": base,
+                "segments": segments,
+                "trained": len(vectors),
+                "embedder": self.embedder.config,
+            }
+        )
+
+    def _add(self, keys, vectors, manifest):
+        if not self.load() or not len(self.centroids):
+            return self._build(keys, vectors, None, manifest)
+        codes, scales = quantize(vectors)
+        name = self._save_segment(keys, codes, scales, self.centroids)
+        segments = self.manifest["segments"] + [[name, len(keys)]]
+        while len(segments) > MAX_SEGMENTS:
+            segments = self._merge_smallest(segments)
+        self._save_manifest(dict(self.manifest, **manifest, segments=segments))
+
+    def _save_segment(self, keys, codes, scales, centroids):
+        """
+        Write vectors as a segment with their rows sorted by IVF list and
+        return its name.
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        lists = assign_lists(codes, centroids, scales)
+        order = np.argsort(lists, kind="stable")
+        offsets = np.searchsorted(lists[order], np.arange(len(centroids) + 1))
+
+        name = self._new_name("segment")
+        path = self._staging(name)
+        np.save(os.path.join(path, "keys.npy"), keys[order])
+        np.save(os.path.join(path, "codes.npy"), codes[order])
+        np.save(os.path.join(path, "scales.npy"), scales[order])
+        np.save(os.path.join(path, "offsets.npy"), offsets.astype(np.int64))
+        self._publish(path, name)
+        return name
+
+    def _merge_smallest(self, segments):
+        """
+        Merge the two adjacent segments with the fewest vectors, dropping
+        the vectors of the older one that the newer one replaces.
+        """
+        i = min(
+            range(len(segments) - 1),
+            key=lambda i: segments[i][1] + segments[i + 1][1],
+        )
+        older, newer = (
+            self._open_segment(name) for name, _ in segments[i : i + 2]
+        )
+        keep = ~np.isin(older["keys"], newer["keys"])
+        keys = np.concatenate([older["keys"][keep], newer["keys"]])
+        codes = np.concatenate([older["codes"][keep], newer["codes"]])
+        scales = np.concatenate([older["scales"][keep], newer["scales"]])
+        merged = [
+            self._save_segment(keys, codes, scales, self.centroids),
+            len(keys),
+        ]
+        return segments[:i] + [merged] + segments[i + 2 :]
+
+    def _open_segment(self, name):
+        return {
+            array: np.load(
+                os.path.join(self.path, name, f"{array}.npy"), mmap_mode="r"
+            )
+            for array in SEGMENT_ARRAYS
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_semantic_index(path=None):
+    """
+    Return the process-wide ``SemanticIndex`` for ``path`` (default
+    ``settings.LOGFLOW_SEMANTIC_INDEX_DIR``), loaded from disk if it exists.
+    """
+    path = str(path or default_semantic_dir())
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = SemanticIndex(path)
+    index.load()
+    return index
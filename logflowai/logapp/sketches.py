@@ -0,0 +1,495 @@
+"""
+Mergeable sketches of the heaviest and the distinct templates, hosts and
+blocks.
+
+Every import counts its rows into ``LogSketch`` rows per hour and per day:
+
+- a Space-Saving summary (``SpaceSaving``) of the most frequent event ids
+  (``template``), hosts (``host``) and HDFS block ids found in the messages
+  by the ``block`` pattern of ``LOGFLOW_IDENTIFIER_PATTERNS`` (``block``, see
+  ``logapp.identifiers``), each keeping ``LOGFLOW_SKETCH_CAPACITY`` counters;
+- a HyperLogLog counter (``HyperLogLog``) of the distinct hosts and blocks,
+  once over all entries and once over the entries whose level is one of
+  ``LOGFLOW_SKETCH_ERROR_LEVELS``.
+
+Both kinds merge without losing their guarantees, so a query over an
+arbitrary range merges the day sketches of the whole days it covers and the
+hour sketches of the hours at either end: a year is answered from at most 365
+day and 46 hour sketches, whatever the number of entries. Ranges are widened
+to whole hours.
+
+Error bounds. Space-Saving reports, for each value, a ``count`` and an
+``error`` such that the true number of occurrences lies in
+``[count - error, count]``, and a ``floor`` that no unlisted value exceeds.
+Counts are exact (error and floor 0) while a range has no more distinct values
+than the capacity. HyperLogLog estimates a distinct count with a relative
+standard error of ``1.04 / sqrt(2 ** precision)``, 1.6% at the default
+precision of 12 (4 KiB per counter); 95% of estimates fall within twice that.
+
+Sketches are updated by read-modify-write in the importing transaction, which
+relies on imports having a single writer, as all import paths do.
+"""
+
+import hashlib
+import heapq
+import json
+import math
+from collections import Counter, defaultdict
+from operator import itemgetter
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from .identifiers import identifier_pattern
+from .models import LogEntry, LogSketch
+from .rollups import DAY, DEFAULT_CHUNK_SIZE, HOUR, bucket_start
+
+SKETCH_GRANULARITIES = (HOUR, DAY)
+TOP_DIMENSIONS = ("template", "host", "block")
+DISTINCT_DIMENSIONS = ("host", "block")
+DEFAULT_CAPACITY = 100
+DEFAULT_PRECISION = 12
+DEFAULT_ERROR_LEVELS = ("warn", "error", "fatal", "crit", "alert", "emerg")
+
+
+class SpaceSaving:
+    """
+    A Space-Saving summary of at most ``capacity`` counters.
+
+    ``counters`` maps each tracked value to ``[count, error]``: the value
+    occurred between ``count - error`` and ``count`` times. Any other value
+    occurred at most ``floor`` times. ``total`` is the number of counted
+    occurrences.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be positive.")
+        self.capacity = capacity
+        self.counters = {}
+        self.floor = 0
+        self.total = 0
+
+    def update(self, counts):
+        """
+        Count the occurrences in the mapping ``counts`` (value -> count).
+        """
+        # Only the largest counts of the batch can survive the merge; the
+        # largest one left out becomes the batch's floor.
+        batch = SpaceSaving(self.capacity)
+        ranked = heapq.nlargest(
+            self.capacity + 1, counts.items(), key=itemgetter(1)
+        )
+        batch.counters = {
+            value: [count, 0] for value, count in ranked[: self.capacity]
+        }
+        if len(ranked) > self.capacity:
+            batch.floor = ranked[-1][1]
+        batch.total = sum(counts.values())
+        self.merge(batch)
+
+    def merge(self, other):
+        """
+        Add the occurrences summarized by ``other``.
+
+        A value missing from one summary may have occurred up to that
+        summary's ``floor`` times there, which is added to both its count and
+        its error. Only the ``capacity`` largest counts are kept; the floor
+        becomes the largest count dropped, so the bounds stay valid.
+        """
+        merged = {}
+        for value in self.counters.keys() | other.counters.keys():
+            count = error = 0
+            for summary in (self, other):
+                counter = summary.counters.get(value)
+                if counter is None:
+                    count += summary.floor
+                    error += summary.floor
+                else:
+                    count += counter[0]
+                    error += counter[1]
+            merged[value] = [count, error]
+        floor = self.floor + other.floor
+        if len(merged) > self.capacity:
+            ranked = sorted(
+                merged.items(), key=lambda item: item[1][0], reverse=True
+            )
+            floor = max(floor, ranked[self.capacity][1][0])
+            merged = dict(ranked[: self.capacity])
+        self.counters, self.floor = merged, floor
+        self.total += other.total
+
+    def top(self, n):
+        """
+        Return ``(value, count, error)`` of the ``n`` largest counts, largest
+        first.
+        """
+        ranked = sorted(
+            self.counters.items(),
+            key=lambda item: (-item[1][0], item[1][1], item[0]),
+        )
+        return [(value, count, error) for value, (count, error) in ranked[:n]]
+
+    def to_bytes(self):
+        return json.dumps(
+            {
+                "capacity": self.capacity,
+                "floor": self.floor,
+                "total": self.total,
+                "counters": [
+                    [value, count, error]
+                    for value, (count, error) in self.counters.items()
+                ],
+            }
+        ).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, data):
+        state = json.loads(bytes(data))
+        summary = cls(state["capacity"])
+        summary.floor = state["floor"]
+        summary.total = state["total"]
+        summary.counters = {
+            value: [count, error] for value, count, error in state["counters"]
+        }
+        return summary
+
+
+class HyperLogLog:
+    """
+    A HyperLogLog distinct counter with ``2 ** precision`` registers.
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18.")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @property
+    def relative_error(self):
+        """
+        Relative standard error of ``count``.
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, values):
+        """
+        Add the strings ``values``; values already added change nothing.
+        """
+        precision, registers = self.precision, self.registers
+        rest_bits = 64 - precision
+        mask = (1 << rest_bits) - 1
+        for value in values:
+            hashed = int.from_bytes(
+                hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(),
+                "big",
+            )
+            register = hashed >> rest_bits
+            rank = rest_bits - (hashed & mask).bit_length() + 1
+            if rank > registers[register]:
+                registers[register] = rank
+
+    def merge(self, other):
+        """
+        Add the values counted by ``other``, of the same precision.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge counters of different precision.")
+        self.registers = bytearray(
+            np.maximum(
+                np.frombuffer(self.registers, dtype=np.uint8),
+                np.frombuffer(other.registers, dtype=np.uint8),
+            ).tobytes()
+        )
+
+    def count(self):
+        """
+        Estimate the number of distinct values added, with linear counting
+        while many registers are still empty.
+        """
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = (
+            alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(int)))
+        )
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        counter = cls(data[0])
+        counter.registers = bytearray(data[1:])
+        return counter
+
+
+def sketch_capacity():
+    return getattr(settings, "LOGFLOW_SKETCH_CAPACITY", DEFAULT_CAPACITY)
+
+
+def error_levels():
+    return {
+        level.casefold()
+        for level in getattr(
+            settings, "LOGFLOW_SKETCH_ERROR_LEVELS", DEFAULT_ERROR_LEVELS
+        )
+    }
+
+
+def top_name(dimension):
+    return f"top:{dimension}"
+
+
+def distinct_name(dimension, errors=False):
+    return f"distinct:{dimension}" + (":errors" if errors else "")
+
+
+def sketch_values(fields, block_pattern=None):
+    """
+    Return the sketched values of a ``LogEntry`` field dictionary, per
+    dimension, as lists. Block ids are matched by ``block_pattern``, by
+    default the configured ``block`` identifier pattern.
+    """
+    if block_pattern is None:
+        block_pattern = identifier_pattern("block")
+    message = fields.get("message") or ""
+    return {
+        "template": [fields["event_id"]] if fields.get("event_id") else [],
+        "host": [fields["host"]] if fields.get("host") else [],
+        "block": block_pattern.findall(message) if block_pattern else [],
+    }
+
+
+def collect_updates(fields_list, levels):
+    """
+    Return ``{(granularity, bucket): {sketch name: Counter or set}}`` with
+    the occurrences of every sketched value in ``fields_list``. Entries
+    without a timestamp are not sketched.
+    """
+    # Values are listed per hour first; the day updates are merged from the
+    # hour updates rather than counted row by row again.
+    hours = defaultdict(lambda: defaultdict(list))
+    block_pattern = identifier_pattern("block")
+    for fields in fields_list:
+        timestamp = fields.get("timestamp")
+        if timestamp is None:
+            continue
+        lists = hours[bucket_start(timestamp, HOUR)]
+        values = sketch_values(fields, block_pattern)
+        is_error = (fields.get("level_norm") or "") in levels
+        for dimension in TOP_DIMENSIONS:
+            lists[top_name(dimension)] += values[dimension]
+        for dimension in DISTINCT_DIMENSIONS:
+            lists[distinct_name(dimension)] += values[dimension]
+            if is_error:
+                lists[distinct_name(dimension, errors=True)] += values[
+                    dimension
+                ]
+
+    updates = defaultdict(dict)
+    for hour, lists in hours.items():
+        day = updates[(DAY, hour // DAY * DAY)]
+        for name, values in lists.items():
+            if not values:
+                continue
+            if name.startswith("top:"):
+                update = Counter(values)
+                day.setdefault(name, Counter()).update(update)
+            else:
+                update = set(values)
+                day.setdefault(name, set()).update(update)
+            updates[(HOUR, hour)][name] = update
+    return updates
+
+
+def load_sketch(name, data):
+    if name.startswith("top:"):
+        return SpaceSaving.from_bytes(data)
+    return HyperLogLog.from_bytes(data)
+
+
+def add_to_sketches(fields_list):
+    """
+    Count newly inserted ``LogEntry`` field dictionaries (with their derived
+    columns filled in) into the hour and day sketches.
+    """
+    updates = collect_updates(fields_list, error_levels())
+    if not updates:
+        return
+    keys = Q()
+    for granularity, bucket in updates:
+        keys |= Q(granularity=granularity, bucket=bucket)
+    stored = {
+        (sketch.granularity, sketch.bucket, sketch.sketch): sketch.data
+        for sketch in LogSketch.objects.filter(keys)
+    }
+    capacity = sketch_capacity()
+    rows = []
+    for (granularity, bucket), sketches in updates.items():
+        for name, values in sketches.items():
+            data = stored.get((granularity, bucket, name))
+            if name.startswith("top:"):
+                sketch = (
+                    SpaceSaving.from_bytes(data)
+                    if data is not None
+                    else SpaceSaving(capacity)
+                )
+                sketch.update(values)
+            else:
+                sketch = (
+                    HyperLogLog.from_bytes(data)
+                    if data is not None
+                    else HyperLogLog()
+                )
+                sketch.add(values)
+            rows.append(
+                LogSketch(
+                    sketch=name,
+                    granularity=granularity,
+                    bucket=bucket,
+                    data=sketch.to_bytes(),
+                )
+            )
+    LogSketch.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["sketch", "granularity", "bucket"],
+        update_fields=["data"],
+    )
+
+
+def rebuild_sketches(chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Replace the sketches with sketches of every log entry, walking the table
+    by primary key in chunks of ``chunk_size`` in one transaction. Returns
+    the number of entries read.
+    """
+    count = 0
+    with transaction.atomic():
+        LogSketch.objects.all().delete()
+        last_id = 0
+        while True:
+            chunk = list(
+                LogEntry.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values(
+                    "id",
+                    "timestamp",
+                    "host",
+                    "message",
+                    "level_norm",
+                    "event_id",
+                )[:chunk_size]
+            )
+            if not chunk:
+                break
+            add_to_sketches(chunk)
+            count += len(chunk)
+            last_id = chunk[-1]["id"]
+    return count
+
+
+def cover(start, end):
+    """
+    Return a ``Q`` selecting the fewest sketches covering the hours from
+    ``start`` to ``end`` (Unix seconds, multiples of an hour): the days
+    inside the range and the hours at either end.
+    """
+    first_day = -(-start // DAY) * DAY
+    last_day = end // DAY * DAY
+    if first_day >= last_day:
+        return Q(granularity=HOUR, bucket__gte=start, bucket__lt=end)
+    return (
+        Q(granularity=HOUR, bucket__gte=start, bucket__lt=first_day)
+        | Q(granularity=DAY, bucket__gte=first_day, bucket__lt=last_day)
+        | Q(granularity=HOUR, bucket__gte=last_day, bucket__lt=end)
+    )
+
+
+def hour_range(start, end):
+    """
+    Widen the aware datetimes ``start`` and ``end`` to whole hours, as Unix
+    seconds. Raises ``ValueError`` for an empty range.
+    """
+    start = bucket_start(start, HOUR)
+    end = -(-math.ceil(end.timestamp()) // HOUR) * HOUR
+    if end <= start:
+        raise ValueError("The end of the range must be after its start.")
+    return start, end
+
+
+def merged_sketch(name, start, end):
+    """
+    Merge the sketches ``name`` covering the hours ``start`` to ``end``;
+    ``None`` when there are none.
+    """
+    merged = None
+    for data in LogSketch.objects.filter(
+        cover(start, end), sketch=name
+    ).values_list("data", flat=True):
+        sketch = load_sketch(name, data)
+        if merged is None:
+            merged = sketch
+        else:
+            merged.merge(sketch)
+    return merged
+
+
+def top_values(dimension, start, end, n=20):
+    """
+    Return the ``n`` most frequent values of ``dimension`` (one of
+    ``TOP_DIMENSIONS``) from ``start`` to ``end``, widened to whole hours,
+    with their error bounds (see the module documentation).
+    """
+    if dimension not in TOP_DIMENSIONS:
+        raise ValueError(
+            f"Unknown dimension {dimension!r}; choose from "
+            f"{', '.join(TOP_DIMENSIONS)}."
+        )
+    start, end = hour_range(start, end)
+    sketch = merged_sketch(top_name(dimension), start, end)
+    if sketch is None:
+        sketch = SpaceSaving(sketch_capacity())
+    return {
+        "dimension": dimension,
+        "start": start,
+        "end": end,
+        "total": sketch.total,
+        "floor": sketch.floor,
+        "values": [
+            {"value": value, "count": count, "error": error}
+            for value, count, error in sketch.top(n)
+        ],
+    }
+
+
+def distinct_count(dimension, start, end, errors=False):
+    """
+    Estimate the number of distinct values of ``dimension`` (one of
+    ``DISTINCT_DIMENSIONS``) from ``start`` to ``end``, widened to whole
+    hours, among the entries with an error level only when ``errors``.
+    """
+    if dimension not in DISTINCT_DIMENSIONS:
+        raise ValueError(
+            f"Unknown dimension {dimension!r}; choose from "
+            f"{', '.join(DISTINCT_DIMENSIONS)}."
+        )
+    start, end = hour_range(start, end)
+    sketch = merged_sketch(distinct_name(dimension, errors), start, end)
+    if sketch is None:
+        sketch = HyperLogLog()
+    return {
+        "dimension": dimension,
+        "errors": errors,
+        "start": start,
+        "end": end,
+        "estimate": sketch.count(),
+        "relative_error": sketch.relative_error,
+    }
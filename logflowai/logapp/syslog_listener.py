@@ -0,0 +1,284 @@
+"""
+Asyncio syslog receiver behind the ``syslog_listener`` management command.
+
+UDP datagrams and TCP streams (octet-counted or newline-delimited framing,
+RFC 6587) are read on the event loop and put on a bounded queue as raw frames.
+A single writer task drains the queue in batches and hands each batch to a
+one-thread executor, which parses the frames and commits them with
+``commit_batches``, so the database only ever sees one writer and the event
+loop never blocks on it. When the database cannot keep up the queue fills:
+UDP frames are then dropped and counted, while TCP connections stop being read
+until there is room, pushing back on the sender through TCP flow control.
+"""
+
+import asyncio
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from django.db import connections
+from .ingest import RowBatch, commit_batches
+from .syslog_parser import parse_syslog
+
+DEFAULT_QUEUE_SIZE = 100_000
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_FLUSH_INTERVAL = 0.25
+MAX_FRAME_BYTES = 64 * 1024
+UDP_RECEIVE_BUFFER = 8 * 1024 * 1024
+# Datagrams read per readiness callback before yielding to other tasks.
+UDP_READS_PER_WAKEUP = 1024
+
+
+@dataclass
+class SyslogStats:
+    """
+    Counters of a running ``SyslogServer``.
+    """
+
+    received: int = 0
+    committed: int = 0
+    dropped: int = 0
+    invalid: int = 0
+    failed: int = 0
+    batches: int = 0
+    peak_queue_depth: int = 0
+
+
+class SyslogServer:
+    """
+    Receive syslog over UDP and TCP and store it as ``LogEntry`` rows.
+
+    Parameters
+    ----------
+    host : str
+        Address to bind.
+    udp_port, tcp_port : int, optional
+        Ports to listen on; ``None`` disables the transport and ``0`` picks a
+        free port (see ``ports`` once started).
+    queue_size : int
+        Maximum number of frames waiting for the writer.
+    batch_size : int
+        Maximum number of frames committed per transaction.
+    flush_interval : float
+        Longest time in seconds a frame waits for its batch to fill up.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        udp_port=None,
+        tcp_port=None,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+    ):
+        if queue_size < 1 or batch_size < 1:
+            raise ValueError("queue_size and batch_size must be positive.")
+        self.host = host
+        self.udp_port = udp_port
+        self.tcp_port = tcp_port
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stats = SyslogStats()
+        self.ports = {}
+        self.queue = None
+        self.executor = None
+        self.udp_socket = None
+        self.tcp_server = None
+        self.writer_task = None
+        self.last_error = None
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize() if self.queue is not None else 0
+
+    def format_stats(self):
+        stats = self.stats
+        return (
+            f"received {stats.received}, committed {stats.committed}, "
+            f"dropped {stats.dropped}, invalid {stats.invalid}, "
+            f"failed {stats.failed}, "
+            f"queue depth {self.queue_depth}/{self.queue_size} "
+            f"(peak {stats.peak_queue_depth})"
+        )
+
+    async def start(self):
+        """
+        Bind the configured transports and start the writer task.
+        """
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.queue_size)
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="syslog-writer"
+        )
+        if self.udp_port is not None:
+            family, _, _, _, address = socket.getaddrinfo(
+                self.host, self.udp_port, type=socket.SOCK_DGRAM
+            )[0]
+            self.udp_socket = socket.socket(family, socket.SOCK_DGRAM)
+            # A large kernel buffer absorbs bursts while the loop is busy.
+            self.udp_socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER
+            )
+            self.udp_socket.bind(address)
+            self.udp_socket.setblocking(False)
+            loop.add_reader(self.udp_socket.fileno(), self.read_udp)
+            self.ports["udp"] = self.udp_socket.getsockname()[1]
+        if self.tcp_port is not None:
+            self.tcp_server = await asyncio.start_server(
+                self.handle_tcp,
+                self.host,
+                self.tcp_port,
+                limit=MAX_FRAME_BYTES,
+            )
+            self.ports["tcp"] = self.tcp_server.sockets[0].getsockname()[1]
+        self.writer_task = asyncio.create_task(self.write_batches())
+
+    async def stop(self):
+        """
+        Stop listening, commit every frame still queued and shut down the
+        writer thread.
+        """
+        if self.udp_socket is not None:
+            asyncio.get_running_loop().remove_reader(self.udp_socket.fileno())
+            self.udp_socket.close()
+        if self.tcp_server is not None:
+            self.tcp_server.close()
+            await self.tcp_server.wait_closed()
+        if self.writer_task is not None:
+            await self.queue.join()
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+        if self.executor is not None:
+            # Django connections are per thread; close the writer's own.
+            self.executor.submit(connections.close_all).result()
+            self.executor.shutdown()
+
+    def read_udp(self):
+        """
+        Drain pending datagrams (each one syslog frame). Reading many per
+        wakeup instead of one per event loop iteration is what lets a
+        single core keep up with high message rates.
+        """
+        for _ in range(UDP_READS_PER_WAKEUP):
+            try:
+                frame, address = self.udp_socket.recvfrom(MAX_FRAME_BYTES)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            self.offer(frame, address[0])
+
+    def offer(self, frame, peer):
+        """
+        Queue ``frame`` without waiting; it is dropped and counted when the
+        queue is full.
+        """
+        self.stats.received += 1
+        try:
+            self.queue.put_nowait((frame, peer, time.time()))
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            return
+        self._track_depth()
+
+    async def put(self, frame, peer):
+        """
+        Queue ``frame``, waiting for room when the queue is full.
+        """
+        self.stats.received += 1
+        await self.queue.put((frame, peer, time.time()))
+        self._track_depth()
+
+    def _track_depth(self):
+        depth = self.queue.qsize()
+        if depth > self.stats.peak_queue_depth:
+            self.stats.peak_queue_depth = depth
+
+    async def handle_tcp(self, reader, writer):
+        """
+        Read frames from one TCP connection. Each frame is either
+        octet-counted (``<length> <frame>``) or terminated by a newline.
+        """
+        peer = writer.get_extra_info("peername")
+        peer = peer[0] if peer else None
+        try:
+            while True:
+                head = await reader.read(1)
+                if not head:
+                    break
+                if head in b"\r\n":
+                    continue
+                if head.isdigit():
+                    length = head + (await reader.readuntil(b" "))[:-1]
+                    if not length.isdigit() or int(length) > MAX_FRAME_BYTES:
+                        self.stats.invalid += 1
+                        break
+                    frame = await reader.readexactly(int(length))
+                else:
+                    try:
+                        frame = head + await reader.readuntil(b"\n")
+                    except asyncio.IncompleteReadError as e:
+                        frame = head + e.partial
+                await self.put(frame, peer)
+        except asyncio.IncompleteReadError:
+            pass
+        except (asyncio.LimitOverrunError, ValueError):
+            # Oversized or malformed framing: the stream cannot be resynced.
+            self.stats.invalid += 1
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def write_batches(self):
+        """
+        Single writer: collect up to ``batch_size`` frames, waiting at most
+        ``flush_interval`` after the first, and commit them off the loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(
+                        await asyncio.wait_for(self.queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+            try:
+                self.stats.committed += await loop.run_in_executor(
+                    self.executor, store_frames, items
+                )
+                self.stats.batches += 1
+            except Exception as e:
+                # Keep serving; the batch is lost but accounted for.
+                self.stats.failed += len(items)
+                self.last_error = e
+            finally:
+                for _ in items:
+                    self.queue.task_done()
+
+
+def store_frames(items):
+    """
+    Parse ``(frame, peer, received)`` tuples and commit them as one batch.
+    Returns the number of entries inserted.
+    """
+    fields = [
+        parse_syslog(frame, peer, received) for frame, peer, received in items
+    ]
+    return commit_batches([RowBatch(fields=fields)])
@@ -0,0 +1,178 @@
+"""
+Parsing of syslog frames (RFC 5424 and the BSD format of RFC 3164) into
+``LogEntry`` fields.
+
+The syslog severity becomes ``level``, the APP-NAME (or RFC 3164 tag) the
+``service`` and HOSTNAME the ``host``; facility, process id, message id and
+structured data are kept in ``additional_data``. Frames that follow neither
+format are stored whole as the message rather than being dropped.
+"""
+
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from dateutil import parser
+
+SEVERITIES = (
+    "EMERG",
+    "ALERT",
+    "CRIT",
+    "ERROR",
+    "WARN",
+    "NOTICE",
+    "INFO",
+    "DEBUG",
+)
+
+MONTHS = {
+    name: number
+    for number, name in enumerate(
+        ("Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split()),
+        start=1,
+    )
+}
+
+# Longest ``LogEntry.service`` / ``LogEntry.host`` value.
+MAX_NAME_LENGTH = 100
+
+PRI_PATTERN = re.compile(r"<(\d{1,3})>")
+
+# <PRI>VERSION SP TIMESTAMP SP HOSTNAME SP APP-NAME SP PROCID SP MSGID SP
+# STRUCTURED-DATA [SP MSG]
+RFC5424_PATTERN = re.compile(
+    r"(\d{1,2}) (\S+) (\S+) (\S+) (\S+) (\S+) "
+    r"(-|(?:\[(?:[^\]\\]|\\.)*\])+)(?: (.*))?",
+    re.DOTALL,
+)
+
+# <PRI>Mmm dd hh:mm:ss SP HOSTNAME SP MSG
+RFC3164_PATTERN = re.compile(
+    r"([A-Z][a-z]{2}) ([ \d]\d) (\d\d):(\d\d):(\d\d) (\S+) (.*)", re.DOTALL
+)
+
+# TAG[PID]: CONTENT
+TAG_PATTERN = re.compile(
+    r"([^\s:\[\]]{1,48})(?:\[([^\]]*)\])?: ?(.*)", re.DOTALL
+)
+
+
+def _nil(value):
+    return None if value == "-" else value
+
+
+@lru_cache(maxsize=4096)
+def parse_rfc3164_timestamp(month, day, hour, minute, second, year):
+    """
+    Build a UTC datetime from the fields of an RFC 3164 timestamp and a
+    ``year``. Cached, as consecutive messages mostly share their second.
+    """
+    return datetime(
+        year,
+        MONTHS[month],
+        int(day),
+        int(hour),
+        int(minute),
+        int(second),
+        tzinfo=timezone.utc,
+    )
+
+
+def parse_syslog(frame, peer=None, received=None):
+    """
+    Parse one syslog ``frame`` (``bytes`` or ``str``) into keyword arguments
+    for ``LogEntry``.
+
+    ``peer`` is the sender's address, used when the frame carries no
+    hostname, and ``received`` the arrival time (a Unix timestamp or aware
+    datetime), used when it carries no usable timestamp.
+    """
+    if isinstance(frame, bytes):
+        frame = frame.decode("utf-8", errors="replace")
+    frame = frame.rstrip("\r\n\x00")
+    if received is None:
+        received = datetime.now(timezone.utc)
+    elif not isinstance(received, datetime):
+        received = datetime.fromtimestamp(received, tz=timezone.utc)
+
+    fields = {
+        "timestamp": received,
+        "level": None,
+        "message": frame,
+        "service": None,
+        "host": peer,
+        "additional_data": {},
+    }
+    match = PRI_PATTERN.match(frame)
+    if match is None or int(match.group(1)) > 191:
+        return fields
+    pri = int(match.group(1))
+    body = frame[match.end() :]
+    fields["level"] = SEVERITIES[pri % 8]
+    extra = fields["additional_data"]
+    extra["facility"] = pri // 8
+    extra["severity"] = pri % 8
+    fields["message"] = body
+
+    match = RFC5424_PATTERN.fullmatch(body)
+    if match is not None:
+        (
+            _version,
+            timestamp,
+            hostname,
+            app_name,
+            procid,
+            msgid,
+            structured_data,
+            message,
+        ) = match.groups()
+        extra["format"] = "rfc5424"
+        if _nil(timestamp):
+            try:
+                timestamp = parser.isoparse(timestamp)
+            except (ValueError, OverflowError):
+                pass
+            else:
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+                fields["timestamp"] = timestamp
+        if _nil(hostname):
+            fields["host"] = hostname[:MAX_NAME_LENGTH]
+        if _nil(app_name):
+            fields["service"] = app_name[:MAX_NAME_LENGTH]
+        if _nil(procid):
+            extra["Pid"] = procid
+        if _nil(msgid):
+            extra["msgid"] = msgid
+        if _nil(structured_data):
+            extra["structured_data"] = structured_data
+        message = message or ""
+        fields["message"] = message.removeprefix("\ufeff")
+        return fields
+
+    match = RFC3164_PATTERN.fullmatch(body)
+    if match is not None:
+        month, day, hour, minute, second, hostname, content = match.groups()
+        extra["format"] = "rfc3164"
+        if month in MONTHS:
+            try:
+                stamp = (month, day, hour, minute, second)
+                timestamp = parse_rfc3164_timestamp(*stamp, received.year)
+                # RFC 3164 has no year: a December message received in
+                # early January belongs to the previous one.
+                if (timestamp - received).days > 1:
+                    timestamp = parse_rfc3164_timestamp(
+                        *stamp, received.year - 1
+                    )
+                fields["timestamp"] = timestamp
+            except ValueError:
+                pass
+        fields["host"] = hostname[:MAX_NAME_LENGTH]
+        fields["message"] = content
+        match = TAG_PATTERN.fullmatch(content)
+        if match is not None:
+            tag, pid, content = match.groups()
+            fields["service"] = tag
+            fields["message"] = content
+            if pid:
+                extra["Pid"] = pid
+    return fields
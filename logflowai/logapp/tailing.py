@@ -0,0 +1,230 @@
+"""
+Follow (tail) mode for ``import_logs``.
+
+``FileTail`` tracks one growing log file, only consuming complete lines and
+noticing when the file is rotated (a new inode appears at the path) or
+truncated in place. ``iter_follow_batches`` polls a set of tails and groups
+new lines into micro-batches that are flushed when they reach a size limit or
+when their oldest line has waited for the flush interval.
+"""
+
+import csv
+import hashlib
+import os
+import time
+from collections import deque
+from .ingest import (
+    FINGERPRINT_BYTES,
+    RowBatch,
+    detect_format,
+    resume_point,
+    source_key,
+)
+
+READ_SIZE = 1024 * 1024
+
+
+class FileTail:
+    """
+    Follow a single log file from its import checkpoint.
+
+    Parameters
+    ----------
+    path : str
+        The file to follow. It does not need to exist yet.
+    input_format : str
+        ``"csv"``, ``"raw"`` or ``"auto"``.
+    resume : bool
+        Start from the stored checkpoint rather than the beginning.
+    """
+
+    def __init__(self, path, input_format="auto", resume=True):
+        self.path = path
+        self.source = source_key(path)
+        self.format = (
+            detect_format(path) if input_format == "auto" else input_format
+        )
+        self.resume = resume
+        self.fh = None
+        self.inode = None
+        self.generation = 0
+        self.offset = 0
+        self.line_id = 0
+        self.header = None
+        self.buffer = b""
+        self.lines = deque()
+
+    def open(self):
+        """
+        Open the file at its checkpoint. Returns ``False`` if it is missing.
+        """
+        if not os.path.exists(self.path):
+            return False
+        offset, line_id, self.generation = resume_point(self.path, self.resume)
+        # Later generations are always read from their first line.
+        self.resume = True
+        return self._open(offset, line_id or 0)
+
+    def _open(self, offset, line_id):
+        try:
+            fh = open(self.path, "rb")
+        except FileNotFoundError:
+            return False
+        self.fh = fh
+        self.inode = os.fstat(fh.fileno()).st_ino
+        self.header = None
+        self.buffer = b""
+        self.lines.clear()
+        if self.format == "csv" and offset > 0:
+            self.header = next(
+                csv.reader([fh.readline().decode("utf-8")]), None
+            )
+            offset = max(offset, fh.tell())
+        fh.seek(offset)
+        self.offset = offset
+        self.line_id = line_id
+        return True
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
+
+    def read_rows(self, limit):
+        """
+        Return up to ``limit`` new ``(row, end_offset)`` pairs. A trailing
+        line without a newline is held back until it is completed.
+        """
+        if self.fh is None and not self.open():
+            return []
+        rows = []
+        while len(rows) < limit:
+            if not self.lines:
+                chunk = self.fh.read(READ_SIZE)
+                if not chunk:
+                    break
+                parts = (self.buffer + chunk).split(b"\n")
+                self.buffer = parts.pop()
+                self.lines.extend(parts)
+                continue
+            raw = self.lines.popleft()
+            self.offset += len(raw) + 1
+            line = raw.decode("utf-8").rstrip("\r")
+            if self.format == "csv":
+                if self.header is None:
+                    self.header = next(csv.reader([line]), None)
+                elif line:
+                    rows.append((next(csv.reader([line])), self.offset))
+            else:
+                self.line_id += 1
+                if line:
+                    rows.append(((self.line_id, line), self.offset))
+        return rows
+
+    def rotated(self):
+        """
+        Return ``True`` when the path now points at a different file or the
+        file shrank below what has already been read.
+        """
+        if self.fh is None:
+            return False
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return stat.st_ino != self.inode or stat.st_size < self.fh.tell()
+
+    def reopen(self):
+        """
+        Switch to the next generation of a rotated or truncated file.
+        """
+        self.close()
+        self.generation += 1
+        return self._open(0, 0)
+
+    def fingerprint(self, end_offset):
+        """
+        Fingerprint the file that is currently open, which may no longer be
+        the one at ``path`` after a rotation.
+        """
+        position = self.fh.tell()
+        self.fh.seek(0)
+        head = self.fh.read(min(end_offset, FINGERPRINT_BYTES))
+        self.fh.seek(position)
+        return hashlib.sha256(head).hexdigest()
+
+    def make_batch(self, rows):
+        end_offset = rows[-1][1]
+        return RowBatch(
+            source=self.source,
+            generation=self.generation,
+            format=self.format,
+            fieldnames=self.header,
+            rows=[row for row, _ in rows],
+            end_offset=end_offset,
+            fingerprint=self.fingerprint(end_offset),
+        )
+
+
+def iter_follow_batches(
+    tails,
+    batch_size,
+    flush_interval,
+    poll_interval,
+    idle_timeout=None,
+    clock=time.monotonic,
+    sleep=time.sleep,
+):
+    """
+    Poll ``tails`` forever (or until no new line arrived for
+    ``idle_timeout`` seconds) and yield ``(batches, oldest_arrival)`` for
+    every micro-batch.
+
+    A micro-batch is flushed as soon as it holds ``batch_size`` rows or its
+    oldest row has waited ``flush_interval`` seconds; ``oldest_arrival`` is
+    the ``clock()`` time at which that row was read, so callers can measure
+    ingest-to-visible latency after committing.
+    """
+    pending = {}
+    pending_rows = 0
+    oldest = None
+    last_data = clock()
+
+    def flush():
+        nonlocal pending, pending_rows, oldest
+        batches = [tail.make_batch(rows) for tail, rows in pending.items()]
+        flushed = (batches, oldest)
+        pending, pending_rows, oldest = {}, 0, None
+        return flushed
+
+    while True:
+        received = 0
+        for tail in tails:
+            rows = tail.read_rows(max(batch_size - pending_rows, 1))
+            if rows:
+                if oldest is None:
+                    oldest = clock()
+                pending.setdefault(tail, []).extend(rows)
+                pending_rows += len(rows)
+                received += len(rows)
+                if pending_rows >= batch_size:
+                    yield flush()
+            elif tail.rotated():
+                # Commit what was read from the old file before switching.
+                if tail in pending:
+                    yield flush()
+                tail.reopen()
+
+        now = clock()
+        if pending and now - oldest >= flush_interval:
+            yield flush()
+        if received:
+            last_data = now
+            continue
+        if idle_timeout is not None and now - last_data >= idle_timeout:
+            if pending:
+                yield flush()
+            for tail in tails:
+                tail.close()
+            return
+        sleep(poll_interval)
@@ -0,0 +1,225 @@
+"""
+Online log template mining for raw, unstructured log lines.
+
+``TemplateMiner`` implements the Drain algorithm (He et al., ICWS 2017): a
+fixed-depth parse tree routes each message by its token count and leading
+tokens to a small set of candidate clusters, and the message either joins the
+most similar cluster (generalizing differing tokens to ``<*>``) or starts a new
+one. Each cluster yields a stable ``EventId`` and its current
+``EventTemplate``; mined ids are ``M1``, ``M2``, ... so they never collide
+with the ``E<n>`` ids of the structured CSV datasets. The miner state is JSON
+serializable so a restarted importer keeps its templates and event ids.
+"""
+
+import json
+import os
+import re
+from .identifiers import DEFAULT_PATTERNS
+
+WILDCARD = "<*>"
+# Prefix of the mined event ids, apart from the CSV datasets' "E<n>" ids.
+EVENT_ID_PREFIX = "M"
+
+# Variable fields masked before tokenizing, as (pattern, replacement).
+DEFAULT_MASKS = [
+    (DEFAULT_PATTERNS["block"], "blk_<*>"),
+    (r"(?<![\w.])(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?(?![\w.])", WILDCARD),
+    (r"(?<![\w.])0x[0-9a-fA-F]+(?![\w.])", WILDCARD),
+    (r"(?<![\w.])[-+]?\d+(?:\.\d+)?(?![\w.])", WILDCARD),
+]
+
+# Raw HDFS line: "<Date> <Time> <Pid> <Level> <Component>: <Content>".
+HDFS_LINE_PATTERN = re.compile(
+    r"^(?P<Date>\d{6}) (?P<Time>\d{6}) (?P<Pid>\d+) (?P<Level>\w+) "
+    r"(?P<Component>[^:\s]+): (?P<Content>.*)$"
+)
+
+
+def parse_raw_line(line):
+    """
+    Split a raw HDFS log line into the columns of the structured CSV format.
+
+    Lines that do not match the HDFS layout are kept whole as ``Content``.
+    """
+    match = HDFS_LINE_PATTERN.match(line)
+    if match is None:
+        return {"Content": line}
+    return match.groupdict()
+
+
+def _has_digit(token):
+    return any(char.isdigit() for char in token)
+
+
+class TemplateMiner:
+    """
+    Streaming Drain template miner.
+
+    Parameters
+    ----------
+    depth : int
+        Depth of the parse tree including the root and token-count levels, so
+        ``depth - 2`` leading tokens are used for routing.
+    similarity_threshold : float
+        Minimum fraction of matching tokens for a message to join a cluster.
+    max_children : int
+        Maximum number of children per internal node; further tokens are
+        routed through the ``<*>`` child.
+    masks : list of (str, str), optional
+        Regex substitutions applied before tokenizing.
+    """
+
+    def __init__(
+        self,
+        depth=4,
+        similarity_threshold=0.4,
+        max_children=100,
+        masks=None,
+    ):
+        if depth < 3:
+            raise ValueError("depth must be at least 3.")
+        self.depth = depth
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.masks = list(DEFAULT_MASKS if masks is None else masks)
+        self._compiled_masks = [
+            (re.compile(pattern), replacement)
+            for pattern, replacement in self.masks
+        ]
+        self.root = {}
+        # cluster id -> {"tokens": [...], "size": int}
+        self.clusters = {}
+
+    def tokenize(self, content):
+        """
+        Mask variable fields in ``content`` and split it on whitespace.
+        """
+        for pattern, replacement in self._compiled_masks:
+            content = pattern.sub(replacement, content)
+        return content.split()
+
+    def add_log_message(self, content):
+        """
+        Assign ``content`` to a template, creating or generalizing clusters as
+        needed. Returns ``(event_id, event_template)``.
+        """
+        tokens = self.tokenize(content)
+        leaf = self._route(tokens)
+        cluster_id = self._best_cluster(leaf, tokens)
+        if cluster_id is None:
+            cluster_id = len(self.clusters) + 1
+            self.clusters[cluster_id] = {"tokens": tokens, "size": 1}
+            leaf.append(cluster_id)
+        else:
+            cluster = self.clusters[cluster_id]
+            cluster["tokens"] = [
+                old if old == new else WILDCARD
+                for old, new in zip(cluster["tokens"], tokens)
+            ]
+            cluster["size"] += 1
+        return self.event_id(cluster_id), self.template(cluster_id)
+
+    def event_id(self, cluster_id):
+        return f"{EVENT_ID_PREFIX}{cluster_id}"
+
+    def template(self, cluster_id):
+        return " ".join(self.clusters[cluster_id]["tokens"])
+
+    def templates(self):
+        """
+        Return a ``{event_id: template}`` mapping of every known cluster.
+        """
+        return {
+            self.event_id(cluster_id): self.template(cluster_id)
+            for cluster_id in self.clusters
+        }
+
+    def _route(self, tokens):
+        """
+        Walk (and grow) the parse tree, returning the leaf cluster list.
+        """
+        node = self.root.setdefault(str(len(tokens)), {})
+        routing = tokens[: self.depth - 2]
+        for index, token in enumerate(routing):
+            if _has_digit(token):
+                token = WILDCARD
+            if token not in node:
+                if len(node) >= self.max_children - 1 and WILDCARD != token:
+                    token = WILDCARD
+            last = index == len(routing) - 1
+            node = node.setdefault(token, [] if last else {})
+        if not routing:
+            node = node.setdefault(WILDCARD, [])
+        return node
+
+    def _best_cluster(self, leaf, tokens):
+        best_id = None
+        best = (-1.0, -1)
+        for cluster_id in leaf:
+            template = self.clusters[cluster_id]["tokens"]
+            same = params = 0
+            for old, new in zip(template, tokens):
+                if old == WILDCARD:
+                    params += 1
+                elif old == new:
+                    same += 1
+            similarity = same / len(tokens) if tokens else 1.0
+            if (similarity, params) > best:
+                best_id, best = cluster_id, (similarity, params)
+        if best_id is not None and best[0] >= self.similarity_threshold:
+            return best_id
+        return None
+
+    def to_dict(self):
+        """
+        Return the full miner state as JSON-serializable data.
+        """
+        return {
+            "depth": self.depth,
+            "similarity_threshold": self.similarity_threshold,
+            "max_children": self.max_children,
+            "masks": [list(mask) for mask in self.masks],
+            "root": self.root,
+            "clusters": {
+                str(cluster_id): cluster
+                for cluster_id, cluster in self.clusters.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Rebuild a miner from the output of ``to_dict``.
+        """
+        miner = cls(
+            depth=data["depth"],
+            similarity_threshold=data["similarity_threshold"],
+            max_children=data["max_children"],
+            masks=[tuple(mask) for mask in data["masks"]],
+        )
+        miner.root = data["root"]
+        miner.clusters = {
+            int(cluster_id): cluster
+            for cluster_id, cluster in data["clusters"].items()
+        }
+        return miner
+
+    def save(self, path):
+        """
+        Atomically write the miner state to ``path`` as JSON.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """
+        Load miner state from ``path``, or return a new miner built with
+        ``kwargs`` when the file does not exist.
+        """
+        if not os.path.exists(path):
+            return cls(**kwargs)
+        with open(path, encoding="utf-8") as fh:
+            return cls.from_dict(json.load(fh))
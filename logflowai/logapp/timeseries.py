@@ -0,0 +1,244 @@
+"""
+Log counts over time at an arbitrary bucket width, downsampled for charts.
+
+``timeseries`` counts the entries between two instants in buckets of 1 second
+to 1 day, optionally split by service, level and event id, and returns each
+series as columnar ``time``/``count`` arrays. Buckets are aligned to multiples
+of the width since the Unix epoch and empty buckets count zero.
+
+Counts come from the rollups (see ``logapp.rollups``) whenever the width is a
+multiple of a rollup granularity, using the coarsest one that fits: a 15-minute
+series sums minute rows, a 6-hour series hourly rows. Only widths that are not
+whole minutes read ``LogEntry`` itself, through the timestamp index.
+
+A series longer than ``max_points`` is downsampled with Largest-Triangle-
+Three-Buckets (``lttb``), which keeps the first and last points and, per
+bucket of the series, the point spanning the largest triangle with its
+neighbors, so spikes and dips survive the reduction.
+"""
+
+import math
+import re
+from collections import Counter
+from datetime import datetime, timezone
+import numpy as np
+from django.conf import settings
+from django.db.models import F, Sum
+from .models import LogEntry, LogRollup
+from .rollups import DAY, GRANULARITIES, bucket_start
+
+DEFAULT_MAX_POINTS = 1000
+MAX_POINTS = 10_000
+DEFAULT_MAX_BUCKETS = 1_000_000
+ENTRY_CHUNK_SIZE = 10_000
+
+# Group-by field -> (LogRollup column, LogEntry column).
+GROUP_FIELDS = {
+    "service": ("service", "service_norm"),
+    "level": ("level", "level_norm"),
+    "event": ("event_id", "event_id"),
+}
+
+WIDTH_UNITS = {"s": 1, "m": 60, "h": 3600, "d": DAY}
+WIDTH_PATTERN = re.compile(r"(\d+)([smhd]?)")
+
+
+def parse_width(value):
+    """
+    Parse a bucket width such as ``"30s"``, ``"5m"``, ``"1h"``, ``"1d"`` or
+    a number of seconds. Raises ``ValueError`` unless it is between one
+    second and one day.
+    """
+    match = WIDTH_PATTERN.fullmatch(str(value).strip().lower())
+    if match is None:
+        raise ValueError(f"Invalid bucket width: {value!r}.")
+    width = int(match.group(1)) * WIDTH_UNITS[match.group(2) or "s"]
+    if not 1 <= width <= DAY:
+        raise ValueError("The bucket width must be between 1s and 1d.")
+    return width
+
+
+def parse_group_by(value):
+    """
+    Parse a comma-separated list of ``GROUP_FIELDS`` names, keeping their
+    order. Raises ``ValueError`` for unknown names.
+    """
+    fields = []
+    for name in (value or "").split(","):
+        name = name.strip().lower()
+        if not name or name in fields:
+            continue
+        if name not in GROUP_FIELDS:
+            raise ValueError(
+                f"Cannot group by {name!r}; choose from "
+                f"{', '.join(GROUP_FIELDS)}."
+            )
+        fields.append(name)
+    return fields
+
+
+def source_granularity(width):
+    """
+    Return the coarsest rollup granularity dividing ``width``, or ``None``
+    when the counts must come from the log entries.
+    """
+    fitting = [g for g in GRANULARITIES if width % g == 0]
+    return max(fitting) if fitting else None
+
+
+def lttb(x, y, threshold):
+    """
+    Return the indices of the ``threshold`` points of the series ``(x, y)``
+    that Largest-Triangle-Three-Buckets keeps, in order. Series of at most
+    ``threshold`` points are kept whole.
+    """
+    n = len(x)
+    if n <= threshold:
+        return np.arange(n)
+    if threshold < 3:
+        raise ValueError("threshold must be at least 3.")
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        # The next point is represented by the average of the next bucket.
+        next_start = end
+        next_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def rollup_counts(start, end, width, group_by, granularity):
+    """
+    Yield ``(time, *group values, count)`` summed from the rollups of
+    ``granularity`` for the buckets of ``width`` in ``[start, end)``.
+    """
+    columns = [GROUP_FIELDS[name][0] for name in group_by]
+    rows = (
+        LogRollup.objects.filter(
+            granularity=granularity, bucket__gte=start, bucket__lt=end
+        )
+        .annotate(time=F("bucket") / width * width)
+        .values("time", *columns)
+        .annotate(total=Sum("count"))
+        .values_list("time", *columns, "total")
+    )
+    return rows.iterator(chunk_size=ENTRY_CHUNK_SIZE)
+
+
+def entry_counts(start, end, width, group_by):
+    """
+    Yield ``(time, *group values, count)`` counted from the log entries
+    for the buckets of ``width`` in ``[start, end)``.
+    """
+    columns = [GROUP_FIELDS[name][1] for name in group_by]
+    counts = Counter()
+    rows = LogEntry.objects.filter(
+        timestamp__gte=datetime.fromtimestamp(start, tz=timezone.utc),
+        timestamp__lt=datetime.fromtimestamp(end, tz=timezone.utc),
+    ).values_list("timestamp", *columns)
+    for timestamp, *values in rows.iterator(chunk_size=ENTRY_CHUNK_SIZE):
+        values = [value or "" for value in values]
+        counts[(bucket_start(timestamp, width), *values)] += 1
+    for key, count in counts.items():
+        yield (*key, count)
+
+
+def timeseries(start, end, width, group_by=(), max_points=None):
+    """
+    Count the log entries from ``start`` to ``end`` (aware datetimes) in
+    buckets of ``width`` seconds, one series per distinct combination of
+    the ``group_by`` fields (see ``GROUP_FIELDS``).
+
+    Returns a dictionary with the bucket-aligned ``start`` and ``end`` (Unix
+    seconds), the ``width``, the ``source`` of the counts (``"rollup:<g>"``
+    or ``"entries"``), whether any series was ``downsampled`` and the
+    ``series``, each holding its ``key`` (group field -> value, case-folded;
+    empty when unknown) and the columnar ``time`` and ``count`` lists.
+
+    Series of more than ``max_points`` buckets (default
+    ``settings.LOGFLOW_TIMESERIES_MAX_POINTS``, at most ``MAX_POINTS``) are
+    downsampled with ``lttb``. Raises ``ValueError`` when the range is empty
+    or its buckets, summed over all series, exceed
+    ``settings.LOGFLOW_TIMESERIES_MAX_BUCKETS``, which bounds the memory of
+    the counts.
+    """
+    if max_points is None:
+        max_points = getattr(
+            settings, "LOGFLOW_TIMESERIES_MAX_POINTS", DEFAULT_MAX_POINTS
+        )
+    max_points = min(max(int(max_points), 3), MAX_POINTS)
+    max_buckets = getattr(
+        settings, "LOGFLOW_TIMESERIES_MAX_BUCKETS", DEFAULT_MAX_BUCKETS
+    )
+    group_by = list(group_by)
+    start = bucket_start(start, width)
+    end = -(-math.ceil(end.timestamp()) // width) * width
+    if end <= start:
+        raise ValueError("The end of the range must be after its start.")
+    buckets = (end - start) // width
+    if buckets > max_buckets:
+        raise ValueError(
+            f"The range spans {buckets} buckets, more than {max_buckets}; "
+            "choose a wider bucket or a shorter range."
+        )
+
+    granularity = source_granularity(width)
+    if granularity is None:
+        rows = entry_counts(start, end, width, group_by)
+        source = "entries"
+    else:
+        rows = rollup_counts(start, end, width, group_by, granularity)
+        source = f"rollup:{granularity}"
+
+    counts = {}
+    if not group_by:
+        counts[()] = np.zeros(buckets, dtype=np.int64)
+    for time, *values, count in rows:
+        key = tuple(values)
+        if key not in counts:
+            if (len(counts) + 1) * buckets > max_buckets:
+                raise ValueError(
+                    f"{len(counts) + 1} series of {buckets} buckets exceed "
+                    f"{max_buckets} buckets in all; choose a wider bucket, "
+                    "a shorter range or fewer group-by fields."
+                )
+            counts[key] = np.zeros(buckets, dtype=np.int64)
+        counts[key][(time - start) // width] += count
+
+    times = np.arange(start, end, width, dtype=np.int64)
+    series = []
+    downsampled = False
+    for key in sorted(counts):
+        keep = lttb(times, counts[key], max_points)
+        downsampled = downsampled or len(keep) < buckets
+        series.append(
+            {
+                "key": dict(zip(group_by, key)),
+                "time": times[keep].tolist(),
+                "count": counts[key][keep].tolist(),
+            }
+        )
+    return {
+        "start": start,
+        "end": end,
+        "width": width,
+        "group_by": group_by,
+        "source": source,
+        "downsampled": downsampled,
+        "series": series,
+    }
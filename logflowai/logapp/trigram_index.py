@@ -0,0 +1,502 @@
+"""
+Trigram index over ``LogEntry.message`` for regular expression search.
+
+Every message is lowercased (ASCII letters only, so byte offsets are kept),
+encoded as UTF-8 and split into its distinct byte trigrams. A segment stores,
+for each trigram, the ascending ids of the entries containing it, delta-encoded
+and packed as variable-length integers (7 bits per byte), so a typical posting
+costs one or two bytes instead of eight. ``keys.npy`` holds the sorted
+trigrams, ``offsets.npy`` where each posting list starts in ``postings.npy``;
+all three are memory-mapped.
+
+A regular expression is analyzed (``regex_query``) into a boolean query over
+trigrams every match must contain, e.g. ``blk_-?\\d+ (is|was) added`` requires
+``blk`` and ``lk_`` and either `` is added`` or `` was added``. Intersecting
+and merging the posting lists gives a small candidate set, on which the real
+expression then runs. Expressions without required literals of three or more
+characters (``\\d+``) cannot be narrowed and fall back to a scan.
+
+The index lives in ``settings.LOGFLOW_TRIGRAM_INDEX_DIR`` and is maintained
+like the TF-IDF index (see ``logapp.search_index``): ``update`` appends the
+new entries as a segment and small segments are merged. Messages changed after
+they were indexed are only seen again after a ``rebuild``.
+"""
+
+import os
+import re
+import threading
+import numpy as np
+from django.conf import settings
+from .search_index import IndexDirectory, iter_messages, newest_entry_id
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # pragma: no cover - Python < 3.11
+    import sre_constants
+    import sre_parse
+
+DEFAULT_SEGMENT_SIZE = 100_000
+MAX_SEGMENTS = 8
+SEGMENT_ARRAYS = ("keys", "offsets", "postings")
+
+# Largest set of alternative literal strings tracked while analyzing a
+# regular expression, and largest character class expanded into it.
+MAX_EXACT = 64
+MAX_CLASS = 16
+
+# ASCII letters that also match non-ASCII characters case-insensitively
+# (e.g. ``s`` and U+017F), so they cannot be folded under ``re.IGNORECASE``.
+UNFOLDABLE = frozenset(map(ord, "IKSiks"))
+
+
+def default_trigram_dir():
+    return str(
+        getattr(
+            settings,
+            "LOGFLOW_TRIGRAM_INDEX_DIR",
+            os.path.join(settings.BASE_DIR, "trigram_index"),
+        )
+    )
+
+
+def fold(text):
+    """
+    Return the bytes indexed for ``text``: UTF-8 with ASCII letters
+    lowercased.
+    """
+    return text.encode("utf-8", "surrogatepass").lower()
+
+
+def trigram_keys(data):
+    """
+    Return the distinct trigrams of ``data`` (bytes) as sorted integers.
+    """
+    if len(data) < 3:
+        return np.zeros(0, dtype=np.uint32)
+    b = np.frombuffer(data, dtype=np.uint8).astype(np.uint32)
+    return np.unique((b[:-2] << 16) | (b[1:-1] << 8) | b[2:])
+
+
+def varint_encode(values):
+    """
+    Pack non-negative integers as little-endian base-128 varints. Returns
+    the bytes as a ``uint8`` array and the length of every value.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        lengths += rest > 0
+        rest >>= np.uint64(7)
+    out = np.empty(int(lengths.sum()), dtype=np.uint8)
+    starts = np.cumsum(lengths) - lengths
+    for k in range(int(lengths.max(initial=0))):
+        more = lengths > k
+        byte = (values[more] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        byte |= np.where(lengths[more] > k + 1, 0x80, 0).astype(np.uint64)
+        out[starts[more] + k] = byte
+    return out, lengths
+
+
+def varint_decode(data):
+    """
+    Invert ``varint_encode``.
+    """
+    data = np.asarray(data)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = (np.arange(len(data)) - np.repeat(starts, ends - starts + 1)) * 7
+    values = (data & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(values, starts).astype(np.int64)
+
+
+# Trigram queries: an int (one trigram), ("and", [...]), ("or", [...]), or
+# None for "no restriction".
+
+
+def and_query(queries):
+    parts = []
+    for query in queries:
+        if isinstance(query, tuple) and query[0] == "and":
+            parts.extend(query[1])
+        elif query is not None:
+            parts.append(query)
+    parts = list(dict.fromkeys(parts))
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("and", tuple(parts))
+
+
+def or_query(queries):
+    parts = []
+    for query in queries:
+        if query is None:
+            return None
+        if isinstance(query, tuple) and query[0] == "or":
+            parts.extend(query[1])
+        else:
+            parts.append(query)
+    parts = list(dict.fromkeys(parts))
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else ("or", tuple(parts))
+
+
+def literal_query(strings):
+    """
+    Query for text containing one of the byte ``strings``.
+    """
+    return or_query(
+        [
+            (
+                and_query(trigram_keys(string).tolist())
+                if len(string) >= 3
+                else None
+            )
+            for string in strings
+        ]
+    )
+
+
+def _analyze_sequence(items, ignore_case):
+    """
+    Return ``(exact, query)`` for a sequence of parsed regex items:
+    ``exact`` is the set of folded strings the sequence can match, when
+    known and small, and ``query`` the trigrams any match contains.
+    """
+    run = {b""}
+    exact = True
+    queries = []
+    for op, av in items:
+        node_exact, node_query = _analyze_node(op, av, ignore_case)
+        if node_exact is not None and len(run) * len(node_exact) <= MAX_EXACT:
+            run = {a + b for a in run for b in node_exact}
+            continue
+        exact = False
+        queries.append(literal_query(run))
+        if node_exact is not None:
+            run = set(node_exact)
+        else:
+            queries.append(node_query)
+            run = {b""}
+    queries.append(literal_query(run))
+    return (run if exact else None), and_query(queries)
+
+
+def _analyze_node(op, av, ignore_case):
+    if op is sre_constants.LITERAL:
+        if ignore_case and (av > 0x7F or av in UNFOLDABLE):
+            return None, None
+        return {fold(chr(av))}, None
+    if op is sre_constants.IN:
+        chars = set()
+        for item_op, item_av in av:
+            if item_op is sre_constants.LITERAL:
+                chars.add(item_av)
+            elif item_op is sre_constants.RANGE:
+                low, high = item_av
+                if high - low >= MAX_CLASS:
+                    return None, None
+                chars.update(range(low, high + 1))
+            else:
+                return None, None
+        if len(chars) > MAX_CLASS or (
+            ignore_case and any(c > 0x7F or c in UNFOLDABLE for c in chars)
+        ):
+            return None, None
+        return {fold(chr(c)) for c in chars}, None
+    if op is sre_constants.BRANCH:
+        results = [_analyze_sequence(branch, ignore_case) for branch in av[1]]
+        strings = set()
+        for branch_exact, _ in results:
+            if branch_exact is None:
+                strings = None
+                break
+            strings |= branch_exact
+        if strings is not None and len(strings) <= MAX_EXACT:
+            return strings, literal_query(strings)
+        return None, or_query([query for _, query in results])
+    if op is sre_constants.SUBPATTERN:
+        _, add_flags, del_flags, items = av
+        if add_flags & sre_constants.SRE_FLAG_IGNORECASE:
+            ignore_case = True
+        if del_flags & sre_constants.SRE_FLAG_IGNORECASE:
+            ignore_case = False
+        return _analyze_sequence(items, ignore_case)
+    if op in (
+        sre_constants.MAX_REPEAT,
+        sre_constants.MIN_REPEAT,
+        getattr(sre_constants, "POSSESSIVE_REPEAT", None),
+    ):
+        low, high, items = av
+        if low == 0:
+            return None, None
+        inner_exact, inner_query = _analyze_sequence(items, ignore_case)
+        if low == high == 1:
+            return inner_exact, inner_query
+        return None, inner_query
+    if op is getattr(sre_constants, "ATOMIC_GROUP", None):
+        return _analyze_sequence(av, ignore_case)
+    if op is sre_constants.AT:
+        # Anchors match the empty string.
+        return {b""}, None
+    return None, None
+
+
+def regex_query(pattern):
+    """
+    Return the trigram query every match of ``pattern`` satisfies, or
+    ``None`` when it requires no trigram. Raises ``re.error`` for an
+    invalid pattern.
+    """
+    parsed = sre_parse.parse(pattern)
+    flags = parsed.state.flags
+    ignore_case = bool(flags & re.IGNORECASE) and not flags & re.ASCII
+    return _analyze_sequence(list(parsed), ignore_case)[1]
+
+
+class TrigramIndex(IndexDirectory):
+    """
+    A trigram index stored in ``path``.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding the manifest and segments.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.segments = []
+
+    @property
+    def doc_count(self):
+        if not self.manifest:
+            return 0
+        return sum(docs for _, docs in self.manifest["segments"])
+
+    def _open(self, manifest):
+        self.segments = [
+            self._open_segment(name) for name, _ in manifest["segments"]
+        ]
+
+    def _reset(self):
+        self.segments = []
+
+    def _files(self, manifest):
+        return [name for name, _ in manifest["segments"]]
+
+    def candidates(self, pattern):
+        """
+        Return the sorted ids of the indexed entries that may match
+        ``pattern``, or ``None`` when the pattern cannot be narrowed down by
+        trigrams. Raises ``re.error`` for an invalid pattern.
+        """
+        query = regex_query(pattern)
+        if query is None:
+            return None
+        segments = self.segments
+        found = [self._evaluate(segment, query) for segment in segments]
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        # Segments cover ascending id ranges.
+        return np.concatenate(found)
+
+    def _evaluate(self, segment, query):
+        if isinstance(query, int):
+            return self._postings(segment, query)
+        op, parts = query
+        if op == "or":
+            return np.unique(
+                np.concatenate([self._evaluate(segment, p) for p in parts])
+            )
+        # Intersect the shortest posting lists first.
+        parts = sorted(parts, key=lambda p: self._cost(segment, p))
+        ids = self._evaluate(segment, parts[0])
+        for part in parts[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(
+                ids, self._evaluate(segment, part), assume_unique=True
+            )
+        return ids
+
+    def _cost(self, segment, query):
+        if not isinstance(query, int):
+            return 0 if query[0] == "and" else float("inf")
+        start, end = self._span(segment, query)
+        return end - start
+
+    def _span(self, segment, key):
+        keys = segment["keys"]
+        i = np.searchsorted(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return 0, 0
+        return segment["offsets"][i], segment["offsets"][i + 1]
+
+    def _postings(self, segment, key):
+        start, end = self._span(segment, key)
+        return np.cumsum(varint_decode(segment["postings"][start:end]))
+
+    def rebuild(self, chunk_size=None, segment_size=DEFAULT_SEGMENT_SIZE):
+        """
+        Reindex every log entry. Returns the number of indexed entries.
+        """
+        with self.lock():
+            return self._rebuild(chunk_size, segment_size)
+
+    def update(self, chunk_size=None, segment_size=DEFAULT_SEGMENT_SIZE):
+        """
+        Index the entries added since the last update. Builds the index
+        from scratch when there is none or the table was recreated. Returns
+        the number of newly indexed entries.
+        """
+        newest = newest_entry_id() or 0
+        if self.load() and newest == self.last_id:
+            return 0
+        with self.lock():
+            if not self.load() or newest < self.last_id:
+                return self._rebuild(chunk_size, segment_size)
+            if newest == self.last_id:
+                return 0
+            new, count = self._write_segments(
+                self.last_id, newest, chunk_size, segment_size
+            )
+            segments = self.manifest["segments"] + new
+            while len(segments) > MAX_SEGMENTS:
+                segments = self._merge_smallest(segments)
+            self._save_manifest({"segments": segments, "last_id": newest})
+            return count
+
+    def _rebuild(self, chunk_size, segment_size):
+        newest = newest_entry_id() or 0
+        segments, count = self._write_segments(
+            0, newest, chunk_size, segment_size
+        )
+        self._save_manifest({"segments": segments, "last_id": newest})
+        return count
+
+    def _write_segments(self, after_id, until_id, chunk_size, segment_size):
+        """
+        Index the entries with ``after_id < id <= until_id`` into segments
+        of at most ``segment_size`` entries. Returns the ``[name, docs]``
+        pairs of the new segments and the number of entries.
+        """
+        segments = []
+        keys, ids = [], []
+        docs = count = 0
+        for chunk in iter_messages(after_id, until_id, chunk_size or 10_000):
+            for entry_id, message in chunk:
+                trigrams = trigram_keys(fold(message or ""))
+                keys.append(trigrams)
+                ids.append(np.full(len(trigrams), entry_id, dtype=np.int64))
+                docs += 1
+                if docs == segment_size:
+                    segments.append([self._save_segment(keys, ids), docs])
+                    keys, ids = [], []
+                    count += docs
+                    docs = 0
+        if docs:
+            segments.append([self._save_segment(keys, ids), docs])
+            count += docs
+        return segments, count
+
+    def _save_segment(self, keys, ids):
+        """
+        Write the ``(trigram, id)`` pairs of ``keys`` and ``ids`` (lists of
+        arrays in ascending id order) as a segment and return its name.
+        """
+        keys = np.concatenate(keys) if keys else np.zeros(0, np.uint32)
+        ids = np.concatenate(ids) if ids else np.zeros(0, np.int64)
+        # A stable sort keeps the ids of every trigram ascending.
+        order = np.argsort(keys, kind="stable")
+        keys, ids = keys[order], ids[order]
+        unique, starts = np.unique(keys, return_index=True)
+        deltas = np.diff(ids, prepend=0)
+        deltas[starts] = ids[starts]
+        postings, lengths = varint_encode(deltas)
+        byte_ends = np.cumsum(lengths)
+        offsets = (
+            np.concatenate(
+                ([0], byte_ends[np.append(starts[1:], len(ids)) - 1])
+            )
+            if len(ids)
+            else np.zeros(1, dtype=np.int64)
+        )
+
+        name = self._new_name("segment")
+        path = self._staging(name)
+        np.save(os.path.join(path, "keys.npy"), unique.astype(np.uint32))
+        np.save(os.path.join(path, "offsets.npy"), offsets.astype(np.int64))
+        np.save(os.path.join(path, "postings.npy"), postings)
+        self._publish(path, name)
+        return name
+
+    def _merge_smallest(self, segments):
+        """
+        Merge the two adjacent segments with the fewest entries.
+        """
+        i = min(
+            range(len(segments) - 1),
+            key=lambda i: segments[i][1] + segments[i + 1][1],
+        )
+        keys, ids = [], []
+        for name, _ in segments[i : i + 2]:
+            segment_keys, segment_ids = self._decode_segment(name)
+            keys.append(segment_keys)
+            ids.append(segment_ids)
+        # Every id of the first segment is below those of the second, so
+        # concatenating and sorting stably by trigram keeps ids ascending.
+        merged = [
+            self._save_segment(keys, ids),
+            segments[i][1] + segments[i + 1][1],
+        ]
+        return segments[:i] + [merged] + segments[i + 2 :]
+
+    def _decode_segment(self, name):
+        """
+        Return the ``(trigram, id)`` pairs of a segment as two arrays,
+        sorted by trigram and then id.
+        """
+        segment = self._open_segment(name)
+        postings = np.asarray(segment["postings"])
+        offsets = np.asarray(segment["offsets"])
+        deltas = varint_decode(postings)
+        # Values per trigram: the varint ends inside its byte range.
+        ends = np.flatnonzero(postings < 0x80)
+        counts = np.searchsorted(ends, offsets[1:]) - np.searchsorted(
+            ends, offsets[:-1]
+        )
+        keys = np.repeat(np.asarray(segment["keys"]), counts)
+        starts = np.cumsum(counts) - counts
+        totals = np.cumsum(deltas)
+        bases = np.repeat(totals[starts] - deltas[starts], counts)
+        return keys, totals - bases
+
+    def _open_segment(self, name):
+        return {
+            array: np.load(
+                os.path.join(self.path, name, f"{array}.npy"), mmap_mode="r"
+            )
+            for array in SEGMENT_ARRAYS
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_trigram_index(path=None):
+    """
+    Return the process-wide ``TrigramIndex`` for ``path`` (default
+    ``settings.LOGFLOW_TRIGRAM_INDEX_DIR``), loaded from disk if it exists.
+    """
+    path = str(path or default_trigram_dir())
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = TrigramIndex(path)
+    index.load()
+    return index
@@ -6,6 +6,26 @@ urlpatterns = [
     path("dashboard/", views.dashboard, name="logflow_dashboard"),
     path("update_chart/", views.update_chart, name="update_chart"),
     path("import_logs/", views.import_logs, name="logflow_import"),
+    path("ingest/", views.ingest, name="logflow_ingest"),
+    path(
+        "logs/<int:log_id>/similar/",
+        views.similar,
+        name="logflow_similar",
+    ),
+    path(
+        "blocks/<str:block_id>/",
+        views.block_trace,
+        name="logflow_block_trace",
+    ),
+    path(
+        "api/timeseries/",
+        views.timeseries_api,
+        name="logflow_timeseries",
+    ),
+    path("api/top/", views.top_api, name="logflow_top"),
+    path("api/distinct/", views.distinct_api, name="logflow_distinct"),
+    path("api/anomalies/", views.anomalies_api, name="logflow_anomalies"),
+    path("cache_stats/", views.cache_stats, name="logflow_cache_stats"),
     path("send_email/", views.send_email, name="logflow_send_email"),
     path(
         "run_orchestrator/",
@@ -1,20 +1,47 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from dateutil import parser
 from datetime import timedelta
 import json
+import zlib
 import pytz
+from django.conf import settings
 from django.core.management import call_command
+from .anomalies import DROP, SPIKE, recent_anomalies
+from .http_ingest import (
+    DEFAULT_INGEST_RETRY_AFTER,
+    MAX_REPORTED_ERRORS,
+    ingest_ndjson,
+    open_request_stream,
+    parse_record_timestamp,
+    writer_queue,
+)
+from .identifiers import identifier_trace, normalize_block_id
 from .models import LogEntry
-from .parse_database import filter_logs, get_logs_by_hour, get_unique_services
+from .parse_database import (
+    DEFAULT_PAGE_SIZE,
+    DEFAULT_SIMILAR_LIMIT,
+    DEFAULT_SIMILAR_WINDOW,
+    MAX_PAGE_SIZE,
+    SEARCH_MODES,
+    get_unique_services,
+    group_by_date,
+    hourly_log_counts,
+    search_page,
+    similar_page,
+)
+from .query_cache import get_query_cache
+from .sketches import distinct_count, top_values
+from .timeseries import parse_group_by, parse_width, timeseries
 
 
 @csrf_exempt
 def import_logs(request):
     """
     Trigger the import_logs management command to load log data from CSV.
+    Lines imported by a previous run are skipped.
     """
     if request.method == "POST":
         try:
@@ -27,6 +54,62 @@ def import_logs(request):
     )
 
 
+@csrf_exempt
+def ingest(request):
+    """
+    Accept log records pushed as NDJSON (one JSON object per line),
+    optionally gzip-encoded, and store them in batches.
+
+    The body is parsed incrementally from the request stream. The response
+    lists the accepted, duplicate and rejected record counts of every batch.
+    When too many requests are already waiting for the database writer, the
+    request is refused with 429 and a Retry-After header.
+    """
+    if request.method != "POST":
+        return JsonResponse(
+            {"status": "error", "message": "POST request required."},
+            status=400,
+        )
+    if not writer_queue.try_enter():
+        response = JsonResponse(
+            {"status": "error", "message": "Ingest queue is full."},
+            status=429,
+        )
+        response["Retry-After"] = str(
+            getattr(
+                settings,
+                "LOGFLOW_INGEST_RETRY_AFTER",
+                DEFAULT_INGEST_RETRY_AFTER,
+            )
+        )
+        return response
+
+    batches = []
+    try:
+        stream = open_request_stream(request)
+        for batch in ingest_ndjson(stream):
+            batches.append(batch)
+    except (ValueError, OSError, EOFError, zlib.error) as e:
+        status, message = "error", str(e)
+    else:
+        status, message = "success", None
+    finally:
+        writer_queue.leave()
+
+    errors = [error for batch in batches for error in batch.pop("errors")]
+    data = {
+        "status": status,
+        "accepted": sum(batch["accepted"] for batch in batches),
+        "duplicates": sum(batch["duplicates"] for batch in batches),
+        "rejected": sum(batch["rejected"] for batch in batches),
+        "batches": batches,
+        "errors": errors[:MAX_REPORTED_ERRORS],
+    }
+    if message is not None:
+        data["message"] = message
+    return JsonResponse(data, status=200 if status == "success" else 400)
+
+
 @csrf_exempt
 def send_email(request):
     """
@@ -62,14 +145,23 @@ def run_orchestrator(request):
 def home(request):
     """
     Render the home page with filters to search and display log entries.
+
+    Entries are shown one page at a time in timestamp order; the ``cursor``
+    parameter continues after the previous page and ``page_size`` sets its
+    length. With ``format=json`` the page is returned as JSON for infinite
+    scrolling.
     """
     query = request.GET.get("query", "")
     level = request.GET.get("level", None)
     service = request.GET.get("service", None)
+    regex = request.GET.get("regex", "")
+    mode = request.GET.get("mode", "rows")
+    if mode not in SEARCH_MODES:
+        mode = "rows"
 
     # Default date range: past  days
     today = timezone.now().date()
-    default_start = (today - timedelta(days=7, weeks=52*25)).isoformat()
+    default_start = (today - timedelta(days=7, weeks=52 * 25)).isoformat()
     default_end = today.isoformat()
 
     start_date = request.GET.get("start_date", default_start)
@@ -78,31 +170,55 @@ def home(request):
     start_date_obj = parser.parse(start_date).date()
     end_date_obj = parser.parse(end_date).date()
 
-    logs = filter_logs(
-        query=query,
-        level=level,
-        service=service,
-        start_date=start_date_obj,
-        end_date=end_date_obj,
-    )
+    try:
+        page_size = int(request.GET.get("page_size", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    page_size = min(max(page_size, 1), MAX_PAGE_SIZE)
+    try:
+        page, next_cursor = search_page(
+            query=query,
+            level=level,
+            service=service,
+            start_date=start_date_obj,
+            end_date=end_date_obj,
+            mode=mode,
+            cursor=request.GET.get("cursor"),
+            page_size=page_size,
+            regex=regex,
+        )
+    except ValueError as e:
+        if request.GET.get("format") == "json":
+            return JsonResponse(
+                {"status": "error", "message": str(e)}, status=400
+            )
+        return HttpResponseBadRequest(str(e))
 
-    # Group logs by date
-    logs_by_date = {}
-    for log in logs:
-        # Only include logs with a valid timestamp
-        if log.timestamp:
-            log_date = log.timestamp.astimezone(pytz.UTC).date()
-            logs_by_date.setdefault(log_date, []).append(log)
+    next_url = None
+    if next_cursor is not None:
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        next_url = f"?{params.urlencode()}"
 
-    # Sort each group by timestamp
-    for date_key in logs_by_date:
-        logs_by_date[date_key].sort(key=lambda x: x.timestamp)
+    if request.GET.get("format") == "json":
+        return JsonResponse(
+            {
+                "status": "success",
+                "logs": [log_to_dict(log) for log in page],
+                "next_cursor": next_cursor,
+                "next_url": next_url,
+            }
+        )
 
+    # Group the current page by date
     context = {
-        "logs_by_date": logs_by_date,
+        "logs_by_date": group_by_date(page),
+        "next_url": next_url,
         "query": query,
+        "regex": regex,
         "level": level,
         "service": service,
+        "mode": mode,
         "start_date": start_date_obj.isoformat(),
         "end_date": end_date_obj.isoformat(),
         "unique_services": get_unique_services(),
@@ -110,15 +226,106 @@ def home(request):
     return render(request, "logapp/home.html", context)
 
 
+def similar(request, log_id):
+    """
+    Return the entries most similar to the log entry ``log_id`` as JSON.
+
+    ``window`` limits them to that many seconds around the entry's timestamp
+    (default one day, ``0`` for no limit) and ``service`` to a service, by
+    default the entry's own; pass an empty ``service`` to search all of them.
+    ``limit`` sets how many entries are returned (default 50, at most 1000).
+    """
+    entry = LogEntry.objects.filter(id=log_id).first()
+    if entry is None:
+        return JsonResponse(
+            {"status": "error", "message": f"No log entry {log_id}."},
+            status=404,
+        )
+    try:
+        window = int(request.GET.get("window", DEFAULT_SIMILAR_WINDOW))
+        limit = int(request.GET.get("limit", DEFAULT_SIMILAR_LIMIT))
+    except ValueError:
+        return JsonResponse(
+            {
+                "status": "error",
+                "message": "window and limit must be integers.",
+            },
+            status=400,
+        )
+    window = max(window, 0)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    service = request.GET.get("service", entry.service)
+
+    mode, logs = similar_page(
+        entry, window=window or None, service=service, limit=limit
+    )
+    return JsonResponse(
+        {
+            "status": "success",
+            "entry": log_to_dict(entry),
+            "mode": mode,
+            "logs": [log_to_dict(log) for log in logs],
+        }
+    )
+
+
+def block_trace(request, block_id):
+    """
+    Return every entry mentioning the HDFS block ``block_id`` (with or
+    without its ``blk_`` prefix) as JSON, in ``(timestamp, id)`` order,
+    looked up in the identifier index (see ``logapp.identifiers``).
+    """
+    block_id = normalize_block_id(block_id)
+    logs = get_query_cache().get_or_compute(
+        "block_trace",
+        {"block": block_id},
+        lambda: [
+            log_to_dict(log) for log in identifier_trace("block", block_id)
+        ],
+    )
+    if not logs:
+        return JsonResponse(
+            {"status": "error", "message": f"No log entry for {block_id}."},
+            status=404,
+        )
+    return JsonResponse(
+        {
+            "status": "success",
+            "block": block_id,
+            "count": len(logs),
+            "logs": logs,
+        }
+    )
+
+
+def log_to_dict(log):
+    """
+    Serialize a log entry for the JSON variant of the home page.
+    """
+    data = {
+        "id": log.id,
+        "timestamp": log.timestamp.isoformat() if log.timestamp else None,
+        "date": (
+            log.timestamp.astimezone(pytz.UTC).date().isoformat()
+            if log.timestamp
+            else None
+        ),
+        "level": log.level,
+        "message": log.message,
+        "service": log.service,
+        "host": log.host,
+    }
+    if hasattr(log, "similarity"):
+        data["similarity"] = log.similarity
+    return data
+
+
 def dashboard(request):
     """
     Render a dashboard view with log insights such as logs per hour.
     """
-    tz = pytz.timezone("UTC")
-    logs = LogEntry.objects.all()
-
     context = {
-        "logs_by_hour": get_logs_by_hour(logs, tz),
+        "logs_by_hour": hourly_log_counts(),
     }
     return render(request, "logapp/dashboard.html", context)
 
@@ -133,13 +340,155 @@ def update_chart(request):
         min_hour = data.get("min_hour", 0)
         max_hour = data.get("max_hour", 23)
 
-        tz = pytz.timezone("UTC")
-        logs = LogEntry.objects.all().exclude(timestamp__isnull=True)
-        filtered_logs = logs.filter(
-            timestamp__hour__gte=min_hour, timestamp__hour__lte=max_hour
-        )
-        logs_by_hour = get_logs_by_hour(filtered_logs, tz)
+        logs_by_hour = hourly_log_counts(min_hour, max_hour)
 
-        return JsonResponse({"logs_by_hour": list(logs_by_hour)})
+        return JsonResponse({"logs_by_hour": logs_by_hour})
 
     return JsonResponse({"error": "Invalid request method"}, status=400)
+
+
+def timeseries_api(request):
+    """
+    Return log counts over time as JSON columnar arrays (see
+    ``logapp.timeseries.timeseries``).
+
+    ``start`` and ``end`` are ISO 8601 datetimes or Unix seconds (default:
+    the last day), ``width`` the bucket width from ``1s`` to ``1d`` (default
+    ``1h``), ``group_by`` a comma-separated list of ``service``, ``level``
+    and ``event``, and ``max_points`` the most points returned per series.
+    """
+    try:
+        start, end = time_range_params(request)
+        width = parse_width(request.GET.get("width", "1h"))
+        group_by = parse_group_by(request.GET.get("group_by"))
+        max_points = request.GET.get("max_points")
+        max_points = int(max_points) if max_points else None
+        params = {
+            "start": start.timestamp(),
+            "end": end.timestamp(),
+            "width": width,
+            "group_by": tuple(group_by),
+            "max_points": max_points,
+        }
+        data = get_query_cache().get_or_compute(
+            "timeseries",
+            params,
+            lambda: timeseries(start, end, width, group_by, max_points),
+        )
+    except (ValueError, OverflowError) as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return JsonResponse({"status": "success", **data})
+
+
+def top_api(request):
+    """
+    Return the most frequent values of a field as JSON, merged from the
+    Space-Saving sketches (see ``logapp.sketches.top_values``).
+
+    ``field`` is ``template``, ``host`` or ``block`` (default ``template``),
+    ``n`` the number of values (1 to 100, default 20), and ``start`` and
+    ``end`` ISO 8601 datetimes or Unix seconds (default: the last day).
+    """
+    try:
+        start, end = time_range_params(request)
+        field = request.GET.get("field", "template")
+        n = min(max(int(request.GET.get("n", 20)), 1), 100)
+        params = {
+            "field": field,
+            "start": start.timestamp(),
+            "end": end.timestamp(),
+            "n": n,
+        }
+        data = get_query_cache().get_or_compute(
+            "top_values", params, lambda: top_values(field, start, end, n)
+        )
+    except (ValueError, OverflowError) as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return JsonResponse({"status": "success", **data})
+
+
+def distinct_api(request):
+    """
+    Return the estimated number of distinct values of a field as JSON,
+    merged from the HyperLogLog sketches (see
+    ``logapp.sketches.distinct_count``).
+
+    ``field`` is ``host`` or ``block`` (default ``host``), ``errors`` set to
+    ``1`` counts only the entries with an error level, and ``start`` and
+    ``end`` are ISO 8601 datetimes or Unix seconds (default: the last day).
+    """
+    try:
+        start, end = time_range_params(request)
+        field = request.GET.get("field", "host")
+        errors = request.GET.get("errors", "").lower() in ("1", "true", "yes")
+        params = {
+            "field": field,
+            "start": start.timestamp(),
+            "end": end.timestamp(),
+            "errors": errors,
+        }
+        data = get_query_cache().get_or_compute(
+            "distinct_count",
+            params,
+            lambda: distinct_count(field, start, end, errors),
+        )
+    except (ValueError, OverflowError) as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return JsonResponse({"status": "success", **data})
+
+
+def anomalies_api(request):
+    """
+    Return the rate anomalies flagged at ingest as JSON, newest first (see
+    ``logapp.anomalies``).
+
+    ``start`` and ``end`` are ISO 8601 datetimes or Unix seconds (default:
+    the last day), ``kind`` restricts them to ``spike`` or ``drop``,
+    ``service`` to one service, and ``limit`` is the most returned (1 to
+    ``MAX_PAGE_SIZE``, default 100).
+    """
+    try:
+        start, end = time_range_params(request)
+        kind = request.GET.get("kind") or None
+        if kind not in (None, SPIKE, DROP):
+            raise ValueError(f"Unknown anomaly kind {kind!r}.")
+        limit = min(max(int(request.GET.get("limit", 100)), 1), MAX_PAGE_SIZE)
+    except (ValueError, OverflowError) as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    anomalies = recent_anomalies(
+        start, end, kind, request.GET.get("service"), limit
+    )
+    return JsonResponse({"status": "success", "anomalies": anomalies})
+
+
+def time_range_params(request):
+    """
+    Parse the ``start`` and ``end`` query parameters, defaulting to the last
+    day.
+    """
+    end = request.GET.get("end")
+    end = parse_timestamp_param(end) if end else timezone.now()
+    start = request.GET.get("start")
+    start = parse_timestamp_param(start) if start else end - timedelta(days=1)
+    return start, end
+
+
+def parse_timestamp_param(value):
+    """
+    Parse a query string timestamp: Unix seconds or ISO 8601, naive values
+    in UTC.
+    """
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return parse_record_timestamp(value)
+
+
+def cache_stats(request):
+    """
+    Report the hit/miss statistics of the query cache as JSON.
+    """
+    return JsonResponse(
+        {"status": "success", "cache": get_query_cache().get_stats()}
+    )
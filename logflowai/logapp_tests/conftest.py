@@ -0,0 +1,35 @@
+import pytest
+from logapp.anomalies import get_detector
+from logapp.query_cache import get_query_cache
+
+
+@pytest.fixture(autouse=True)
+def search_index_dir(settings, tmp_path):
+    # Test databases reuse primary keys, so every test gets its own index.
+    settings.LOGFLOW_INDEX_DIR = tmp_path / "search_index"
+    settings.LOGFLOW_TRIGRAM_INDEX_DIR = tmp_path / "trigram_index"
+    settings.LOGFLOW_SEMANTIC_INDEX_DIR = tmp_path / "semantic_index"
+    return settings.LOGFLOW_INDEX_DIR
+
+
+@pytest.fixture(autouse=True)
+def query_cache(settings, tmp_path):
+    # Tests write rows through the ORM without bumping the data version.
+    settings.CACHES = {
+        **settings.CACHES,
+        "query": {**settings.CACHES["query"], "LOCATION": tmp_path / "cache"},
+    }
+    query_cache = get_query_cache()
+    query_cache.clear()
+    query_cache.cache.clear()
+    yield query_cache
+    query_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def anomaly_detector():
+    # Baselines are process-wide and would carry over between tests.
+    detector = get_detector()
+    detector.reset()
+    yield detector
+    detector.reset()
@@ -1,17 +1,28 @@
+import importlib
 import pytest
 import json
 from datetime import timedelta
+from types import SimpleNamespace
 import pytz
+from django.apps import apps as django_apps
+from django.db import connection
+from django.urls import reverse
 from django.utils import timezone
-from django.db.models import QuerySet
-from logapp.models import LogEntry
+from django.db.models import Q, QuerySet
+from logapp.ingest import insert_entries
+from logapp.models import LogEntry, LogTemplate
 from logapp.parse_database import (
+    decode_cursor,
+    encode_cursor,
     filter_logs,
+    group_by_date,
+    paginate_logs,
     preprocess_text,
     compute_similarity_scores,
     get_logs_by_hour,
     get_unique_services,
 )
+from logapp.search_index import get_search_index
 
 # ---------------------------------
 # Tests for preprocess_text and compute_similarity_scores
@@ -160,6 +171,310 @@ def test_filter_logs_similarity(log_factory):
     assert all("timeout" not in msg.lower() for msg in messages)
 
 
+@pytest.mark.django_db
+def test_filter_logs_ranks_100k_matches():
+    now = timezone.now()
+    insert_entries(
+        [
+            {
+                "timestamp": now,
+                "level": "ERROR" if index % 2 else "INFO",
+                "message": (
+                    "disk failure on node"
+                    if index % 4
+                    else "disk quota reached on node"
+                ),
+                "host": f"node-{index}",
+            }
+            for index in range(120_000)
+        ]
+    )
+    get_search_index().update()
+    qs = filter_logs(query="disk failure", similarity_threshold=0.1)
+    assert qs.count() == 120_000
+    top = list(qs[:5])
+    assert {log.similarity for log in top} == {1.0}
+    assert "failure" in top[0].message
+    assert 0.1 <= qs.last().similarity < 1.0
+    assert filter_logs(query="disk failure", level="INFO").count() == 60_000
+    # The scores are joined from a table; the SQL does not grow with them.
+    assert len(str(qs.query)) < 2000
+
+
+@pytest.mark.django_db
+def test_filter_logs_case_insensitive(log_factory):
+    log_factory(level="Info", service="AService", message="Alpha event")
+    log_factory(level="ERROR", service="aservice", message="Beta event")
+
+    assert filter_logs(level="INFO").get().message == "Alpha event"
+    assert filter_logs(service="ASERVICE").count() == 2
+
+
+@pytest.mark.django_db
+def test_filter_logs_date_range_bounds(log_factory):
+    day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    log_factory(timestamp=day - timedelta(microseconds=1), message="Before")
+    log_factory(timestamp=day, message="Start")
+    log_factory(
+        timestamp=day + timedelta(days=1, microseconds=-1), message="End"
+    )
+    log_factory(timestamp=day + timedelta(days=1), message="After")
+
+    qs = filter_logs(start_date=day.date(), end_date=day.date())
+    assert sorted(log.message for log in qs) == ["End", "Start"]
+
+
+@pytest.mark.django_db
+def test_filter_logs_uses_indexes():
+    qs = filter_logs(
+        level="INFO",
+        service="AService",
+        start_date=timezone.now().date(),
+        end_date=timezone.now().date(),
+    )
+    assert "logentry_service_level_ts" in qs.explain()
+    qs = filter_logs(
+        start_date=timezone.now().date(), end_date=timezone.now().date()
+    )
+    assert "logentry_timestamp" in qs.explain()
+
+
+# ---------------------------------
+# Tests for the derived LogEntry columns
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_log_entry_normalized_on_save(log_factory):
+    log = log_factory(
+        level="WARN",
+        service="dfs.DataNode",
+        additional_data={"EventId": "E5", "LineId": "12"},
+    )
+    log.refresh_from_db()
+    assert (log.level_norm, log.service_norm) == ("warn", "dfs.datanode")
+    assert (log.event_id, log.line_id) == ("E5", 12)
+
+
+@pytest.mark.django_db
+def test_promoted_columns_backfill(log_factory):
+    migration = importlib.import_module(
+        "logapp.migrations.0008_promoted_filter_columns"
+    )
+    for index in range(3):
+        log_factory(level="INFO", additional_data={"EventId": f"E{index}"})
+    LogEntry.objects.update(level_norm=None, event_id=None)
+
+    migration.BACKFILL_BATCH_SIZE = 2
+    migration.backfill_derived_columns(
+        django_apps, SimpleNamespace(connection=connection)
+    )
+    assert set(LogEntry.objects.values_list("level_norm", flat=True)) == {
+        "info"
+    }
+    assert sorted(LogEntry.objects.values_list("event_id", flat=True)) == [
+        "E0",
+        "E1",
+        "E2",
+    ]
+
+
+@pytest.mark.django_db
+def test_templates_backfill(log_factory):
+    migration = importlib.import_module("logapp.migrations.0010_log_templates")
+    log_factory(additional_data={"EventId": "E1", "EventTemplate": "old <*>"})
+    log_factory(additional_data={"EventId": "E1", "EventTemplate": "new <*>"})
+    log_factory(additional_data={"EventId": "E2", "EventTemplate": "two"})
+    log_factory(additional_data={"EventId": "E3"})
+    log_factory()
+
+    migration.BACKFILL_BATCH_SIZE = 1
+    migration.backfill_templates(
+        django_apps, SimpleNamespace(connection=connection)
+    )
+    assert dict(LogTemplate.objects.values_list("event_id", "template")) == {
+        "E1": "new <*>",
+        "E2": "two",
+    }
+
+
+# ---------------------------------
+# Tests for template search
+# ---------------------------------
+
+
+@pytest.fixture
+def templated_logs(db):
+    templates = {
+        "E1": "Receiving block <*> src: /<*> dest: /<*>",
+        "E2": "PacketResponder <*> for block <*> terminating",
+        "E3": "Deleting block <*> file <*>",
+    }
+    fields = [
+        {
+            "timestamp": timezone.now() + timedelta(seconds=index),
+            "message": templates[event_id]
+            .replace("<*>", f"blk_{index}", 1)
+            .replace("<*>", str(index)),
+            "additional_data": {
+                "EventId": event_id,
+                "EventTemplate": templates[event_id],
+            },
+        }
+        for index, event_id in enumerate(["E1", "E2", "E3"] * 4)
+    ]
+    insert_entries(fields)
+    return templates
+
+
+def test_insert_entries_upserts_templates(templated_logs):
+    assert dict(LogTemplate.objects.values_list("event_id", "template")) == (
+        templated_logs
+    )
+    insert_entries(
+        [
+            {
+                "timestamp": timezone.now(),
+                "message": "Deleting block blk_1 file /tmp/x",
+                "additional_data": {
+                    "EventId": "E3",
+                    "EventTemplate": "Deleting block <*> file <*> now",
+                },
+            }
+        ]
+    )
+    assert LogTemplate.objects.count() == 3
+    assert LogTemplate.objects.get(event_id="E3").template.endswith("now")
+
+
+def test_filter_logs_template_mode(templated_logs):
+    qs = filter_logs(query="packetresponder terminating", mode="templates")
+    logs = list(qs)
+    assert {log.event_id for log in logs} == {"E2"}
+    assert len(logs) == 4
+    # Every row of a template shares its score; exact matches score 1.0.
+    assert {log.similarity for log in logs} == {1.0}
+
+    qs = filter_logs(query="receiving", mode="templates", level="INFO")
+    assert list(qs) == []
+
+    qs = filter_logs(
+        query="receiving block", mode="templates", similarity_threshold=0.1
+    )
+    scores = {}
+    for log in qs:
+        scores.setdefault(log.event_id, set()).add(log.similarity)
+    assert scores["E1"] == {1.0}
+    assert len(scores["E2"]) == 1 and 0.1 <= scores["E2"].pop() < 1.0
+    similarities = [log.similarity for log in qs]
+    assert similarities == sorted(similarities, reverse=True)
+
+
+def test_filter_logs_template_mode_uses_event_id_index(templated_logs):
+    qs = filter_logs(query="packetresponder", mode="templates")
+    assert "event_id" in qs.explain()
+
+
+def test_filter_logs_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        filter_logs(query="x", mode="fuzzy")
+
+
+# ---------------------------------
+# Tests for paginate_logs and the home page
+# ---------------------------------
+
+
+@pytest.fixture
+def paged_logs(log_factory):
+    base = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+    # Pairs of entries share a timestamp, so pages must split ties by id.
+    return [
+        log_factory(
+            timestamp=base - timedelta(days=1) + timedelta(hours=i // 2),
+            message=f"Paged event {i}",
+        )
+        for i in range(7)
+    ]
+
+
+def test_paginate_logs_walks_every_entry_once(paged_logs):
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = paginate_logs(LogEntry.objects.all(), cursor, 2)
+        assert len(page) <= 2
+        seen.extend(log.id for log in page)
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == [log.id for log in paged_logs]
+    assert pages == 4
+
+
+def test_paginate_logs_skips_entries_without_timestamp(paged_logs):
+    LogEntry.objects.create(timestamp=None, message="No time")
+    page, cursor = paginate_logs(LogEntry.objects.all(), page_size=10)
+    assert len(page) == 7 and cursor is None
+
+
+def test_paginate_logs_seeks_through_timestamp_index(paged_logs):
+    _, cursor = paginate_logs(LogEntry.objects.all(), page_size=2)
+    timestamp, log_id = decode_cursor(cursor)
+    qs = LogEntry.objects.filter(
+        Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=log_id),
+        timestamp__gte=timestamp,
+        timestamp__isnull=False,
+    ).order_by("timestamp", "id")
+    assert "logentry_timestamp" in qs.explain()
+
+
+def test_cursor_round_trip():
+    timestamp = timezone.now()
+    assert decode_cursor(encode_cursor(timestamp, 42)) == (timestamp, 42)
+    for cursor in ["", "not base64!", encode_cursor(timestamp, 1)[:-3]]:
+        with pytest.raises(ValueError):
+            decode_cursor(cursor)
+
+
+def test_group_by_date_keeps_order(paged_logs):
+    groups = group_by_date(paged_logs)
+    assert [log for logs in groups.values() for log in logs] == paged_logs
+
+
+def test_home_pages_json(client, paged_logs):
+    url = reverse("logflow_home")
+    data = client.get(url, {"format": "json", "page_size": 5}).json()
+    assert data["status"] == "success"
+    assert [log["id"] for log in data["logs"]] == [
+        log.id for log in paged_logs[:5]
+    ]
+    assert data["logs"][0]["message"] == "Paged event 0"
+    rest = client.get(
+        url, {"format": "json", "page_size": 5, "cursor": data["next_cursor"]}
+    ).json()
+    assert [log["id"] for log in rest["logs"]] == [
+        log.id for log in paged_logs[5:]
+    ]
+    assert rest["next_cursor"] is None
+
+
+def test_home_renders_one_page(client, paged_logs):
+    response = client.get(reverse("logflow_home"), {"page_size": 3})
+    assert response.status_code == 200
+    assert sum(map(len, response.context["logs_by_date"].values())) == 3
+    assert "cursor=" in response.context["next_url"]
+    assert b"Load more" in response.content
+
+
+@pytest.mark.django_db
+def test_home_rejects_invalid_cursor(client):
+    url = reverse("logflow_home")
+    assert client.get(url, {"cursor": "bogus"}).status_code == 400
+    response = client.get(url, {"cursor": "bogus", "format": "json"})
+    assert response.status_code == 400
+    assert response.json()["status"] == "error"
+
+
 # ---------------------------------
 # Tests for get_logs_by_hour
 # ---------------------------------
@@ -0,0 +1,146 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from django.urls import reverse
+from logapp.anomalies import DROP, SPIKE, RateDetector
+from logapp.ingest import RowBatch, commit_batches
+from logapp.models import LogAnomaly
+
+START = datetime(2008, 11, 9, 20, 0, tzinfo=pytz.UTC)
+EPOCH = int(START.timestamp())
+
+
+def bucket_fields(minute, count, service="datanode", event_id="E1"):
+    timestamp = START + timedelta(minutes=minute)
+    return [
+        {
+            "timestamp": timestamp,
+            "service_norm": service,
+            "level_norm": "info",
+            "event_id": event_id,
+        }
+    ] * count
+
+
+def steady(detector, minutes, rate=100, seed=0, **key):
+    rng = random.Random(seed)
+    anomalies = []
+    for minute in range(minutes):
+        count = rate + rng.randint(-rate // 10, rate // 10)
+        anomalies += detector.observe(bucket_fields(minute, count, **key))
+    return anomalies
+
+
+# ---------------------------------
+# Tests for the detector
+# ---------------------------------
+
+
+def test_spike_flagged_within_one_bucket():
+    detector = RateDetector(warmup=10)
+    assert steady(detector, 40) == []
+    assert detector.observe(bucket_fields(40, 500)) == []
+    # The spike is judged as soon as the next bucket starts.
+    [anomaly] = detector.observe(bucket_fields(41, 100))
+    assert anomaly.kind == SPIKE
+    assert anomaly.bucket == EPOCH + 40 * 60 and anomaly.interval == 60
+    assert (anomaly.service, anomaly.level, anomaly.event_id) == (
+        "datanode",
+        "info",
+        "E1",
+    )
+    assert anomaly.count == 500 and 90 < anomaly.expected < 110
+    assert anomaly.score > 4
+
+
+def test_ongoing_spike_recorded_once():
+    detector = RateDetector(warmup=10)
+    steady(detector, 40)
+    anomalies = []
+    for minute in range(40, 43):
+        anomalies += detector.observe(bucket_fields(minute, 500))
+    anomalies += detector.observe(bucket_fields(43, 100))
+    assert [anomaly.kind for anomaly in anomalies] == [SPIKE]
+
+
+def test_silent_key_flagged_as_drop():
+    detector = RateDetector(warmup=10)
+    for minute in range(40):
+        detector.observe(
+            bucket_fields(minute, 100) + bucket_fields(minute, 3, "namenode")
+        )
+    # datanode falls silent: the namenode entries of the next bucket close
+    # its empty bucket.
+    assert detector.observe(bucket_fields(40, 3, "namenode")) == []
+    [anomaly] = detector.observe(bucket_fields(41, 3, "namenode"))
+    assert anomaly.kind == DROP and anomaly.service == "datanode"
+    assert anomaly.count == 0 and anomaly.score < -4
+
+
+def test_no_flags_before_warmup_or_for_rare_events():
+    detector = RateDetector(warmup=30)
+    steady(detector, 5)
+    assert detector.observe(bucket_fields(5, 1000)) == []
+    assert detector.observe(bucket_fields(6, 100)) == []
+
+    detector = RateDetector(warmup=10)
+    anomalies = []
+    for minute in range(0, 200, 7):
+        anomalies += detector.observe(bucket_fields(minute, 1))
+    assert anomalies == []
+    with pytest.raises(ValueError):
+        RateDetector(interval=7)
+
+
+# ---------------------------------
+# Tests for detection at ingest
+# ---------------------------------
+
+
+def entry_fields(minute, service="DataNode"):
+    return {
+        "timestamp": START + timedelta(minutes=minute),
+        "level": "INFO",
+        "message": "PacketResponder 1 terminating",
+        "service": service,
+        "additional_data": {"EventId": "E10"},
+    }
+
+
+@pytest.mark.django_db
+def test_imports_record_anomalies(
+    client, settings, django_capture_on_commit_callbacks
+):
+    settings.LOGFLOW_ANOMALY_WARMUP = 10
+    for minute in range(20):
+        with django_capture_on_commit_callbacks(execute=True):
+            commit_batches([RowBatch(fields=[entry_fields(minute)] * 50)])
+    for minute, count in ((20, 300), (21, 50)):
+        with django_capture_on_commit_callbacks(execute=True):
+            commit_batches([RowBatch(fields=[entry_fields(minute)] * count)])
+    [anomaly] = LogAnomaly.objects.all()
+    assert anomaly.kind == SPIKE and anomaly.event_id == "E10"
+
+    params = {"start": str(EPOCH), "end": str(EPOCH + 3600)}
+    url = reverse("logflow_anomalies")
+    data = client.get(url, params).json()
+    assert data["status"] == "success"
+    assert [a["bucket"] for a in data["anomalies"]] == [EPOCH + 20 * 60]
+    data = client.get(url, {**params, "kind": DROP}).json()
+    assert data["anomalies"] == []
+    data = client.get(url, {**params, "service": "DataNode"}).json()
+    assert len(data["anomalies"]) == 1
+    assert client.get(url, {"kind": "dip"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_detection_can_be_disabled(
+    settings, django_capture_on_commit_callbacks
+):
+    settings.LOGFLOW_ANOMALY_DETECTION = False
+    settings.LOGFLOW_ANOMALY_WARMUP = 1
+    for minute, count in ((0, 10), (1, 10), (2, 500), (3, 10)):
+        with django_capture_on_commit_callbacks(execute=True):
+            commit_batches([RowBatch(fields=[entry_fields(minute)] * count)])
+    assert not LogAnomaly.objects.exists()
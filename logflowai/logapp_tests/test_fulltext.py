@@ -0,0 +1,152 @@
+import pytest
+from django.db import connection
+from django.utils import timezone
+from logapp.fulltext import (
+    DROP_SQL,
+    build_match_query,
+    fulltext_available,
+    fulltext_filter,
+    STATE_TABLE,
+    restore_fulltext_triggers,
+    sync_fulltext_index,
+)
+from logapp.ingest import insert_entries
+from logapp.models import LogEntry
+from logapp.parse_database import filter_logs
+from logapp.search_index import get_search_index
+
+MESSAGES = [
+    "Receiving block blk_-1608999687919862906 src: /10.250.19.102:54106",
+    "PacketResponder 1 for block blk_38865049064139660 terminating",
+    "Verification succeeded for blk_-1608999687919862906",
+    "Served block blk_38865049064139660 to /10.251.90.64",
+    "PacketResponder 0 for block blk_1 terminating block",
+]
+
+
+@pytest.fixture
+def entries(db):
+    entries = LogEntry.objects.bulk_create(
+        LogEntry(timestamp=timezone.now(), message=message)
+        for message in MESSAGES
+    )
+    get_search_index().update()
+    return entries
+
+
+def matching(query):
+    return [log.message for log in fulltext_filter(LogEntry.objects, query)]
+
+
+# ---------------------------------
+# Tests for build_match_query
+# ---------------------------------
+
+
+def test_build_match_query():
+    assert build_match_query("block terminating") == (
+        '"block" AND "terminating"'
+    )
+    assert build_match_query('"for block" Pack*') == '"for block" AND "Pack"*'
+    assert build_match_query('"packet resp"*') == '"packet resp"*'
+    # FTS5 operators and punctuation are quoted rather than interpreted.
+    assert build_match_query('NEAR(a b) -x "') == (
+        '"NEAR(a" AND "b)" AND "-x"'
+    )
+    assert build_match_query("  -- * ") is None
+    assert build_match_query("") is None
+
+
+# ---------------------------------
+# Tests for the FTS5 table and fulltext_filter
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_fulltext_table_exists():
+    assert fulltext_available(connection)
+
+
+def test_token_phrase_and_prefix_queries(entries):
+    assert set(matching("terminating")) == {MESSAGES[1], MESSAGES[4]}
+    assert set(matching('"block blk_38865049064139660"')) == {
+        MESSAGES[1],
+        MESSAGES[3],
+    }
+    assert matching('"blk_38865049064139660 block"') == []
+    assert set(matching("Packet*")) == {MESSAGES[1], MESSAGES[4]}
+    assert matching("blk_-1608999687919862906 verification") == [MESSAGES[2]]
+    assert matching("PacketResp") == []
+
+
+def test_bm25_ranking(entries):
+    ranked = list(fulltext_filter(LogEntry.objects, "block"))
+    # The entry mentioning "block" twice in few words ranks first.
+    assert ranked[0].message == MESSAGES[4]
+    ranks = [log.rank for log in ranked]
+    assert ranks == sorted(ranks)
+
+
+def test_triggers_keep_index_in_sync(entries):
+    entry = LogEntry.objects.get(message=MESSAGES[2])
+    entry.message = "Verification failed for blk_7"
+    entry.save()
+    assert matching("succeeded") == []
+    assert matching("failed") == ["Verification failed for blk_7"]
+    entry.delete()
+    assert matching("failed") == []
+    assert len(matching("blk*")) == 4
+
+
+def test_restore_dropped_triggers(entries):
+    with connection.cursor() as cursor:
+        for sql in DROP_SQL[:2]:
+            cursor.execute(sql)
+    restore_fulltext_triggers(sender=None, using=connection.alias)
+    LogEntry.objects.filter(message=MESSAGES[2]).delete()
+    assert matching("verification") == []
+
+
+def test_sync_indexes_new_rows_in_bulk(entries):
+    assert sync_fulltext_index(connection) == len(MESSAGES)
+    assert sync_fulltext_index(connection) == 0
+    LogEntry.objects.create(timestamp=timezone.now(), message="new block")
+    # Deleting a row that was never indexed leaves the index intact.
+    LogEntry.objects.create(timestamp=timezone.now(), message="gone").delete()
+    assert "new block" in matching("new")
+    assert matching("gone") == []
+    insert_entries([{"timestamp": timezone.now(), "message": "bulk block"}])
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT last_id FROM {STATE_TABLE}")
+        assert cursor.fetchone()[0] == LogEntry.objects.latest("id").id
+    assert matching("bulk") == ["bulk block"]
+
+    # A watermark above every id means the id sequence was reset.
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {STATE_TABLE} SET last_id = 10000000")
+    assert sync_fulltext_index(connection) == LogEntry.objects.count()
+    assert matching("bulk") == ["bulk block"]
+
+
+# ---------------------------------
+# Tests for filter_logs
+# ---------------------------------
+
+
+def test_filter_logs_fulltext_exact_matches(entries):
+    qs = filter_logs(query="block terminating")
+    logs = list(qs)
+    # Exact matches first, best BM25 rank first, then similar messages.
+    assert {log.message for log in logs[:2]} == {MESSAGES[1], MESSAGES[4]}
+    assert [log.similarity for log in logs[:2]] == [1.0, 1.0]
+    assert logs[0].rank <= logs[1].rank < 0
+    assert len(logs) > 2
+    assert all(log.similarity < 1.0 for log in logs[2:])
+
+    qs = filter_logs(query='"Verification succeeded"', level="")
+    assert [log.message for log in qs] == [MESSAGES[2]]
+
+
+def test_filter_logs_falls_back_to_icontains(entries):
+    qs = filter_logs(query=":54106")
+    assert [log.message for log in qs] == [MESSAGES[0]]
@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from logapp.identifiers import (
+    extract_identifiers,
+    identifier_trace,
+    normalize_block_id,
+    rebuild_identifiers,
+)
+from logapp.ingest import RowBatch, commit_batches
+from logapp.models import LogEntry, LogIdentifier
+
+START = datetime(2008, 11, 9, 20, 35, tzinfo=pytz.UTC)
+
+
+def entry_fields(offset, message):
+    return {
+        "timestamp": START + timedelta(seconds=offset),
+        "level": "INFO",
+        "message": message,
+        "service": "dfs.DataNode",
+    }
+
+
+@pytest.fixture
+def lifecycle(db):
+    commit_batches(
+        [
+            RowBatch(
+                fields=[
+                    entry_fields(
+                        5,
+                        "Receiving block blk_-1608999687919862906 "
+                        "src: /10.250.19.102:54106",
+                    ),
+                    entry_fields(
+                        0,
+                        "BLOCK* NameSystem.allocateBlock: /mnt/job.jar. "
+                        "blk_-1608999687919862906",
+                    ),
+                    entry_fields(9, "PacketResponder 1 for block blk_42"),
+                    entry_fields(
+                        20,
+                        "Deleting block blk_-1608999687919862906 file "
+                        "/mnt/blk_-1608999687919862906",
+                    ),
+                ]
+            )
+        ]
+    )
+
+
+# ---------------------------------
+# Tests for the extraction
+# ---------------------------------
+
+
+def test_extract_identifiers():
+    message = (
+        "Received block blk_-5623 of size 67108864 from /10.251.42.84 "
+        "for blk_-5623 and blk_77; 10.251.42.84:50010"
+    )
+    assert extract_identifiers(message) == [
+        ("block", "blk_-5623"),
+        ("block", "blk_77"),
+        ("ip", "10.251.42.84"),
+    ]
+    assert extract_identifiers(None) == []
+
+
+def test_configured_patterns(settings):
+    settings.LOGFLOW_IDENTIFIER_PATTERNS = {"job": r"job_\d+_\d+"}
+    assert extract_identifiers("job_200811092030_0001 blk_1") == [
+        ("job", "job_200811092030_0001")
+    ]
+
+
+def test_patterns_without_capturing_groups(settings):
+    settings.LOGFLOW_IDENTIFIER_PATTERNS = {"block": r"blk_(-?\d+)"}
+    with pytest.raises(ImproperlyConfigured):
+        extract_identifiers("blk_1")
+    settings.LOGFLOW_IDENTIFIER_PATTERNS = {"block": r"blk_(?:-?\d+)"}
+    assert extract_identifiers("blk_-1") == [("block", "blk_-1")]
+
+
+def test_normalize_block_id():
+    assert normalize_block_id("-42") == "blk_-42"
+    assert normalize_block_id("blk_42") == "blk_42"
+
+
+# ---------------------------------
+# Tests for the index
+# ---------------------------------
+
+
+def test_imports_index_identifiers(lifecycle):
+    assert LogIdentifier.objects.filter(kind="block").count() == 4
+    assert list(
+        LogIdentifier.objects.filter(kind="ip").values_list(
+            "value", "entry__message"
+        )
+    ) == [
+        (
+            "10.250.19.102",
+            "Receiving block blk_-1608999687919862906 "
+            "src: /10.250.19.102:54106",
+        )
+    ]
+    with CaptureQueriesContext(connection) as queries:
+        trace = list(identifier_trace("block", "blk_-1608999687919862906"))
+    assert len(queries) == 1
+    assert [log.message.split()[0] for log in trace] == [
+        "BLOCK*",
+        "Receiving",
+        "Deleting",
+    ]
+
+
+@pytest.mark.django_db
+def test_rebuild_identifiers(capsys):
+    LogEntry.objects.create(timestamp=START, message="blk_1 from 10.0.0.1")
+    LogEntry.objects.create(timestamp=START, message=None)
+    assert not LogIdentifier.objects.exists()
+    assert rebuild_identifiers(chunk_size=1) == 2
+    call_command("rebuild_identifiers")
+    assert "Indexed 2 identifiers" in capsys.readouterr().out
+    assert [log.message for log in identifier_trace("ip", "10.0.0.1")] == [
+        "blk_1 from 10.0.0.1"
+    ]
+
+
+# ---------------------------------
+# Tests for the endpoint
+# ---------------------------------
+
+
+def test_block_trace_endpoint(client, lifecycle):
+    url = reverse("logflow_block_trace", args=["-1608999687919862906"])
+    data = client.get(url).json()
+    assert data["status"] == "success"
+    assert data["block"] == "blk_-1608999687919862906"
+    assert data["count"] == 3
+    assert [log["timestamp"] for log in data["logs"]] == [
+        (START + timedelta(seconds=offset)).isoformat()
+        for offset in (0, 5, 20)
+    ]
+    data = client.get(reverse("logflow_block_trace", args=["blk_42"])).json()
+    assert data["count"] == 1
+    response = client.get(reverse("logflow_block_trace", args=["blk_7"]))
+    assert response.status_code == 404
@@ -0,0 +1,342 @@
+import bz2
+import gzip
+import pytest
+import zstandard
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from logapp.models import ImportCheckpoint, LogEntry
+from logapp import ingest
+from logapp.ingest import (
+    chunked,
+    detect_compression,
+    detect_format,
+    expand_input_paths,
+    import_entries,
+    iter_parsed_batches,
+    iter_row_batches,
+    row_to_fields,
+)
+
+SAMPLE_CSV = (
+    settings.BASE_DIR / "logapp" / "data" / "HDFS_2k.log_structured.csv"
+)
+
+CSV_HEADER = (
+    "LineId,Date,Time,Pid,Level,Component,Content,EventId,EventTemplate\n"
+)
+
+
+def write_csv(path, rows):
+    path.write_text(CSV_HEADER + "".join(row + "\n" for row in rows))
+    return path
+
+
+COMPRESSORS = {
+    "gz": gzip.compress,
+    "bz2": bz2.compress,
+    "zst": zstandard.compress,
+}
+
+
+def hdfs_rows(start, stop):
+    return [
+        f"{i},081109,203615,148,INFO,svc,line {i},E1,line <*>"
+        for i in range(start, stop)
+    ]
+
+
+# ---------------------------------
+# Tests for the ingest helpers
+# ---------------------------------
+
+
+def test_chunked():
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 3)) == []
+
+
+def test_row_to_fields_bad_timestamp():
+    errors = []
+    fields = row_to_fields(
+        {"Date": "999999", "Time": "203615", "Level": "INFO"}, errors
+    )
+    assert fields["timestamp"] is None
+    assert fields["level"] == "INFO"
+    assert len(errors) == 1
+
+
+@pytest.mark.django_db
+def test_import_entries_batches():
+    fields = (
+        {"level": "INFO", "message": f"message {i}", "service": "svc"}
+        for i in range(25)
+    )
+    assert import_entries(fields, batch_size=4, commit_interval=10) == 25
+    assert LogEntry.objects.count() == 25
+
+
+def test_expand_input_paths(tmp_path):
+    a = write_csv(tmp_path / "a.csv", [])
+    b = write_csv(tmp_path / "b.csv", [])
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    assert expand_input_paths(str(tmp_path)) == [str(a), str(b)]
+    assert expand_input_paths(str(tmp_path / "b*.csv")) == [str(b)]
+    assert expand_input_paths(str(a)) == [str(a)]
+    assert expand_input_paths(str(tmp_path / "missing.csv")) == []
+
+
+@pytest.mark.django_db
+def test_iter_parsed_batches_keeps_order(tmp_path):
+    rows = [
+        f"{i},081109,203615,148,INFO,svc,message {i},E1,message <*>"
+        for i in range(1, 51)
+    ]
+    path = write_csv(tmp_path / "logs.csv", rows)
+    batches = iter_row_batches([str(path)], batch_size=7, resume=False)
+
+    parsed = list(iter_parsed_batches(batches, workers=2))
+    messages = [f["message"] for batch in parsed for f in batch.fields]
+    assert messages == [f"message {i}" for i in range(1, 51)]
+    assert all(not batch.errors for batch in parsed)
+    assert parsed[-1].end_offset == path.stat().st_size
+    assert parsed[0].fields[0]["line_id"] == 1
+
+
+def test_import_entries_rejects_bad_sizes():
+    with pytest.raises(ValueError):
+        import_entries([], batch_size=0)
+
+
+# ---------------------------------
+# Tests for the import_logs command
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_import_logs_sample_file():
+    out = StringIO()
+    call_command(
+        "import_logs", path=str(SAMPLE_CSV), batch_size=300, stdout=out
+    )
+    assert LogEntry.objects.count() == 2000
+    output = out.getvalue()
+    assert "Successfully imported 2000 log entries from 1 file(s)." in output
+    assert "rows/sec" in output
+
+    first = LogEntry.objects.order_by("id").first()
+    assert first.level == "INFO"
+    assert first.service == "dfs.DataNode$PacketResponder"
+    assert first.additional_data["EventId"] == "E10"
+    assert first.timestamp.isoformat() == "2009-08-11T20:36:15+00:00"
+
+
+@pytest.mark.django_db
+def test_import_logs_directory_with_workers(tmp_path):
+    for name in ("part1.csv", "part2.csv"):
+        write_csv(
+            tmp_path / name,
+            [
+                f"{i},081109,203615,148,INFO,svc,{name} line {i},E1,x"
+                for i in range(1, 21)
+            ],
+        )
+    out = StringIO()
+    call_command(
+        "import_logs",
+        path=str(tmp_path),
+        workers=2,
+        batch_size=8,
+        stdout=out,
+    )
+    assert LogEntry.objects.count() == 40
+    assert "from 2 file(s)" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_logs_reports_bad_timestamps(tmp_path):
+    path = write_csv(
+        tmp_path / "bad.csv",
+        [
+            "1,081109,203615,148,INFO,svc,good row,E1,good row",
+            "2,999999,203615,148,INFO,svc,bad row,E1,bad row",
+        ],
+    )
+    out = StringIO()
+    call_command("import_logs", path=str(path), stdout=out)
+    assert LogEntry.objects.count() == 2
+    assert LogEntry.objects.get(message="bad row").timestamp is None
+    assert "Error parsing timestamp" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_logs_missing_file(tmp_path):
+    out = StringIO()
+    call_command("import_logs", path=str(tmp_path / "nope.csv"), stdout=out)
+    assert "File not found" in out.getvalue()
+    assert LogEntry.objects.count() == 0
+
+
+def test_import_logs_invalid_batch_size():
+    with pytest.raises(CommandError):
+        call_command("import_logs", path=str(SAMPLE_CSV), batch_size=0)
+
+
+# ---------------------------------
+# Tests for checkpoints and idempotent re-imports
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_import_logs_rerun_is_idempotent(tmp_path):
+    path = write_csv(tmp_path / "logs.csv", hdfs_rows(1, 31))
+    call_command("import_logs", path=str(path), stdout=StringIO())
+    out = StringIO()
+    call_command("import_logs", path=str(path), stdout=out)
+
+    assert LogEntry.objects.count() == 30
+    assert "Successfully imported 0 log entries" in out.getvalue()
+    checkpoint = ImportCheckpoint.objects.get(source=str(path))
+    assert checkpoint.byte_offset == path.stat().st_size
+    assert checkpoint.last_line_id == 30
+    assert checkpoint.rows_imported == 30
+
+
+@pytest.mark.django_db
+def test_import_logs_appends_new_lines(tmp_path):
+    path = write_csv(tmp_path / "logs.csv", hdfs_rows(1, 11))
+    call_command("import_logs", path=str(path), stdout=StringIO())
+    with open(path, "a") as fh:
+        fh.write("".join(row + "\n" for row in hdfs_rows(11, 16)))
+
+    out = StringIO()
+    call_command("import_logs", path=str(path), stdout=out)
+    assert "Successfully imported 5 log entries" in out.getvalue()
+    assert LogEntry.objects.count() == 15
+    assert ImportCheckpoint.objects.get().last_line_id == 15
+
+
+@pytest.mark.django_db
+def test_import_logs_no_resume_rejects_duplicates(tmp_path):
+    path = write_csv(tmp_path / "logs.csv", hdfs_rows(1, 11))
+    call_command("import_logs", path=str(path), stdout=StringIO())
+    out = StringIO()
+    call_command("import_logs", path=str(path), no_resume=True, stdout=out)
+    assert LogEntry.objects.count() == 10
+    assert "Skipped 10 already imported lines." in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_import_logs_resumes_after_interruption(tmp_path, monkeypatch):
+    path = write_csv(tmp_path / "logs.csv", hdfs_rows(1, 21))
+    real_insert = ingest.insert_entries
+    calls = []
+
+    def failing_insert(fields_list):
+        calls.append(len(fields_list))
+        if len(calls) == 3:
+            raise RuntimeError("simulated crash")
+        return real_insert(fields_list)
+
+    monkeypatch.setattr(ingest, "insert_entries", failing_insert)
+    with pytest.raises(RuntimeError):
+        call_command(
+            "import_logs",
+            path=str(path),
+            batch_size=5,
+            commit_interval=10,
+            stdout=StringIO(),
+        )
+    # The first chunk of ten rows was committed along with its checkpoint.
+    assert LogEntry.objects.count() == 10
+    assert ImportCheckpoint.objects.get().last_line_id == 10
+
+    monkeypatch.setattr(ingest, "insert_entries", real_insert)
+    out = StringIO()
+    call_command("import_logs", path=str(path), stdout=out)
+    assert "Successfully imported 10 log entries" in out.getvalue()
+    assert "Skipped" not in out.getvalue()
+    assert LogEntry.objects.count() == 20
+
+
+@pytest.mark.django_db
+def test_import_logs_replaced_file_restarts(tmp_path):
+    path = write_csv(tmp_path / "logs.csv", hdfs_rows(1, 11))
+    call_command("import_logs", path=str(path), stdout=StringIO())
+    assert ingest.resume_point(str(path)) == (path.stat().st_size, 10, 0)
+    # Same size, different content: the fingerprint no longer matches.
+    write_csv(path, [row.replace("line", "LINE") for row in hdfs_rows(1, 11)])
+    assert ingest.resume_point(str(path)) == (0, None, 1)
+
+    path.write_text(CSV_HEADER)
+    assert ingest.resume_point(str(path)) == (0, None, 1)
+
+
+@pytest.mark.django_db
+def test_import_logs_rotated_file_is_new_generation(tmp_path):
+    path = write_csv(tmp_path / "logs.csv", hdfs_rows(1, 11))
+    call_command("import_logs", path=str(path), stdout=StringIO())
+    write_csv(path, [row.replace("line", "next") for row in hdfs_rows(1, 6)])
+    call_command("import_logs", path=str(path), stdout=StringIO())
+
+    assert LogEntry.objects.count() == 15
+    assert LogEntry.objects.filter(source=f"{path}#1").count() == 5
+    checkpoint = ImportCheckpoint.objects.get()
+    assert checkpoint.generation == 1
+    assert checkpoint.rows_imported == 5
+
+
+# ---------------------------------
+# Tests for compressed input
+# ---------------------------------
+
+
+def test_detect_compression_and_format(tmp_path):
+    for suffix, compress in COMPRESSORS.items():
+        path = tmp_path / f"logs.csv.{suffix}"
+        path.write_bytes(compress(CSV_HEADER.encode("utf-8")))
+        assert detect_format(str(path)) == "csv"
+        assert detect_compression(str(path)) is not None
+    # Detection relies on magic bytes, not the file name.
+    plain = tmp_path / "plain.gz"
+    plain.write_text(CSV_HEADER)
+    assert detect_compression(str(plain)) is None
+    assert detect_format("HDFS.log.zst") == "raw"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("suffix", sorted(COMPRESSORS))
+def test_import_logs_compressed_file(tmp_path, suffix):
+    compress = COMPRESSORS[suffix]
+    path = tmp_path / f"logs.csv.{suffix}"
+    rows = CSV_HEADER + "".join(row + "\n" for row in hdfs_rows(1, 21))
+    path.write_bytes(compress(rows.encode("utf-8")))
+
+    out = StringIO()
+    call_command("import_logs", path=str(tmp_path), stdout=out)
+    assert "Successfully imported 20 log entries" in out.getvalue()
+    assert LogEntry.objects.get(line_id=20).message == "line 20"
+    # Offsets refer to the decompressed stream.
+    checkpoint = ImportCheckpoint.objects.get()
+    assert checkpoint.byte_offset == len(rows)
+
+    # A recompressed file with more lines resumes after the checkpoint.
+    more = rows + "".join(row + "\n" for row in hdfs_rows(21, 26))
+    path.write_bytes(compress(more.encode("utf-8")))
+    out = StringIO()
+    call_command("import_logs", path=str(path), stdout=out)
+    assert "Successfully imported 5 log entries" in out.getvalue()
+    assert "Skipped" not in out.getvalue()
+    assert LogEntry.objects.count() == 25
+
+
+@pytest.mark.django_db
+def test_import_logs_follow_rejects_compressed(tmp_path):
+    path = tmp_path / "HDFS.log.gz"
+    path.write_bytes(gzip.compress(b"line\n"))
+    with pytest.raises(CommandError):
+        call_command(
+            "import_logs", path=str(path), follow=True, stdout=StringIO()
+        )
@@ -0,0 +1,187 @@
+import gzip
+import io
+import json
+import pytest
+from django.urls import reverse
+from logapp.http_ingest import (
+    iter_ndjson_fields,
+    record_to_fields,
+    writer_queue,
+)
+from logapp.models import LogEntry
+
+
+def ndjson(records):
+    return "".join(
+        (record if isinstance(record, str) else json.dumps(record)) + "\n"
+        for record in records
+    ).encode("utf-8")
+
+
+def post_ndjson(client, body, **headers):
+    return client.post(
+        reverse("logflow_ingest"),
+        data=body,
+        content_type="application/x-ndjson",
+        headers=headers,
+    )
+
+
+# ---------------------------------
+# Tests for record validation
+# ---------------------------------
+
+
+def test_record_to_fields():
+    fields = record_to_fields(
+        {
+            "timestamp": "2008-11-09T20:36:15",
+            "level": "INFO",
+            "message": "Receiving block blk_1",
+            "service": "dfs.DataNode",
+            "line_id": 7,
+            "Pid": "148",
+        }
+    )
+    assert fields["timestamp"].isoformat() == "2008-11-09T20:36:15+00:00"
+    assert fields["line_id"] == 7
+    assert fields["additional_data"] == {"Pid": "148"}
+    assert (
+        record_to_fields({"message": "x", "timestamp": 0})["timestamp"].year
+        == 1970
+    )
+
+
+@pytest.mark.parametrize(
+    "record",
+    [
+        [],
+        {"level": "INFO"},
+        {"message": 5},
+        {"message": "x", "level": "L" * 21},
+        {"message": "x", "line_id": "1"},
+        {"message": "x", "timestamp": "yesterday"},
+        {"message": "x", "timestamp": 1e18},
+        {"message": "x", "timestamp": float("nan")},
+        {"message": "x", "additional_data": []},
+    ],
+)
+def test_record_to_fields_rejects_invalid(record):
+    with pytest.raises(ValueError):
+        record_to_fields(record)
+
+
+def test_iter_ndjson_fields_reports_line_numbers():
+    stream = io.BytesIO(ndjson([{"message": "a"}, "", "{oops", {"x": 1}]))
+    results = list(iter_ndjson_fields(stream))
+    assert [line for line, _, _ in results] == [1, 3, 4]
+    assert results[0][1] == {"message": "a"}
+    assert results[1][2] is not None and results[2][2] == "message is required"
+
+
+# ---------------------------------
+# Tests for POST /ingest/
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_ingest_gzip_ndjson(client, settings):
+    settings.LOGFLOW_INGEST_BATCH_SIZE = 2
+    records = [
+        {
+            "message": f"line {i}",
+            "level": "INFO",
+            "source": "shipper-1",
+            "line_id": i,
+        }
+        for i in range(1, 5)
+    ]
+    body = gzip.compress(ndjson(records[:2] + ["not json"] + records[2:]))
+
+    response = post_ndjson(client, body, content_encoding="gzip")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "success"
+    assert (data["accepted"], data["rejected"]) == (4, 1)
+    assert [b["accepted"] for b in data["batches"]] == [2, 1, 1]
+    assert [b["rejected"] for b in data["batches"]] == [0, 1, 0]
+    assert data["errors"][0].startswith("line 3:")
+    assert LogEntry.objects.count() == 4
+
+    # Retrying the same request does not duplicate rows.
+    data = post_ndjson(client, body, content_encoding="gzip").json()
+    assert (data["accepted"], data["duplicates"]) == (0, 4)
+    assert LogEntry.objects.count() == 4
+
+
+@pytest.mark.django_db
+def test_ingest_plain_ndjson(client):
+    response = post_ndjson(client, ndjson([{"message": "hello"}]))
+    assert response.json()["accepted"] == 1
+    assert LogEntry.objects.get().message == "hello"
+
+
+@pytest.mark.django_db
+def test_ingest_rejects_only_out_of_range_epochs(client):
+    records = [
+        {"message": "before", "timestamp": 1226262975},
+        {"message": "far future", "timestamp": 1e18},
+        {"message": "after", "timestamp": "2008-11-09T20:36:15Z"},
+    ]
+    response = post_ndjson(client, ndjson(records))
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["accepted"], data["rejected"]) == (2, 1)
+    assert data["errors"][0].startswith("line 2:")
+    assert sorted(LogEntry.objects.values_list("message", flat=True)) == [
+        "after",
+        "before",
+    ]
+
+
+@pytest.mark.django_db
+def test_ingest_bad_gzip(client):
+    response = post_ndjson(client, b"plain text", content_encoding="gzip")
+    assert response.status_code == 400
+    assert response.json()["status"] == "error"
+
+    # A valid gzip header followed by corrupt deflate data.
+    body = bytearray(gzip.compress(ndjson([{"message": "a"}] * 100)))
+    body[12:20] = b"\xff" * 8
+    response = post_ndjson(client, bytes(body), content_encoding="gzip")
+    assert response.status_code == 400
+    assert response.json()["status"] == "error"
+
+
+@pytest.mark.django_db
+def test_ingest_rejects_deeply_nested_records(client):
+    nested = "[" * 5000 + "]" * 5000
+    body = ndjson([{"message": "a"}, nested, {"message": "b"}])
+    response = post_ndjson(client, body)
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["accepted"], data["rejected"]) == (2, 1)
+    assert data["errors"][0].startswith("line 2:")
+
+
+@pytest.mark.django_db
+def test_ingest_backpressure(client):
+    held = 0
+    while writer_queue.try_enter():
+        held += 1
+    try:
+        response = post_ndjson(client, ndjson([{"message": "hello"}]))
+    finally:
+        for _ in range(held):
+            writer_queue.leave()
+    assert response.status_code == 429
+    assert response["Retry-After"] == "1"
+    assert not LogEntry.objects.exists()
+
+    # Slots are released after every request.
+    assert post_ndjson(client, ndjson([{"message": "a"}])).status_code == 200
+    assert post_ndjson(client, ndjson([{"message": "b"}])).status_code == 200
+
+
+def test_ingest_requires_post(client):
+    assert client.get(reverse("logflow_ingest")).status_code == 400
@@ -0,0 +1,174 @@
+import multiprocessing
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from logapp.ingest import RowBatch, commit_batches
+from logapp.models import LogEntry
+from logapp.parse_database import (
+    get_unique_services,
+    hourly_log_counts,
+    search_page,
+)
+from logapp.query_cache import DATA_VERSION_KEY, QueryCache, get_query_cache
+
+
+def entry_fields(message, service="CacheService"):
+    return {
+        "timestamp": timezone.now(),
+        "level": "INFO",
+        "message": message,
+        "service": service,
+        "host": "host",
+        "additional_data": {},
+    }
+
+
+# ---------------------------------
+# Tests for QueryCache
+# ---------------------------------
+
+
+def test_query_cache_hits_and_misses(query_cache):
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [1, 2, 3]
+
+    assert query_cache.get_or_compute("q", {"a": 1}, compute) == [1, 2, 3]
+    assert query_cache.get_or_compute("q", {"a": 1}, compute) == [1, 2, 3]
+    assert query_cache.get_or_compute("q", {"a": 2}, compute) == [1, 2, 3]
+    assert len(calls) == 2
+    stats = query_cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+    assert stats["backend"] == "FileBasedCache"
+
+
+def test_query_cache_evicts_least_recently_used():
+    query_cache = QueryCache(max_entries=2)
+    query_cache.cache.clear()
+    query_cache.get_or_compute("q", {"n": 1}, lambda: 1)
+    query_cache.get_or_compute("q", {"n": 2}, lambda: 2)
+    query_cache.get_or_compute("q", {"n": 1}, lambda: None)
+    query_cache.get_or_compute("q", {"n": 3}, lambda: 3)
+
+    assert query_cache.stats.evictions == 1
+    assert query_cache.get_or_compute("q", {"n": 1}, lambda: None) == 1
+    assert query_cache.get_or_compute("q", {"n": 2}, lambda: "again") == (
+        "again"
+    )
+
+
+def test_query_cache_bounds_bytes():
+    query_cache = QueryCache(max_bytes=3000)
+    query_cache.cache.clear()
+    query_cache.get_or_compute("q", {"n": 1}, lambda: "x" * 1000)
+    query_cache.get_or_compute("q", {"n": 2}, lambda: "y" * 1000)
+    query_cache.get_or_compute("q", {"n": 3}, lambda: "z" * 1500)
+    assert query_cache.stats.evictions == 1
+    assert query_cache.get_stats()["bytes"] <= 3000
+
+    query_cache.get_or_compute("q", {"n": 4}, lambda: "w" * 5000)
+    assert query_cache.stats.too_large == 1
+    assert query_cache.get_or_compute("q", {"n": 4}, lambda: "new") == "new"
+
+
+def test_query_cache_invalidated_by_data_version(query_cache):
+    query_cache.get_or_compute("q", {}, lambda: "old")
+    query_cache.bump_data_version()
+    assert query_cache.get_or_compute("q", {}, lambda: "new") == "new"
+
+    # A lost version counter must not bring back older entries.
+    query_cache.cache.delete(DATA_VERSION_KEY)
+    assert query_cache.get_or_compute("q", {}, lambda: "newer") == "newer"
+
+
+def test_query_cache_file_backend(settings, tmp_path):
+    settings.CACHES = {
+        **settings.CACHES,
+        "files": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": str(tmp_path / "query_cache"),
+        },
+    }
+    writer = QueryCache("files")
+    writer.get_or_compute("q", {"a": 1}, lambda: {"rows": [1]})
+
+    # Another process sees the same entries and version through the files.
+    reader = QueryCache("files")
+    assert reader.get_or_compute("q", {"a": 1}, lambda: None) == {"rows": [1]}
+    assert reader.get_stats()["entries"] == 1
+    writer.bump_data_version()
+    assert reader.get_or_compute("q", {"a": 1}, lambda: "fresh") == "fresh"
+
+
+def test_query_cache_invalidated_by_another_process(query_cache):
+    query_cache.get_or_compute("q", {}, lambda: "old")
+    # An import in another process, as import_logs runs, bumps the version
+    # in the default cache.
+    process = multiprocessing.get_context("fork").Process(
+        target=bump_data_version
+    )
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    assert query_cache.get_or_compute("q", {}, lambda: "new") == "new"
+
+
+def bump_data_version():
+    get_query_cache().bump_data_version()
+
+
+# ---------------------------------
+# Tests for the cached queries
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_search_page_cached_until_import(query_cache):
+    commit_batches([RowBatch(fields=[entry_fields("cached search hit")])])
+    page, _ = search_page(query="cached")
+    assert [log.message for log in page] == ["cached search hit"]
+
+    # Rows written behind the cache's back are not seen...
+    LogEntry.objects.create(timestamp=timezone.now(), message="cached too")
+    page, _ = search_page(query="cached")
+    assert len(page) == 1
+    assert query_cache.stats.hits == 1
+
+    # ...until an import commits a batch.
+    commit_batches([RowBatch(fields=[entry_fields("cached again")])])
+    page, _ = search_page(query="cached")
+    assert len(page) == 3
+
+
+@pytest.mark.django_db
+def test_search_page_normalizes_filters(query_cache):
+    search_page(service="CacheService", level="info")
+    search_page(service="cacheservice", level="INFO")
+    assert (query_cache.stats.misses, query_cache.stats.hits) == (1, 1)
+    with pytest.raises(ValueError):
+        search_page(cursor="bogus")
+
+
+@pytest.mark.django_db
+def test_cached_aggregates(query_cache):
+    commit_batches(
+        [RowBatch(fields=[entry_fields("a", "S2"), entry_fields("b", "S1")])]
+    )
+    assert get_unique_services() == ["S1", "S2"]
+    assert sum(row["log_count"] for row in hourly_log_counts()) == 2
+    get_unique_services()
+    hourly_log_counts()
+    assert query_cache.stats.hits == 2
+
+
+@pytest.mark.django_db
+def test_cache_stats_endpoint(client):
+    client.get(reverse("logflow_dashboard"))
+    client.get(reverse("logflow_dashboard"))
+    data = client.get(reverse("logflow_cache_stats")).json()
+    assert data["status"] == "success"
+    assert data["cache"]["hits"] == 1
+    assert data["cache"]["misses"] == 1
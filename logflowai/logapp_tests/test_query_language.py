@@ -0,0 +1,144 @@
+import pytest
+from datetime import datetime, timezone as dt_timezone
+from django.urls import reverse
+from logapp import parse_database
+from logapp.models import LogEntry
+from logapp.parse_database import filter_logs
+from logapp.query_language import (
+    FieldFilter,
+    QuerySyntaxError,
+    SearchQuery,
+    compile_filters,
+    parse_query,
+)
+
+# ---------------------------------
+# Tests for parse_query
+# ---------------------------------
+
+
+def test_parse_query_fields_and_text():
+    parsed = parse_query(
+        "level:ERROR service:dfs.DataNode* event:E5 "
+        "blk_-1608999687919862906 after:2008-11-09T20:00"
+    )
+    assert parsed.filters == (
+        FieldFilter("level", ("ERROR",)),
+        FieldFilter("service", ("dfs.DataNode*",)),
+        FieldFilter("event", ("E5",)),
+        FieldFilter("after", ("2008-11-09T20:00",)),
+    )
+    assert parsed.text == "blk_-1608999687919862906"
+    assert not parsed.is_precise
+
+
+def test_parse_query_negation_lists_and_quotes():
+    parsed = parse_query('-level:INFO,WARN host:"my host" "exact phrase"')
+    assert parsed.filters == (
+        FieldFilter("level", ("INFO", "WARN"), negated=True),
+        FieldFilter("host", ("my host",)),
+    )
+    assert parsed.text == '"exact phrase"'
+
+
+def test_parse_query_keeps_unknown_colons_as_text():
+    parsed = parse_query("Receiving from 10.0.0.1:50010 Exception:java.io")
+    assert parsed == SearchQuery(
+        (), "Receiving from 10.0.0.1:50010 Exception:java.io"
+    )
+    assert parse_query("level:ERROR").is_precise
+
+
+@pytest.mark.parametrize(
+    "query", ["level:", 'service:""', "after:yesterday", "line:abc"]
+)
+def test_parse_query_errors(query):
+    with pytest.raises(QuerySyntaxError):
+        compile_filters(parse_query(query).filters)
+
+
+# ---------------------------------
+# Tests for structured queries in filter_logs
+# ---------------------------------
+
+
+@pytest.fixture
+def operator_logs(db):
+    def create(level, service, event_id, message, hour):
+        return LogEntry.objects.create(
+            timestamp=datetime(2008, 11, 9, hour, tzinfo=dt_timezone.utc),
+            level=level,
+            service=service,
+            message=message,
+            host="node-1",
+            additional_data={"EventId": event_id},
+        )
+
+    return [
+        create(
+            "ERROR",
+            "dfs.DataNode$PacketResponder",
+            "E5",
+            "Exception for blk_-1608999687919862906",
+            21,
+        ),
+        create("ERROR", "dfs.DataNode", "E5", "Exception for blk_42", 21),
+        create(
+            "ERROR",
+            "dfs.FSNamesystem",
+            "E5",
+            "Exception for blk_-1608999687919862906",
+            21,
+        ),
+        create(
+            "INFO",
+            "dfs.DataNode",
+            "E2",
+            "Receiving blk_-1608999687919862906",
+            19,
+        ),
+    ]
+
+
+def test_filter_logs_precise_query_skips_similarity(
+    operator_logs, monkeypatch
+):
+    def no_search_index():
+        raise AssertionError("precise queries must not be ranked")
+
+    monkeypatch.setattr(parse_database, "get_search_index", no_search_index)
+    logs = filter_logs(
+        "level:error service:dfs.DataNode* event:E5 after:2008-11-09T20:00"
+    )
+    assert list(logs) == operator_logs[:2]
+    assert list(filter_logs("-service:dfs.datanode* level:ERROR,INFO")) == [
+        operator_logs[2]
+    ]
+    assert list(filter_logs("before:2008-11-09T20:00")) == [operator_logs[3]]
+    assert list(filter_logs("level:ERROR after:2008-11-09T20:30:00Z")) == (
+        operator_logs[:3]
+    )
+
+
+def test_filter_logs_structured_query_with_text(operator_logs):
+    logs = filter_logs(
+        "level:ERROR service:dfs.DataNode* event:E5 "
+        "blk_-1608999687919862906 after:2008-11-09T20:00"
+    )
+    assert logs[0] == operator_logs[0]
+    assert logs[0].similarity == 1.0
+    assert operator_logs[2] not in logs
+    assert operator_logs[3] not in logs
+
+
+@pytest.mark.django_db
+def test_structured_query_uses_indexes():
+    plan = filter_logs("service:dfs.DataNode* level:ERROR").explain()
+    assert "logentry_service_level_ts" in plan
+    assert "event_id" in filter_logs("event:E5").explain()
+
+
+@pytest.mark.django_db
+def test_home_rejects_malformed_query(client):
+    response = client.get(reverse("logflow_home"), {"query": "after:soon"})
+    assert response.status_code == 400
@@ -0,0 +1,150 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from django.core.management import call_command
+from django.urls import reverse
+from logapp.ingest import RowBatch, commit_batches
+from logapp.models import LogEntry, LogRollup
+from logapp.parse_database import hourly_log_counts
+from logapp.rollups import (
+    DAY,
+    GRANULARITIES,
+    HOUR,
+    MINUTE,
+    bucket_start,
+    rebuild_rollups,
+    rollup_counts,
+)
+
+START = datetime(2008, 11, 9, 20, 35, 30, tzinfo=pytz.UTC)
+
+
+def entry_fields(offset, service="DataNode", level="INFO", event_id="E1"):
+    return {
+        "timestamp": START + timedelta(seconds=offset),
+        "level": level,
+        "message": f"message {offset}",
+        "service": service,
+        "additional_data": {"EventId": event_id},
+    }
+
+
+def stored_counts():
+    return {
+        (rollup.granularity, rollup.bucket, rollup.service, rollup.level): (
+            rollup.count
+        )
+        for rollup in LogRollup.objects.filter(event_id="E1")
+    }
+
+
+# ---------------------------------
+# Tests for the bucketing
+# ---------------------------------
+
+
+def test_bucket_start():
+    epoch = int(START.timestamp())
+    assert bucket_start(START, MINUTE) == epoch - 30
+    assert bucket_start(START, HOUR) == epoch - 35 * 60 - 30
+    assert bucket_start(START.replace(tzinfo=None), DAY) == 1226188800
+
+
+def test_rollup_counts():
+    fields = [
+        {"timestamp": START, "service_norm": "a", "level_norm": "info"},
+        {"timestamp": START, "service_norm": "a", "level_norm": "info"},
+        {"timestamp": START + timedelta(minutes=1), "event_id": "E2"},
+        {"timestamp": None, "service_norm": "a"},
+    ]
+    counts = rollup_counts(fields)
+    minute = bucket_start(START, MINUTE)
+    assert counts[(MINUTE, minute, "a", "info", "")] == 2
+    assert counts[(MINUTE, minute + 60, "", "", "E2")] == 1
+    assert counts[(DAY, bucket_start(START, DAY), "a", "info", "")] == 2
+    assert sum(counts.values()) == 3 * len(GRANULARITIES)
+
+
+# ---------------------------------
+# Tests for maintaining the rollups
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_imports_update_rollups():
+    commit_batches([RowBatch(fields=[entry_fields(0), entry_fields(10)])])
+    commit_batches(
+        [RowBatch(fields=[entry_fields(40), entry_fields(0, "NameNode")])]
+    )
+    minute = bucket_start(START, MINUTE)
+    counts = stored_counts()
+    assert counts[(MINUTE, minute, "datanode", "info")] == 2
+    assert counts[(MINUTE, minute + 60, "datanode", "info")] == 1
+    assert counts[(MINUTE, minute, "namenode", "info")] == 1
+    assert counts[(HOUR, bucket_start(START, HOUR), "datanode", "info")] == 3
+    assert counts[(DAY, bucket_start(START, DAY), "namenode", "info")] == 1
+
+
+@pytest.mark.django_db
+def test_rebuild_rollups_backfills():
+    commit_batches([RowBatch(fields=[entry_fields(0)])])
+    LogEntry.objects.create(timestamp=START, service="DataNode", level="INFO")
+    LogEntry.objects.create(message="no timestamp")
+    # Rows created through the ORM are only counted by a rebuild.
+    assert sum(stored_counts().values()) == len(GRANULARITIES)
+    assert rebuild_rollups(chunk_size=1) == 2
+    assert LogRollup.objects.filter(granularity=DAY).count() == 2
+    assert (
+        sum(
+            LogRollup.objects.filter(granularity=HOUR).values_list(
+                "count", flat=True
+            )
+        )
+        == 2
+    )
+
+
+@pytest.mark.django_db
+def test_rebuild_rollups_command(capsys):
+    LogEntry.objects.create(timestamp=START, service="DataNode")
+    call_command("rebuild_rollups")
+    assert "Counted 1 log entries" in capsys.readouterr().out
+    assert hourly_log_counts() == [{"hour": 20, "log_count": 1}]
+
+
+# ---------------------------------
+# Tests for the dashboard
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_hourly_log_counts_from_rollups():
+    commit_batches(
+        [
+            RowBatch(
+                fields=[
+                    entry_fields(0),
+                    entry_fields(HOUR),
+                    entry_fields(HOUR + 1),
+                    entry_fields(DAY),
+                ]
+            )
+        ]
+    )
+    assert hourly_log_counts() == [
+        {"hour": 20, "log_count": 2},
+        {"hour": 21, "log_count": 2},
+    ]
+    assert hourly_log_counts(21, 23) == [{"hour": 21, "log_count": 2}]
+
+
+@pytest.mark.django_db
+def test_update_chart(client):
+    commit_batches([RowBatch(fields=[entry_fields(0), entry_fields(HOUR)])])
+    response = client.post(
+        reverse("update_chart"),
+        json.dumps({"min_hour": 0, "max_hour": 20}),
+        content_type="application/json",
+    )
+    assert response.json() == {"logs_by_hour": [{"hour": 20, "log_count": 1}]}
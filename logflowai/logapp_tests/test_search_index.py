@@ -0,0 +1,272 @@
+import os
+import threading
+import numpy as np
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity
+from logapp import search_index
+from logapp.models import LogEntry
+from logapp.parse_database import (
+    KEEP_SEARCHES,
+    ExpiredSearchError,
+    filter_logs,
+    preprocess_text,
+)
+from logapp.search_index import SearchIndex, get_search_index
+
+MESSAGES = [
+    "Database connection established",
+    "database connection lost",
+    "Network timeout error",
+    "Disk usage above threshold",
+]
+
+
+def create_logs(messages):
+    LogEntry.objects.bulk_create(
+        LogEntry(timestamp=timezone.now(), message=message)
+        for message in messages
+    )
+
+
+# ---------------------------------
+# Tests for SearchIndex
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_rebuild_matches_refit_scores(search_index_dir):
+    create_logs(MESSAGES)
+    index = SearchIndex(search_index_dir)
+    assert index.rebuild() == len(MESSAGES)
+
+    ids, scores = index.search("database connection")
+    messages = dict(LogEntry.objects.values_list("id", "message"))
+    found = {messages[i]: score for i, score in zip(ids.tolist(), scores)}
+    assert set(found) == set(MESSAGES[:2])
+    # Same weighting as a vectorizer fitted over the whole table.
+    vectorizer = TfidfVectorizer(
+        stop_words="english", preprocessor=preprocess_text
+    )
+    matrix = vectorizer.fit_transform(MESSAGES)
+    expected = cosine_similarity(
+        vectorizer.transform(["database connection"]), matrix
+    )[0]
+    for message, score in zip(MESSAGES, expected):
+        assert found.get(message, 0.0) == pytest.approx(score, abs=1e-5)
+
+
+@pytest.mark.django_db
+def test_index_is_persisted(search_index_dir):
+    create_logs(MESSAGES)
+    SearchIndex(search_index_dir).rebuild()
+
+    index = SearchIndex(search_index_dir)
+    assert index.load()
+    assert index.last_id == LogEntry.objects.order_by("-id").first().id
+    assert index.doc_count == len(MESSAGES)
+    assert isinstance(index.segments[0]["data"], np.memmap)
+    assert len(index.search("timeout")[0]) == 1
+
+
+@pytest.mark.django_db
+def test_update_appends_segments(search_index_dir):
+    create_logs(MESSAGES)
+    index = SearchIndex(search_index_dir)
+    assert index.update() == len(MESSAGES)
+    assert index.update() == 0
+
+    create_logs(["Network timeout while reading block"])
+    assert index.update() == 1
+    assert len(index.manifest["segments"]) == 2
+    assert len(index.search("network timeout")[0]) == 2
+    # Terms first seen after the rebuild wait for the next one.
+    assert len(index.search("reading")[0]) == 0
+    index.rebuild()
+    assert len(index.manifest["segments"]) == 1
+    assert len(index.search("reading")[0]) == 1
+
+
+@pytest.mark.django_db
+def test_update_rebuilds_once_grown(search_index_dir, settings):
+    settings.LOGFLOW_INDEX_REBUILD_GROWTH = 2
+    create_logs(MESSAGES)
+    index = SearchIndex(search_index_dir)
+    index.update()
+    create_logs(["Network timeout while reading block"] * 4)
+    assert index.update() == 4
+    assert len(index.manifest["segments"]) == 2
+    assert len(index.search("reading")[0]) == 0
+    # Nine rows exceed twice the four of the last rebuild, which searches
+    # leave to the next import.
+    create_logs(["Reading block failed"])
+    assert index.update(rebuild=False) == 1
+    assert len(index.manifest["segments"]) == 3
+    create_logs(["Reading block failed"])
+    assert index.update() == len(MESSAGES) + 6
+    assert len(index.manifest["segments"]) == 1
+    assert index.manifest["rebuilt_with"] == len(MESSAGES) + 6
+    assert len(index.search("reading")[0]) == 6
+
+
+@pytest.mark.django_db
+def test_update_without_rebuild_needs_an_index(search_index_dir):
+    create_logs(MESSAGES)
+    index = SearchIndex(search_index_dir)
+    assert index.update(rebuild=False) == 0
+    assert not index.load()
+    assert index.update() == len(MESSAGES)
+
+
+@pytest.mark.django_db
+def test_update_merges_small_segments(search_index_dir, monkeypatch):
+    monkeypatch.setattr(search_index, "MAX_SEGMENTS", 3)
+    create_logs(MESSAGES)
+    index = SearchIndex(search_index_dir)
+    index.update()
+    for _ in range(5):
+        create_logs(["database connection established"])
+        index.update()
+    assert len(index.manifest["segments"]) == 3
+    assert index.doc_count == len(MESSAGES) + 5
+    ids = index.search("database connection established")[0]
+    assert len(ids) == 7
+    # Removed segment directories are cleaned up.
+    assert len([n for n in os.listdir(search_index_dir) if "-" in n]) == 4
+
+
+@pytest.mark.django_db
+def test_update_rebuilds_after_table_reset(search_index_dir):
+    create_logs(MESSAGES)
+    index = SearchIndex(search_index_dir)
+    index.update()
+    LogEntry.objects.all().delete()
+    assert index.update() == 0
+    assert index.last_id == 0
+    assert len(index.search("database")[0]) == 0
+
+
+@pytest.mark.django_db
+def test_concurrent_reader_sees_updates(search_index_dir):
+    create_logs(MESSAGES)
+    writer = SearchIndex(search_index_dir)
+    writer.rebuild()
+    reader = SearchIndex(search_index_dir)
+    reader.load()
+    create_logs(["network timeout again"])
+    writer.update()
+    reader.load()
+    assert len(reader.search("network timeout")[0]) == 2
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("workers", [1, 3])
+def test_chunked_search_matches_whole_segments(search_index_dir, workers):
+    create_logs(MESSAGES * 10)
+    index = SearchIndex(search_index_dir)
+    index.update()
+    create_logs(MESSAGES)
+    index.update()
+    expected_ids, expected_scores = index.search(
+        "database connection timeout", chunk_rows=10**6
+    )
+    ids, scores = index.search(
+        "database connection timeout", chunk_rows=4, workers=workers
+    )
+    assert ids.tolist() == expected_ids.tolist()
+    assert scores == pytest.approx(expected_scores)
+    chunks = list(
+        index.iter_search("database connection timeout", chunk_rows=4)
+    )
+    assert len(chunks) == 11
+
+
+@pytest.mark.django_db
+def test_search_top_k_and_threshold(search_index_dir):
+    create_logs(MESSAGES * 5)
+    index = SearchIndex(search_index_dir)
+    index.rebuild()
+    ids, scores = index.search("database connection lost")
+    top_ids, top_scores = index.search(
+        "database connection lost", top_k=7, chunk_rows=3, workers=2
+    )
+    assert top_scores.tolist() == sorted(scores, reverse=True)[:7]
+    found = dict(zip(ids.tolist(), scores.tolist()))
+    assert [found[i] for i in top_ids.tolist()] == top_scores.tolist()
+    ids, scores = index.search("database connection lost", threshold=0.9)
+    assert len(ids) == 5 and min(scores) >= 0.9
+    assert len(index.search("unknown words", top_k=3)[0]) == 0
+
+
+# ---------------------------------
+# Tests for filter_logs and the commands
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_filter_logs_uses_search_index(search_index_dir):
+    create_logs(MESSAGES)
+    # Searches never build the index; imports do.
+    filter_logs(query="database connection")
+    assert not get_search_index().load()
+    get_search_index().update()
+    qs = filter_logs(query="database connection", similarity_threshold=0.1)
+    assert [log.message for log in qs] == MESSAGES[:2]
+    assert get_search_index().doc_count == len(MESSAGES)
+
+    # Rows inserted later are found without a rebuild.
+    create_logs(["Database connection reset by peer"])
+    qs = filter_logs(query="connection reset", similarity_threshold=0.1)
+    messages = [log.message for log in qs]
+    assert messages[0] == "Database connection reset by peer"
+    assert set(messages) == set(MESSAGES[:2]) | {messages[0]}
+
+
+@pytest.mark.django_db
+def test_filter_logs_results_expire(search_index_dir):
+    create_logs(MESSAGES)
+    qs = filter_logs(query="database connection")
+    assert qs.count() == 2
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(catch_expired(qs.all().count))
+    )
+    thread.start()
+    thread.join()
+    assert isinstance(results[0], ExpiredSearchError)
+
+    for _ in range(KEEP_SEARCHES - 1):
+        filter_logs(query="network timeout")
+    assert len(qs.all()) == 2
+    filter_logs(query="network timeout")
+    with pytest.raises(ExpiredSearchError):
+        list(qs.all())
+    with pytest.raises(ExpiredSearchError):
+        LogEntry.objects.filter(id__in=qs.values("id")).count()
+
+
+def catch_expired(evaluate):
+    try:
+        return evaluate()
+    except ExpiredSearchError as e:
+        return e
+
+
+@pytest.mark.django_db
+def test_import_logs_updates_search_index():
+    out = StringIO()
+    call_command("import_logs", stdout=out)
+    count = LogEntry.objects.count()
+    assert f"Indexed {count} new entries for search." in out.getvalue()
+    assert get_search_index().doc_count == count
+
+
+@pytest.mark.django_db
+def test_rebuild_search_index_command():
+    create_logs(MESSAGES)
+    out = StringIO()
+    call_command("rebuild_search_index", min_df=2, stdout=out)
+    assert "Indexed 4 log entries (2 terms)" in out.getvalue()
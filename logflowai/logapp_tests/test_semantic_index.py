@@ -0,0 +1,189 @@
+import numpy as np
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from logapp import semantic_index
+from logapp.models import LogEntry, LogTemplate
+from logapp.parse_database import filter_logs
+from logapp.semantic_index import (
+    HashedEmbedder,
+    SemanticIndex,
+    get_semantic_index,
+    quantize,
+    split_words,
+)
+
+TEMPLATES = {
+    "E1": "No space left on device",
+    "E2": "java.io.IOException: Connection reset by peer",
+    "E3": "Receiving block <*> src: <*> dest: <*>",
+    "E4": "Deleting block <*> file <*>",
+    "E5": "Verification succeeded for <*>",
+    "E6": "Out of memory: Java heap space",
+}
+
+
+# ---------------------------------
+# Tests for the embedding
+# ---------------------------------
+
+
+def test_split_words():
+    assert split_words("BLOCK* NameSystem.allocateBlock: blk_-42 deleted") == [
+        "block",
+        "allocat",
+        "block",
+        "blk",
+        "delet",
+    ]
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("disk full", "E1"),
+        ("network connection lost", "E2"),
+        ("memory exhausted", "E6"),
+        ("block removed", "E4"),
+    ],
+)
+def test_embedding_matches_paraphrases(query, expected):
+    embedder = HashedEmbedder()
+    vectors = embedder.embed(list(TEMPLATES.values()))
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    scores = vectors @ embedder.embed([query])[0]
+    assert list(TEMPLATES)[scores.argmax()] == expected
+
+
+def test_quantize():
+    vectors = HashedEmbedder().embed(list(TEMPLATES.values()) + [""])
+    codes, scales = quantize(vectors)
+    assert codes.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(codes * scales[:, None] - vectors).max() < 0.01
+    assert not codes[-1].any()
+
+
+# ---------------------------------
+# Tests for SemanticIndex
+# ---------------------------------
+
+
+def clustered_vectors(count, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(0, clusters, count)] + rng.normal(
+        scale=0.3, size=(count, dim)
+    )
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def test_ivf_search_approximates_exact_search(tmp_path):
+    vectors = clustered_vectors(2000)
+    index = SemanticIndex(tmp_path / "semantic", HashedEmbedder(32))
+    index.build(np.arange(2000) + 100, vectors)
+    assert len(index.centroids) == 45 and index.doc_count == 2000
+
+    # Exact search ranks the int8 vectors as stored.
+    codes, scales = quantize(vectors)
+    stored = codes * scales[:, None]
+    queries = clustered_vectors(20, seed=1)
+    recall = 0
+    for query in queries:
+        expected = np.argsort(-(stored @ query), kind="stable")[:10] + 100
+        keys, scores = index.search(query, k=10, exact=True)
+        assert keys.tolist() == expected.tolist()
+        assert list(scores) == sorted(scores, reverse=True)
+        keys, _ = index.search(query, k=10, nprobe=8)
+        recall += len(set(keys.tolist()) & set(expected.tolist()))
+        all_keys, _ = index.search(query, k=10, nprobe=45)
+        assert all_keys.tolist() == expected.tolist()
+    assert recall / 200 >= 0.9
+
+
+def test_add_replaces_vectors_and_merges(tmp_path, monkeypatch):
+    monkeypatch.setattr(semantic_index, "MAX_SEGMENTS", 3)
+    vectors = clustered_vectors(100)
+    index = SemanticIndex(tmp_path / "semantic", HashedEmbedder(32))
+    index.add(np.arange(100), vectors)
+    for key in range(5):
+        index.add([key], vectors[[99 - key]])
+    assert len(index.manifest["segments"]) == 3
+    assert index.doc_count == 100
+    keys, scores = index.search(vectors[99], k=2, exact=True)
+    assert sorted(keys.tolist()) == [0, 99]
+    assert scores[1] == pytest.approx(1.0, abs=0.01)
+    assert np.allclose(index.vector(3), vectors[96], atol=0.01)
+    assert index.vector(1000) is None
+
+
+# ---------------------------------
+# Tests for semantic searches in filter_logs
+# ---------------------------------
+
+
+@pytest.fixture
+def template_logs(db):
+    now = timezone.now()
+    LogTemplate.objects.bulk_create(
+        LogTemplate(event_id=event_id, template=template)
+        for event_id, template in TEMPLATES.items()
+    )
+    return [
+        LogEntry.objects.create(
+            timestamp=now,
+            message=template.replace("<*>", "blk_42"),
+            additional_data={"EventId": event_id},
+        )
+        for event_id, template in TEMPLATES.items()
+    ]
+
+
+def test_update_follows_template_changes(template_logs):
+    index = get_semantic_index()
+    assert index.update() == len(TEMPLATES)
+    assert index.update() == 0
+    LogTemplate.objects.filter(event_id="E5").update(
+        template="Disk quota exceeded", updated_at=timezone.now()
+    )
+    assert index.update() == 1
+    keys, _ = index.search_text("disk full", k=2)
+    assert set(keys.tolist()) == set(
+        LogTemplate.objects.filter(event_id__in=["E1", "E5"]).values_list(
+            "id", flat=True
+        )
+    )
+
+
+def test_update_without_retrain(template_logs, monkeypatch):
+    index = get_semantic_index()
+    assert index.update(retrain=False) == 0
+    assert not index.load()
+    index.update()
+    trained = index.manifest["trained"]
+    monkeypatch.setattr(semantic_index, "RETRAIN_GROWTH", 1)
+    LogTemplate.objects.create(event_id="E9", template="Disk quota exceeded")
+    assert index.update(retrain=False) == 1
+    assert index.manifest["trained"] == trained
+    LogTemplate.objects.create(event_id="E10", template="Quota exceeded")
+    index.update()
+    assert index.manifest["trained"] == len(TEMPLATES) + 2
+
+
+def test_filter_logs_semantic_mode(template_logs):
+    get_semantic_index().update()
+    logs = filter_logs("disk full", mode="semantic", similarity_threshold=0.5)
+    assert list(logs) == [template_logs[0]]
+    assert logs[0].similarity > 0.5
+    logs = filter_logs("receiving block", mode="semantic")
+    assert logs[0] == template_logs[2]
+    assert logs[0].similarity == 1.0
+
+
+def test_home_semantic_mode(client, template_logs):
+    get_semantic_index().update()
+    data = client.get(
+        reverse("logflow_home"),
+        {"query": "memory exhausted", "mode": "semantic", "format": "json"},
+    ).json()
+    assert data["logs"][0]["id"] == template_logs[5].id
@@ -0,0 +1,111 @@
+from datetime import timedelta
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from logapp.models import LogEntry, LogTemplate
+from logapp.parse_database import similar_logs
+from logapp.search_index import get_search_index
+from logapp.semantic_index import get_semantic_index
+
+TEMPLATES = {
+    "E1": "No space left on device",
+    "E2": "Receiving block <*> src: <*> dest: <*>",
+    "E3": "Deleting block <*> file <*>",
+    "E4": "Verification succeeded for <*>",
+}
+
+
+@pytest.fixture
+def similar_entries(db):
+    now = timezone.now()
+    LogTemplate.objects.bulk_create(
+        LogTemplate(event_id=event_id, template=template)
+        for event_id, template in TEMPLATES.items()
+    )
+    entries = {}
+    for offset, (event_id, service) in enumerate(
+        [
+            ("E2", "DataNode"),
+            ("E2", "DataNode"),
+            ("E2", "NameNode"),
+            ("E3", "DataNode"),
+            ("E4", "DataNode"),
+        ]
+    ):
+        entries.setdefault(event_id, []).append(
+            LogEntry.objects.create(
+                timestamp=now + timedelta(minutes=offset),
+                service=service,
+                message=TEMPLATES[event_id].replace("<*>", f"blk_{offset}"),
+                additional_data={"EventId": event_id},
+            )
+        )
+    entries["old"] = LogEntry.objects.create(
+        timestamp=now - timedelta(days=3),
+        service="DataNode",
+        message="Receiving block blk_9 src: a dest: b",
+        additional_data={"EventId": "E2"},
+    )
+    entries["plain"] = LogEntry.objects.create(
+        timestamp=now,
+        service="DataNode",
+        message="Receiving block blk_7 from a client",
+    )
+    # Searches only append to the indexes, which imports build.
+    get_search_index().update()
+    get_semantic_index().update()
+    return entries
+
+
+def test_similar_logs_by_template(similar_entries):
+    entry = similar_entries["E2"][0]
+    mode, logs = similar_logs(entry)
+    logs = list(logs)
+    assert mode == "templates"
+    assert entry not in logs
+    assert similar_entries["old"] not in logs
+    # The rows of the entry's own template come first.
+    assert logs[:2] == similar_entries["E2"][1:]
+    assert logs[0].similarity == pytest.approx(1.0, abs=0.01)
+    assert all(a.similarity >= b.similarity for a, b in zip(logs, logs[1:]))
+
+
+def test_similar_logs_filters(similar_entries):
+    entry = similar_entries["E2"][0]
+    _, logs = similar_logs(entry, service="datanode")
+    assert similar_entries["E2"][2] not in logs
+    assert similar_entries["E2"][1] in logs
+    _, logs = similar_logs(entry, window=None)
+    assert similar_entries["old"] in logs
+
+
+def test_similar_logs_without_template(similar_entries):
+    mode, logs = similar_logs(similar_entries["plain"])
+    logs = list(logs)
+    assert mode == "rows"
+    assert similar_entries["plain"] not in logs
+    assert logs[0].message.startswith("Receiving block")
+    assert 0 < logs[0].similarity < 1
+
+
+def test_similar_endpoint(client, similar_entries):
+    entry = similar_entries["E2"][0]
+    url = reverse("logflow_similar", args=[entry.id])
+    data = client.get(url).json()
+    assert data["status"] == "success"
+    assert data["entry"]["id"] == entry.id
+    assert data["mode"] == "templates"
+    ids = [log["id"] for log in data["logs"]]
+    # Defaults to the entry's own service.
+    assert ids[0] == similar_entries["E2"][1].id
+    assert similar_entries["E2"][2].id not in ids
+
+    data = client.get(url, {"service": "", "window": 0, "limit": 2}).json()
+    assert [log["id"] for log in data["logs"]] == [
+        similar_entries["old"].id,
+        similar_entries["E2"][1].id,
+    ]
+
+    assert client.get(url, {"window": "day"}).status_code == 400
+    missing = reverse("logflow_similar", args=[entry.id + 1000])
+    assert client.get(missing).status_code == 404
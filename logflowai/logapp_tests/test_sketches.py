@@ -0,0 +1,207 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from django.core.management import call_command
+from django.urls import reverse
+from logapp.identifiers import identifier_trace
+from logapp.ingest import RowBatch, commit_batches
+from logapp.models import LogEntry, LogSketch
+from logapp.rollups import DAY, HOUR
+from logapp.sketches import (
+    HyperLogLog,
+    SpaceSaving,
+    cover,
+    distinct_count,
+    top_values,
+)
+
+START = datetime(2008, 11, 9, 20, 0, tzinfo=pytz.UTC)
+EPOCH = int(START.timestamp())
+
+
+def entry_fields(offset, host="10.0.0.1", level="INFO", event_id="E1"):
+    return {
+        "timestamp": START + timedelta(seconds=offset),
+        "level": level,
+        "message": f"Receiving block blk_{offset} src: /{host}",
+        "service": "DataNode",
+        "host": host,
+        "additional_data": {"EventId": event_id},
+    }
+
+
+# ---------------------------------
+# Tests for Space-Saving
+# ---------------------------------
+
+
+def test_space_saving_exact_within_capacity():
+    summary = SpaceSaving(10)
+    summary.update({"a": 3, "b": 1})
+    summary.update({"a": 1, "c": 2})
+    assert summary.top(2) == [("a", 4, 0), ("c", 2, 0)]
+    assert (summary.floor, summary.total) == (0, 7)
+
+
+def test_space_saving_bounds():
+    rng = random.Random(7)
+    values = [
+        f"v{min(int(rng.paretovariate(1.2)), 500)}" for _ in range(20_000)
+    ]
+    exact = Counter(values)
+    merged = SpaceSaving(20)
+    for start in range(0, len(values), 1000):
+        part = SpaceSaving(20)
+        part.update(Counter(values[start : start + 1000]))
+        merged.merge(SpaceSaving.from_bytes(part.to_bytes()))
+    assert merged.total == len(values)
+    for value, count, error in merged.top(20):
+        assert count - error <= exact[value] <= count
+    for value, count in exact.items():
+        if value not in merged.counters:
+            assert count <= merged.floor
+    assert [value for value, *_ in merged.top(3)] == [
+        value for value, _ in exact.most_common(3)
+    ]
+
+
+# ---------------------------------
+# Tests for HyperLogLog
+# ---------------------------------
+
+
+@pytest.mark.parametrize("n", [10, 1000, 50_000])
+def test_hyperloglog_estimate(n):
+    counter = HyperLogLog()
+    counter.add(str(i) for i in range(n))
+    counter.add(str(i) for i in range(n // 2))
+    assert abs(counter.count() - n) <= 4 * counter.relative_error * n + 1
+
+
+def test_hyperloglog_merge():
+    a, b = HyperLogLog(), HyperLogLog()
+    a.add(str(i) for i in range(3000))
+    b.add(str(i) for i in range(2000, 5000))
+    a.merge(HyperLogLog.from_bytes(b.to_bytes()))
+    assert abs(a.count() - 5000) <= 4 * a.relative_error * 5000
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(10))
+
+
+# ---------------------------------
+# Tests for the stored sketches
+# ---------------------------------
+
+
+def test_cover():
+    day = EPOCH // DAY * DAY
+    query = str(cover(day - HOUR, day + 2 * DAY + HOUR))
+    assert f"('bucket__gte', {day})" in query
+    assert f"('bucket__lt', {day + 2 * DAY})" in query
+    assert "granularity', 86400" in query
+    assert "granularity', 86400" not in str(cover(day, day + HOUR))
+
+
+@pytest.mark.django_db
+def test_imports_update_sketches():
+    commit_batches(
+        [
+            RowBatch(
+                fields=[
+                    entry_fields(0),
+                    entry_fields(1, event_id="E2"),
+                    entry_fields(2, "10.0.0.2", "WARN"),
+                ]
+            )
+        ]
+    )
+    commit_batches(
+        [
+            RowBatch(
+                fields=[entry_fields(DAY, "10.0.0.3"), entry_fields(DAY + 1)]
+            )
+        ]
+    )
+    end = START + timedelta(days=2)
+    top = top_values("template", START, end)
+    assert top["total"] == 5 and top["floor"] == 0
+    assert top["values"] == [
+        {"value": "E1", "count": 4, "error": 0},
+        {"value": "E2", "count": 1, "error": 0},
+    ]
+    first_hour = top_values("host", START, START + timedelta(hours=1))
+    assert first_hour["values"][0] == {
+        "value": "10.0.0.1",
+        "count": 2,
+        "error": 0,
+    }
+    assert top_values("block", START, end)["total"] == 5
+    assert distinct_count("host", START, end)["estimate"] == 3
+    assert distinct_count("host", START, end, errors=True)["estimate"] == 1
+    assert distinct_count("block", START, end)["estimate"] == 5
+    assert (
+        distinct_count("host", end, end + timedelta(hours=1))["estimate"] == 0
+    )
+    with pytest.raises(ValueError):
+        top_values("service", START, end)
+    with pytest.raises(ValueError):
+        distinct_count("template", START, end)
+
+
+@pytest.mark.django_db
+def test_rebuild_backfills_sketches(capsys):
+    LogEntry.objects.create(timestamp=START, host="a", message="blk_1 blk_2")
+    assert not LogSketch.objects.exists()
+    call_command("rebuild_rollups")
+    assert "rollups and sketches" in capsys.readouterr().out
+    end = START + timedelta(hours=1)
+    assert distinct_count("block", START, end)["estimate"] == 2
+    assert top_values("host", START, end)["values"] == [
+        {"value": "a", "count": 1, "error": 0}
+    ]
+
+
+@pytest.mark.django_db
+def test_sketches_use_configured_block_pattern(settings):
+    settings.LOGFLOW_IDENTIFIER_PATTERNS = {"block": r"chunk-\d+"}
+    fields = entry_fields(0)
+    fields["message"] = "Replicating chunk-7 and chunk-7 (was blk_1)"
+    commit_batches([RowBatch(fields=[fields])])
+    end = START + timedelta(hours=1)
+    assert top_values("block", START, end)["values"] == [
+        {"value": "chunk-7", "count": 2, "error": 0}
+    ]
+    assert identifier_trace("block", "chunk-7").count() == 1
+
+    settings.LOGFLOW_IDENTIFIER_PATTERNS = {"ip": r"\d+\.\d+\.\d+\.\d+"}
+    commit_batches([RowBatch(fields=[entry_fields(1)])])
+    assert top_values("block", START, end)["total"] == 2
+
+
+# ---------------------------------
+# Tests for the endpoints
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_sketch_endpoints(client):
+    commit_batches([RowBatch(fields=[entry_fields(0), entry_fields(10)])])
+    params = {"start": str(EPOCH), "end": "2008-11-09T21:00:00"}
+    data = client.get(
+        reverse("logflow_top"), {**params, "field": "host", "n": "1"}
+    ).json()
+    assert data["status"] == "success"
+    assert data["values"] == [{"value": "10.0.0.1", "count": 2, "error": 0}]
+    data = client.get(
+        reverse("logflow_distinct"), {**params, "field": "block"}
+    ).json()
+    assert data["estimate"] == 2 and data["relative_error"] < 0.02
+    assert (
+        client.get(reverse("logflow_top"), {"field": "x"}).status_code == 400
+    )
+    assert (
+        client.get(reverse("logflow_distinct"), {"n": "x"}).status_code == 200
+    )
+    assert client.get(reverse("logflow_top"), {"n": "x"}).status_code == 400
@@ -0,0 +1,144 @@
+import asyncio
+import socket
+import pytest
+from datetime import datetime, timezone
+from io import StringIO
+from django.core.management import call_command
+from logapp.models import LogEntry
+from logapp.syslog_listener import SyslogServer
+from logapp.syslog_parser import parse_syslog
+
+RFC5424_FRAME = (
+    b"<34>1 2003-10-11T22:14:15.003Z mymachine.example.com su - ID47 "
+    b'[exampleSDID@32473 iut="3" eventSource="App\\]"] '
+    b"\xef\xbb\xbf'su root' failed for lonvick on /dev/pts/8"
+)
+RFC3164_FRAME = b"<13>Feb  5 17:32:18 10.0.0.99 myapp[123]: Use the BFG!\n"
+
+
+# ---------------------------------
+# Tests for parse_syslog
+# ---------------------------------
+
+
+def test_parse_syslog_rfc5424():
+    fields = parse_syslog(RFC5424_FRAME, peer="192.0.2.1")
+    assert fields["timestamp"] == datetime(
+        2003, 10, 11, 22, 14, 15, 3000, tzinfo=timezone.utc
+    )
+    assert fields["level"] == "CRIT"
+    assert fields["service"] == "su"
+    assert fields["host"] == "mymachine.example.com"
+    assert fields["message"] == "'su root' failed for lonvick on /dev/pts/8"
+    data = fields["additional_data"]
+    assert (data["facility"], data["msgid"]) == (4, "ID47")
+    assert data["structured_data"].endswith('eventSource="App\\]"]')
+    assert "Pid" not in data
+
+
+def test_parse_syslog_rfc3164():
+    received = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    fields = parse_syslog(RFC3164_FRAME, received=received)
+    assert fields["timestamp"] == datetime(
+        2023, 2, 5, 17, 32, 18, tzinfo=timezone.utc
+    )
+    assert fields["level"] == "NOTICE"
+    assert fields["service"] == "myapp"
+    assert fields["host"] == "10.0.0.99"
+    assert fields["message"] == "Use the BFG!"
+    assert fields["additional_data"]["Pid"] == "123"
+
+
+def test_parse_syslog_unstructured_frames():
+    fields = parse_syslog(b"just text", peer="192.0.2.1", received=0)
+    assert fields["message"] == "just text"
+    assert fields["level"] is None
+    assert fields["host"] == "192.0.2.1"
+    assert fields["timestamp"].year == 1970
+
+    fields = parse_syslog("<11>something odd", received=0)
+    assert (fields["level"], fields["message"]) == ("ERROR", "something odd")
+
+
+# ---------------------------------
+# Tests for SyslogServer
+# ---------------------------------
+
+
+async def send_and_stop(server, udp_frames, tcp_payload):
+    await server.start()
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for frame in udp_frames:
+        sock.sendto(frame, ("127.0.0.1", server.ports["udp"]))
+    sock.close()
+    _, writer = await asyncio.open_connection("127.0.0.1", server.ports["tcp"])
+    writer.write(tcp_payload)
+    await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+    deadline = loop.time() + 5
+    while server.stats.received < len(udp_frames) + 3:
+        assert loop.time() < deadline
+        await asyncio.sleep(0.01)
+    await server.stop()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_syslog_server_udp_and_tcp():
+    server = SyslogServer(udp_port=0, tcp_port=0, flush_interval=0.01)
+    tcp_payload = (
+        b"%d " % len(RFC5424_FRAME)
+        + RFC5424_FRAME
+        + b"%d <14>1 - - tcpapp - - - octets"
+        % len(b"<14>1 - - tcpapp - - - octets")
+        + b"<13>Feb  5 17:32:18 host other: newline framed\n"
+    )
+    asyncio.run(send_and_stop(server, [RFC3164_FRAME] * 2, tcp_payload))
+
+    assert server.stats.committed == 5
+    assert server.stats.dropped == 0
+    assert LogEntry.objects.count() == 5
+    assert LogEntry.objects.filter(service="myapp").count() == 2
+    assert LogEntry.objects.get(service="tcpapp").message == "octets"
+    assert LogEntry.objects.get(service="tcpapp").host == "127.0.0.1"
+    assert LogEntry.objects.get(service="other").message == "newline framed"
+
+
+def test_syslog_server_drops_when_queue_is_full():
+    async def fill():
+        server = SyslogServer(queue_size=2)
+        server.queue = asyncio.Queue(server.queue_size)
+        for _ in range(5):
+            server.offer(RFC3164_FRAME, "127.0.0.1")
+        return server
+
+    server = asyncio.run(fill())
+    assert (server.stats.received, server.stats.dropped) == (5, 3)
+    assert server.stats.peak_queue_depth == 2
+    assert "dropped 3" in server.format_stats()
+    assert "queue depth 2/2" in server.format_stats()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_syslog_listener_command():
+    out = StringIO()
+    call_command(
+        "syslog_listener",
+        udp_port=0,
+        no_tcp=True,
+        run_for=0.05,
+        stats_interval=1,
+        stdout=out,
+    )
+    assert "Listening for syslog on UDP 127.0.0.1:" in out.getvalue()
+    assert "received 0, committed 0, dropped 0" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_benchmark_syslog():
+    out = StringIO()
+    call_command("benchmark", "syslog", lines=2000, stdout=out)
+    assert "syslog parse+insert: 2,000 lines" in out.getvalue()
+    # The benchmark rolls its inserts back.
+    assert not LogEntry.objects.exists()
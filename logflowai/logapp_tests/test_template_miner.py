@@ -0,0 +1,165 @@
+import json
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from logapp.ingest import DEFAULT_CSV_PATH
+from logapp.models import LogEntry, LogTemplate
+from logapp.template_miner import TemplateMiner, parse_raw_line
+
+RAW_LINES = [
+    "081109 203615 148 INFO dfs.DataNode$PacketResponder: "
+    "PacketResponder 1 for block blk_38865049064139660 terminating",
+    "081109 203807 222 INFO dfs.DataNode$PacketResponder: "
+    "PacketResponder 0 for block blk_-6952295868487656571 terminating",
+    "081109 204005 35 INFO dfs.FSNamesystem: BLOCK* "
+    "NameSystem.addStoredBlock: blockMap updated: 10.251.73.220:50010 "
+    "is added to blk_7128370237687728475 size 67108864",
+]
+
+
+# ---------------------------------
+# Tests for TemplateMiner
+# ---------------------------------
+
+
+def test_parse_raw_line():
+    row = parse_raw_line(RAW_LINES[0])
+    assert row["Date"] == "081109"
+    assert row["Level"] == "INFO"
+    assert row["Component"] == "dfs.DataNode$PacketResponder"
+    assert row["Content"].startswith("PacketResponder 1")
+    assert parse_raw_line("garbage") == {"Content": "garbage"}
+
+
+def test_template_miner_groups_messages():
+    miner = TemplateMiner()
+    first = miner.add_log_message("Receiving block blk_1 src: /10.0.0.1:50010")
+    second = miner.add_log_message("Receiving block blk_-2 src: /10.0.0.2:1")
+    other = miner.add_log_message("Deleting block blk_3 file /mnt/blk_3")
+
+    assert first[0] == second[0]
+    assert second[1] == "Receiving block blk_<*> src: /<*>"
+    assert other[0] != first[0]
+    assert len(miner.clusters) == 2
+
+
+def test_template_miner_generalizes_tokens():
+    miner = TemplateMiner()
+    miner.add_log_message("Verification succeeded for blk_1")
+    event_id, template = miner.add_log_message(
+        "Verification succeeded after blk_2"
+    )
+    assert template == "Verification succeeded <*> blk_<*>"
+    assert miner.templates() == {event_id: template}
+
+
+def test_template_miner_state_roundtrip(tmp_path):
+    miner = TemplateMiner()
+    for line in RAW_LINES:
+        miner.add_log_message(parse_raw_line(line)["Content"])
+    path = tmp_path / "miner.json"
+    miner.save(path)
+
+    restored = TemplateMiner.load(path)
+    assert restored.templates() == miner.templates()
+    event_id, _ = restored.add_log_message(
+        "PacketResponder 2 for block blk_5 terminating"
+    )
+    assert event_id == "M1"
+    assert len(restored.clusters) == len(miner.clusters)
+    # The state is plain JSON.
+    assert json.loads(path.read_text())["depth"] == 4
+
+
+def test_template_miner_load_missing_file(tmp_path):
+    miner = TemplateMiner.load(tmp_path / "missing.json", depth=5)
+    assert miner.depth == 5
+    assert miner.clusters == {}
+
+
+# ---------------------------------
+# Tests for importing raw logs
+# ---------------------------------
+
+
+@pytest.mark.django_db
+def test_import_logs_raw_file(tmp_path):
+    log_path = tmp_path / "HDFS.log"
+    state_path = tmp_path / "miner.json"
+    log_path.write_text("\n".join(RAW_LINES[:2]) + "\n")
+
+    out = StringIO()
+    call_command(
+        "import_logs",
+        path=str(log_path),
+        template_state=str(state_path),
+        stdout=out,
+    )
+    entries = list(LogEntry.objects.order_by("line_id"))
+    assert [entry.line_id for entry in entries] == [1, 2]
+    assert entries[0].service == "dfs.DataNode$PacketResponder"
+    assert {e.additional_data["EventId"] for e in entries} == {"M1"}
+    assert entries[1].additional_data["EventTemplate"] == (
+        "PacketResponder <*> for block blk_<*> terminating"
+    )
+    assert state_path.exists()
+    assert "Template miner knows 1 templates." in out.getvalue()
+
+    # Appended lines continue the line numbering and reuse saved templates.
+    with open(log_path, "a") as fh:
+        fh.write(RAW_LINES[2] + "\n" + RAW_LINES[0] + "\n")
+    call_command(
+        "import_logs",
+        path=str(log_path),
+        template_state=str(state_path),
+        stdout=StringIO(),
+    )
+    latest = LogEntry.objects.get(line_id=4)
+    assert latest.additional_data["EventId"] == "M1"
+    assert LogEntry.objects.get(line_id=3).additional_data["EventId"] == "M2"
+
+
+@pytest.mark.django_db
+def test_raw_import_keeps_csv_templates(tmp_path):
+    call_command("import_logs", path=DEFAULT_CSV_PATH, stdout=StringIO())
+    csv_templates = dict(
+        LogTemplate.objects.values_list("event_id", "template")
+    )
+    assert csv_templates["E1"] == "<*>:<*> Served block blk_<*> to /<*>"
+
+    log_path = tmp_path / "HDFS.log"
+    log_path.write_text(
+        "081109 203615 148 INFO dfs.DataNode: "
+        "Something totally different happened here\n"
+        + "\n".join(RAW_LINES)
+        + "\n"
+    )
+    call_command(
+        "import_logs",
+        path=str(log_path),
+        template_state=str(tmp_path / "miner.json"),
+        stdout=StringIO(),
+    )
+    templates = dict(LogTemplate.objects.values_list("event_id", "template"))
+    assert {
+        event_id: templates[event_id] for event_id in csv_templates
+    } == csv_templates
+    mined = set(templates) - set(csv_templates)
+    assert mined and all(event_id.startswith("M") for event_id in mined)
+    assert not LogEntry.objects.filter(
+        event_id="E1", message__contains="totally different"
+    ).exists()
+
+
+def test_benchmark_template_miner():
+    out = StringIO()
+    call_command("benchmark", "template_miner", lines=2000, stdout=out)
+    assert "lines/sec" in out.getvalue()
+    assert "templates discovered" in out.getvalue()
+
+
+def test_benchmark_decompression():
+    out = StringIO()
+    call_command("benchmark", "decompression", lines=2000, stdout=out)
+    for codec in ("plain", "gzip", "bz2", "zstd"):
+        assert f"decompression[{codec}]: 2,000 lines" in out.getvalue()
@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+import pytz
+from django.urls import reverse
+from logapp.ingest import RowBatch, commit_batches
+from logapp.timeseries import (
+    lttb,
+    parse_group_by,
+    parse_width,
+    source_granularity,
+    timeseries,
+)
+
+START = datetime(2008, 11, 9, 20, 0, tzinfo=pytz.UTC)
+EPOCH = int(START.timestamp())
+
+
+def entry_fields(offset, service="DataNode", level="INFO"):
+    return {
+        "timestamp": START + timedelta(seconds=offset),
+        "level": level,
+        "message": f"message {offset}",
+        "service": service,
+        "additional_data": {"EventId": "E1"},
+    }
+
+
+@pytest.fixture
+def timeline(db):
+    commit_batches(
+        [
+            RowBatch(
+                fields=[
+                    entry_fields(0),
+                    entry_fields(5),
+                    entry_fields(61, "NameNode", "WARN"),
+                    entry_fields(3600 + 30),
+                ]
+            )
+        ]
+    )
+
+
+# ---------------------------------
+# Tests for the parameters
+# ---------------------------------
+
+
+@pytest.mark.parametrize(
+    "value, width",
+    [("1s", 1), ("30", 30), ("5m", 300), ("1H", 3600), ("1d", 86400)],
+)
+def test_parse_width(value, width):
+    assert parse_width(value) == width
+
+
+@pytest.mark.parametrize("value", ["0s", "2d", "1w", "-5m", ""])
+def test_parse_width_invalid(value):
+    with pytest.raises(ValueError):
+        parse_width(value)
+
+
+def test_parse_group_by():
+    assert parse_group_by("level, service,level") == ["level", "service"]
+    assert parse_group_by(None) == []
+    with pytest.raises(ValueError):
+        parse_group_by("host")
+
+
+def test_source_granularity():
+    assert source_granularity(300) == 60
+    assert source_granularity(7200) == 3600
+    assert source_granularity(86400) == 86400
+    assert source_granularity(90) is None
+
+
+# ---------------------------------
+# Tests for LTTB
+# ---------------------------------
+
+
+def test_lttb_keeps_extremes():
+    x = np.arange(10_000)
+    y = np.zeros(10_000)
+    y[1234], y[7777] = 50, -50
+    keep = lttb(x, y, 100)
+    assert len(keep) == 100
+    assert keep[0] == 0 and keep[-1] == 9999
+    assert np.all(np.diff(keep) > 0)
+    assert {1234, 7777} <= set(keep.tolist())
+    assert lttb(x[:50], y[:50], 100).tolist() == list(range(50))
+    with pytest.raises(ValueError):
+        lttb(x, y, 2)
+
+
+# ---------------------------------
+# Tests for timeseries
+# ---------------------------------
+
+
+def test_timeseries_from_rollups(timeline):
+    data = timeseries(START, START + timedelta(hours=2), 60)
+    assert data["source"] == "rollup:60"
+    assert (data["start"], data["end"], data["width"]) == (
+        EPOCH,
+        EPOCH + 7200,
+        60,
+    )
+    assert not data["downsampled"]
+    [series] = data["series"]
+    assert series["key"] == {}
+    assert len(series["time"]) == 120
+    assert series["count"][:2] == [2, 1]
+    assert series["count"][60] == 1
+    assert sum(series["count"]) == 4
+
+    data = timeseries(START, START + timedelta(hours=2), 7200)
+    assert data["source"] == "rollup:3600"
+    assert data["series"][0]["count"] == [4]
+
+
+def test_timeseries_grouped(timeline):
+    data = timeseries(
+        START, START + timedelta(hours=2), 3600, ["service", "level"]
+    )
+    assert [series["key"] for series in data["series"]] == [
+        {"service": "datanode", "level": "info"},
+        {"service": "namenode", "level": "warn"},
+    ]
+    assert data["series"][0]["count"] == [2, 1]
+    assert data["series"][1]["count"] == [1, 0]
+
+
+def test_timeseries_from_entries(timeline):
+    data = timeseries(START, START + timedelta(minutes=2), 5, ["level"])
+    assert data["source"] == "entries"
+    info, warn = data["series"]
+    assert info["count"][:2] == [1, 1]
+    assert warn["time"][warn["count"].index(1)] == EPOCH + 60
+
+
+def test_timeseries_downsamples(timeline, settings):
+    settings.LOGFLOW_TIMESERIES_MAX_POINTS = 10
+    data = timeseries(START, START + timedelta(hours=2), 60)
+    assert data["downsampled"]
+    [series] = data["series"]
+    assert len(series["time"]) == len(series["count"]) == 10
+    assert series["time"][0] == EPOCH
+    assert 2 in series["count"]
+
+
+def test_timeseries_limits(settings):
+    settings.LOGFLOW_TIMESERIES_MAX_BUCKETS = 100
+    with pytest.raises(ValueError):
+        timeseries(START, START + timedelta(hours=2), 60)
+    with pytest.raises(ValueError):
+        timeseries(START, START, 60)
+
+
+def test_timeseries_limits_all_series(timeline, settings):
+    settings.LOGFLOW_TIMESERIES_MAX_BUCKETS = 200
+    end = START + timedelta(hours=2)
+    assert len(timeseries(START, end, 60)["series"]) == 1
+    # Two series of 120 buckets exceed the budget.
+    with pytest.raises(ValueError, match="series"):
+        timeseries(START, end, 60, ["service"])
+    assert len(timeseries(START, end, 120, ["service"])["series"]) == 2
+
+
+# ---------------------------------
+# Tests for the endpoint
+# ---------------------------------
+
+
+def test_timeseries_endpoint(client, timeline):
+    url = reverse("logflow_timeseries")
+    data = client.get(
+        url,
+        {
+            "start": "2008-11-09T20:00:00",
+            "end": str(EPOCH + 7200),
+            "width": "1h",
+            "group_by": "service",
+        },
+    ).json()
+    assert data["status"] == "success"
+    assert data["series"][0] == {
+        "key": {"service": "datanode"},
+        "time": [EPOCH, EPOCH + 3600],
+        "count": [2, 1],
+    }
+    response = client.get(url, {"width": "1w"})
+    assert response.status_code == 400
+    assert client.get(url, {"start": "yesterday"}).status_code == 400
+    data = client.get(url).json()
+    assert data["status"] == "success" and data["width"] == 3600
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "name",
+    [
+        "logflow_timeseries",
+        "logflow_top",
+        "logflow_distinct",
+        "logflow_anomalies",
+    ],
+)
+@pytest.mark.parametrize("param", ["start", "end"])
+def test_time_range_out_of_range_epoch(client, name, param):
+    response = client.get(reverse(name), {param: "1e18"})
+    assert response.status_code == 400
+    assert response.json()["status"] == "error"
@@ -0,0 +1,209 @@
+import re
+import numpy as np
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from logapp import parse_database
+from logapp.models import LogEntry
+from logapp.parse_database import filter_logs
+from logapp.trigram_index import (
+    MAX_SEGMENTS,
+    TrigramIndex,
+    fold,
+    get_trigram_index,
+    regex_query,
+    trigram_keys,
+    varint_decode,
+    varint_encode,
+)
+
+MESSAGES = [
+    "Receiving block blk_-1608999687919862906 src: /10.250.19.102:54106",
+    "BLOCK* NameSystem.allocateBlock: /user/root/rand/_temporary",
+    "PacketResponder 1 for block blk_38865049064139660 terminating",
+    "Verification succeeded for blk_-6952295868487656571",
+    "java.io.IOException: Connection reset by peer",
+    "java.net.SocketTimeoutException: 60000 millis timeout",
+    "Deleting block blk_-5140072410813878235 file /mnt/hadoop/dfs/data",
+    "Exception in receiveBlock for block blk_7503483334202473044",
+    "Received block blk_3587508140051953248 of size 67108864 "
+    "from /10.251.42.84",
+    "Served block blk_-3544583377289625738 to /10.250.14.38",
+    "café Straße ſecret disk",
+    "ok",
+    "",
+]
+
+PATTERNS = [
+    r"blk_-?\d+",
+    r"blk_-\d{19}",
+    r"/10\.250\.\d+\.\d+",
+    r"java\.(io|net)\.\w+Exception",
+    r"(?i)EXCEPTION",
+    r"(?i)secret",
+    r"[Rr]eceiv(ing|ed) block",
+    r"^Served",
+    r"terminating$",
+    r"\d+",
+    r"café",
+    r"block|BLOCK",
+    r"nomatch_at_all",
+]
+
+
+# ---------------------------------
+# Tests for the encoding and regex analysis
+# ---------------------------------
+
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2**35, 2**62], dtype=np.int64)
+    data, lengths = varint_encode(values)
+    assert lengths.tolist() == [1, 1, 1, 2, 2, 6, 9]
+    assert data.dtype == np.uint8 and len(data) == lengths.sum()
+    assert varint_decode(data).tolist() == values.tolist()
+    assert len(varint_decode(varint_encode([])[0])) == 0
+
+
+def keys(*strings):
+    return {key for s in strings for key in trigram_keys(fold(s)).tolist()}
+
+
+def flatten(query):
+    if isinstance(query, int):
+        return {query}
+    return set().union(*(flatten(part) for part in query[1]))
+
+
+def test_regex_query_requires_literal_trigrams():
+    query = regex_query(r"blk_-?\d+ (is|was) added")
+    assert query[0] == "and"
+    assert keys("blk_") <= set(query[1])
+    assert flatten(query) == keys("blk_", " is added", " was added")
+    assert regex_query(r"java\.io") == (
+        "and",
+        tuple(sorted(keys("java.io"))),
+    )
+    assert flatten(regex_query(r"[Ee]rror")) == keys("error")
+
+
+def test_regex_query_without_required_trigrams():
+    for pattern in [r"\d+", r"ab|cd", r"(foo)?", r".*", r"x{0,3}"]:
+        assert regex_query(pattern) is None
+    # Under IGNORECASE, "s" also matches U+017F and cannot be folded.
+    assert regex_query("(?i)disk") is None
+    assert flatten(regex_query("(?i)ERROR")) == keys("error")
+    assert flatten(regex_query("(?ia)disk")) == keys("disk")
+    with pytest.raises(re.error):
+        regex_query("(unclosed")
+
+
+# ---------------------------------
+# Tests for TrigramIndex
+# ---------------------------------
+
+
+@pytest.fixture
+def messages(db):
+    now = timezone.now()
+    return [
+        LogEntry.objects.create(timestamp=now, message=message)
+        for message in MESSAGES
+    ]
+
+
+def expected_ids(pattern, entries):
+    compiled = re.compile(pattern)
+    return [e.id for e in entries if compiled.search(e.message or "")]
+
+
+def test_trigram_index_candidates_cover_matches(messages, tmp_path):
+    index = TrigramIndex(tmp_path / "trigrams")
+    assert index.rebuild() == len(MESSAGES)
+    assert index.doc_count == len(MESSAGES)
+    for pattern in PATTERNS:
+        candidates = index.candidates(pattern)
+        if candidates is None:
+            continue
+        assert set(expected_ids(pattern, messages)) <= set(candidates)
+    candidates = index.candidates(r"blk_-\d{19}")
+    assert len(candidates) == sum("blk_-" in m for m in MESSAGES)
+    assert len(index.candidates("nomatch_at_all")) == 0
+
+
+def test_trigram_index_update_and_merge(messages, tmp_path):
+    index = TrigramIndex(tmp_path / "trigrams")
+    index.update(segment_size=3)
+    assert len(index.manifest["segments"]) == 5
+    now = timezone.now()
+    entries = list(messages)
+    for i in range(MAX_SEGMENTS + 2):
+        entries.append(
+            LogEntry.objects.create(
+                timestamp=now, message=f"Added blk_{i} to the queue"
+            )
+        )
+        assert index.update() == 1
+    assert len(index.manifest["segments"]) <= MAX_SEGMENTS
+    assert index.doc_count == len(entries)
+    for pattern in PATTERNS + [r"blk_\d to the"]:
+        candidates = index.candidates(pattern)
+        if candidates is not None:
+            assert set(expected_ids(pattern, entries)) <= set(candidates)
+            assert list(candidates) == sorted(candidates)
+
+
+def test_trigram_index_is_shared_through_files(messages, tmp_path):
+    writer = TrigramIndex(tmp_path / "trigrams")
+    writer.rebuild()
+    reader = get_trigram_index(tmp_path / "trigrams")
+    assert reader.last_id == messages[-1].id
+    assert list(reader.candidates("terminating")) == [messages[2].id]
+
+
+# ---------------------------------
+# Tests for regex searches in filter_logs
+# ---------------------------------
+
+
+@pytest.mark.parametrize("scan_fraction", [0.1, 1.0])
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_filter_logs_regex_matches_scan(
+    messages, pattern, scan_fraction, monkeypatch
+):
+    monkeypatch.setattr(parse_database, "REGEX_SCAN_FRACTION", scan_fraction)
+    logs = filter_logs(regex=pattern)
+    assert sorted(log.id for log in logs) == expected_ids(pattern, messages)
+
+
+def test_filter_logs_regex_sees_unindexed_entries(messages, monkeypatch):
+    monkeypatch.setattr(parse_database, "REGEX_SCAN_FRACTION", 1.0)
+    assert filter_logs(regex="late entry").count() == 0
+    late = LogEntry.objects.create(
+        timestamp=timezone.now(), message="a late entry"
+    )
+    # Rows above the index watermark are matched even when not indexed.
+    monkeypatch.setattr(get_trigram_index(), "update", lambda: 0)
+    assert list(filter_logs(regex="late entry")) == [late]
+
+
+def test_filter_logs_regex_with_query(messages):
+    logs = filter_logs(query="block", regex=r"blk_-\d+")
+    assert {log.id for log in logs} == {
+        messages[0].id,
+        messages[6].id,
+        messages[9].id,
+    }
+    with pytest.raises(ValueError):
+        filter_logs(regex="(unclosed")
+
+
+def test_home_regex_parameter(client, messages):
+    url = reverse("logflow_home")
+    params = {"regex": r"java\.\w+\.\w+Exception", "format": "json"}
+    data = client.get(url, params).json()
+    assert [log["id"] for log in data["logs"]] == [
+        messages[4].id,
+        messages[5].id,
+    ]
+    assert client.get(url, {"regex": "(unclosed"}).status_code == 400
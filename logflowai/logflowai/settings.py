@@ -143,3 +143,98 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# HTTP bulk ingest (POST /ingest/): records per committed batch, how many
+# requests may hold or wait for the database writer before new ones get a 429,
+# and the Retry-After value (seconds) sent with it.
+LOGFLOW_INGEST_BATCH_SIZE = 1000
+LOGFLOW_INGEST_MAX_PENDING = 4
+LOGFLOW_INGEST_RETRY_AFTER = 1
+
+# Persistent TF-IDF search index used by filter_logs (see
+# logapp.search_index): where it is stored, the minimum number of entries a
+# term must occur in to enter the vocabulary when it is rebuilt, and how many
+# times the index may grow beyond its last rebuild before an incremental
+# update rebuilds it, refitting vocabulary and IDF (0: only the
+# rebuild_search_index command does).
+LOGFLOW_INDEX_DIR = BASE_DIR / "search_index"
+LOGFLOW_INDEX_MIN_DF = 1
+LOGFLOW_INDEX_REBUILD_GROWTH = 4
+
+# How searches score the index: rows per chunk, scoring threads (None: one per
+# CPU) and how many of the most similar hits a search page ranks.
+LOGFLOW_SEARCH_CHUNK_ROWS = 262144
+LOGFLOW_SEARCH_WORKERS = None
+LOGFLOW_SEARCH_TOP_K = 10000
+
+# Trigram index used for regex searches (see logapp.trigram_index).
+LOGFLOW_TRIGRAM_INDEX_DIR = BASE_DIR / "trigram_index"
+
+# Semantic index of the event templates (see logapp.semantic_index): where it
+# is stored, the embedding dimension and how many IVF lists a query scores.
+LOGFLOW_SEMANTIC_INDEX_DIR = BASE_DIR / "semantic_index"
+LOGFLOW_EMBEDDING_DIM = 256
+LOGFLOW_SEMANTIC_NPROBE = 8
+
+# Time-series API (see logapp.timeseries): the default number of points per
+# series after downsampling, and the most buckets a request may count, summed
+# over all of its series.
+LOGFLOW_TIMESERIES_MAX_POINTS = 1000
+LOGFLOW_TIMESERIES_MAX_BUCKETS = 1_000_000
+
+# Top-k and distinct-count sketches (see logapp.sketches): the counters kept
+# per Space-Saving summary, and the levels counted as errors by the error-only
+# distinct counts. Changing either applies to new imports; run
+# rebuild_rollups to recompute the stored sketches.
+LOGFLOW_SKETCH_CAPACITY = 100
+LOGFLOW_SKETCH_ERROR_LEVELS = [
+    "warn",
+    "error",
+    "fatal",
+    "crit",
+    "alert",
+    "emerg",
+]
+
+# Identifier index (see logapp.identifiers): kind -> regular expression of the
+# identifiers extracted from the messages at ingest, without capturing groups
+# (use (?:...)). /blocks/<id>/ reads the "block" kind, and the sketches behind
+# /api/top/ and /api/distinct/ count its matches. Run rebuild_identifiers and
+# rebuild_rollups after changing them.
+LOGFLOW_IDENTIFIER_PATTERNS = {
+    "block": r"blk_-?\d+",
+    "ip": r"\b(?:\d{1,3}\.){3}\d{1,3}\b",
+}
+
+# Streaming anomaly detection at ingest (see logapp.anomalies): whether it
+# runs, the bucket width in seconds, the score (in standard deviations) that
+# flags a bucket, how many buckets a key must have seen before it is judged,
+# and the fewest entries a spike must hold.
+LOGFLOW_ANOMALY_DETECTION = True
+LOGFLOW_ANOMALY_INTERVAL = 60
+LOGFLOW_ANOMALY_THRESHOLD = 4.0
+LOGFLOW_ANOMALY_WARMUP = 30
+LOGFLOW_ANOMALY_MIN_COUNT = 5
+
+# Cache of search pages and dashboard aggregates (see logapp.query_cache): the
+# cache alias to store them in, how many entries and pickled bytes each process
+# keeps (least recently used first out) and their expiry in seconds (None:
+# until the next import invalidates them). The "query" cache is file based, so
+# imports run from the command line invalidate the web server's entries; with
+# a per-process local-memory cache they would only expire after the timeout.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "logflow",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+    "query": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "query_cache",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+LOGFLOW_QUERY_CACHE = "query"
+LOGFLOW_QUERY_CACHE_MAX_ENTRIES = 256
+LOGFLOW_QUERY_CACHE_MAX_BYTES = 32 * 1024 * 1024
+LOGFLOW_QUERY_CACHE_TIMEOUT = 300